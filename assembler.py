@@ -2,218 +2,588 @@
 
 from __future__ import print_function
 import argparse
+import collections
+import itertools
 import os
 import importlib
-import operator
+import inspect
+import multiprocessing
 import re
+import shutil
 import traceback
 
+from buildcache import DEFAULT_MAX_SIZE, BuildCache
+from encoding import DEFAULT_CACHE_SIZE, EncodingCache
+from image import ADDRESS_WIDTH, Image
+from incremental import IncrementalAssembler
+from outputs import UpdatingFile, copy_if_changed, write_depfile
+from writers import ALTERA_SIZE, FORMATS, IMAGE_WRITERS, BulkWriter, ImageError, write_formats
+
 """assembler.py: General, modular 2-pass assembler accepting ISA definitions to assemble code."""
 __authors__ = "Christopher Tam and Dhruv Mehra"
 
 
-VERBOSE = False
-FILE_NAME = ''
-ISA = None
 RE_PARAMS = re.compile('^(?P<key>.+)=(?P<value>.+)$')
 
 
-def verbose(s):
-    if VERBOSE:
-        print(s)
+# A parsed source line, produced once by pass1 and consumed by pass2.
+# instr is the line's entry in the ISA's dispatch table.
+Line = collections.namedtuple(
+    'Line', 'line_number keyword key value label opcode operands instr')
 
 
-def error(line_number, message):
-    print("Error {}:{}: {}.\n".format(FILE_NAME, line_number, message))
+def parse_number(val):
+    if val.startswith('0x'):
+        return int(val, 16)
+    elif val.startswith('0b'):
+        return int(val, 2)
+    else:
+        return int(val)
 
 
-def pass1(file):
-    verbose("\nBeginning Pass 1...\n")
-    # use a program counter to keep track of addresses in the file
-    pc = 0
-    line_count = 1
-    no_errors = True
+# Source lines parsed per task of pass1_parallel
+PASS1_CHUNK_LINES = 4096
 
-    for line in file:
-        # Skip blank lines and comments
-        if ISA.is_blank(line):
-            verbose(line)
-            continue
+# Lines encoded per task of pass2_parallel
+PASS2_CHUNK_LINES = 4096
 
-        # Trim any leading and trailing whitespace
-        line = line.strip()
+# Programs with fewer lines than this are encoded one line at a time, even if
+# their ISA can encode many at once
+BATCH_MIN_LINES = 256
 
-        verbose('{}: {}'.format(pc, line))
+# Programs with fewer lines than this are not worth starting a pool for
+PARALLEL_MIN_LINES = 20000
 
-        # Make line case-insensitive
-        line = line.lower()
+# Addresses past the last one an Image holds
+ADDRESS_LIMIT = 1 << ADDRESS_WIDTH
 
-        # Parse line
-        keyword, key, val, label, op, _ = ISA.get_parts(line)
 
-        if keyword and op:
-            error(line_number,
-                  "Cannot have {} and {} in the same line".format(op, keyword))
-            success = False
+def load_isa(name):
+    """Import an ISA definition module by name."""
+    return importlib.import_module(name)
 
-        if keyword == 'orig':
-            # Sanity check
-            if not val:
-                error(line_count, "{} is not valid format for {}".format(keyword, val))
-                success = False
 
-            try:
-                if val.startswith('0x'):
-                    pc = int(val, 16)
-                elif val.startswith('0b'):
-                    pc = int(val, 2)
-                else:
-                    pc = int(val)
+def isa_module_name(isa):
+    """Return the name an ISA module can be imported again by.
 
-            except ValueError as e:
-                error(line_count, "{} is not a valid number format".format(val))
-                no_errors = False
+    ISA modules set __name__ to the name of their architecture.
+    """
+    spec = getattr(isa, '__spec__', None)
+    return spec.name if spec is not None else inspect.getmodulename(inspect.getsourcefile(isa))
 
-        if label:
-            if label in ISA.SYMBOL_TABLE:
-                error(line_count, "label '{}' is defined more than once".format(label))
-                no_errors = False
-            else:
-                ISA.SYMBOL_TABLE[label] = pc
-
-        if keyword and key:
-            if key in ISA.SYMBOL_TABLE:
-                error(line_count, "label '{}' is defined more than once".format(key))
-                no_errors = False
-            else:
-                try:
-                    if val.startswith('0x'):
-                        ISA.SYMBOL_TABLE[key] = int(val, 16)
-                    elif val.startswith('0b'):
-                        ISA.SYMBOL_TABLE[key] = int(val, 2)
-                    else:
-                        ISA.SYMBOL_TABLE[key] = int(val)
-                except ValueError as e:
-                    error(line_count, "{} is not a valid number format".format(val))
-                    no_errors = False
 
-        if keyword == 'word':
-            try:
-                pc += (getattr(ISA, ISA.instruction_class(keyword)).size()
-                       * ISA.INSTRUCTION_OFFSET)
-            except Exception as e:
-                error(
-                    line_count, "instruction '{}' is not defined in the current ISA".format(keyword))
-                no_errors = False
-        if op:
-            try:
-                pc += (getattr(ISA, ISA.instruction_class(op)).size()
-                       * ISA.INSTRUCTION_OFFSET)
-            except Exception as e:
-                error(
-                    line_count, "instruction '{}' is not defined in the current ISA".format(op))
-                no_errors = False
+class Assembler(object):
+    """A 2-pass assembler for a single ISA definition.
 
-        line_count += 1
+    All state of a run (symbol table, parameters) lives on the instance, so
+    separate instances can be used concurrently and one instance can be
+    reused for any number of programs.
 
-    verbose("\nFinished Pass 1.\n")
+    With an encoding_cache_size, encoded instructions are kept in an
+    EncodingCache of that many entries and reused by lines with the same
+    text, for ISAs that declare which mnemonics are PC_RELATIVE.
 
-    return no_errors
+    ISAs may define scheduler(params), returning None or a pass reordering
+    the lines parsed by pass1 before they are laid out (e.g. to fill delay
+    slots), which returns the new lines, the number of slots it filled and
+    the number of slots overall. Programs are then assembled by pass1 and
+    pass2 on a single process.
+    """
 
+    def __init__(self, isa, params=None, verbose=False, file_name='', log=print,
+                 encoding_cache_size=0):
+        if isinstance(isa, str):
+            isa = load_isa(isa)
 
-def pass2(input_file, use_hex):
-    verbose("\nBeginning Pass 2...\n")
+        self.isa = isa
+        self.params = isa.receive_params(params)
+        self.dispatch = isa.dispatch_table(self.params)
+        self.verbose_enabled = verbose
+        self.file_name = file_name
+        # Receives every message of a run (verbose output and errors)
+        self.log = log
+        # Number of errors reported so far
+        self.error_count = 0
+        self.symbol_table = {}
 
-    pc = 0
-    line_count = 1
-    success = True
-    results = []
+        scheduler = getattr(isa, 'scheduler', None)
+        self.scheduler = scheduler(self.params) if scheduler is not None else None
 
-    # Seek to beginning of file
-    input_file.seek(0)
+        pc_relative = getattr(isa, 'PC_RELATIVE', None)
+        self.encoding_cache = None
+        if encoding_cache_size and pc_relative is not None:
+            self.encoding_cache = EncodingCache(pc_relative, encoding_cache_size)
 
-    for line in input_file:
-        # Skip blank lines and comments
-        if ISA.is_blank(line):
-            verbose(line)
-            continue
+    def verbose(self, s):
+        if self.verbose_enabled:
+            self.log(s)
 
-        # Trim any leading and trailing whitespace
-        line = line.strip()
+    def error(self, line_number, message):
+        self.error_count += 1
+        self.log("Error {}:{}: {}.\n".format(self.file_name, line_number, message))
 
-        verbose('{}: {}'.format(pc, line))
+    def parse_line(self, line_number, line):
+        """Parse a single non-blank source line.
 
-        # Make line case-insensitive
-        line = line.lower()
+        Returns a tuple of whether the line is valid and its Line. Addresses
+        and symbol definitions are left to layout.
+        """
+        # Trim any leading and trailing whitespace and make line case-insensitive
+        line = line.strip().lower()
 
-        keyword, key, val, _, op, operands = ISA.get_parts(line)
+        keyword, key, val, label, op, operands = self.isa.get_parts(line)
+        valid = True
+        instr = None
 
         if keyword and op:
-            error(line_number,
-                  "Cannot have {} and {} in the same line".format(op, keyword))
-            success = False
+            self.error(line_number,
+                       "Cannot have {} and {} in the same line".format(op, keyword))
+            valid = False
+
+        if keyword == 'word' or op:
+            name = keyword if keyword == 'word' else op
+            instr = self.dispatch.get(name)
+            if instr is None:
+                self.error(
+                    line_number, "instruction '{}' is not defined in the current ISA".format(name))
+                valid = False
+
+        return (valid, Line(line_number, keyword, key, val, label, op, operands, instr))
+
+    def layout(self, line, pc, symbol_table):
+        """Place a parsed line at pc, adding its definitions to symbol_table.
+
+        Returns a tuple of whether the line is valid and the address of the
+        line following it.
+        """
+        valid = True
+        keyword, key, val = line.keyword, line.key, line.value
 
         if keyword == 'orig':
             # Sanity check
             if not val:
-                error(line_count, "{} is not valid format for {}".format(keyword, val))
+                self.error(line.line_number, "{} is not valid format for {}".format(keyword, val))
+                valid = False
+            else:
+                try:
+                    address = parse_number(val)
+                    if 0 <= address < ADDRESS_LIMIT:
+                        pc = address
+                    else:
+                        self.error(line.line_number, "{} is outside the address space".format(val))
+                        valid = False
+                except (AttributeError, ValueError) as e:
+                    self.error(line.line_number, "{} is not a valid number format".format(val))
+                    valid = False
+
+        if line.label:
+            if line.label in symbol_table:
+                self.error(line.line_number,
+                           "label '{}' is defined more than once".format(line.label))
+                valid = False
+            else:
+                symbol_table[line.label] = pc
+
+        if keyword and key:
+            if key in symbol_table:
+                self.error(line.line_number, "label '{}' is defined more than once".format(key))
+                valid = False
+            else:
+                try:
+                    symbol_table[key] = parse_number(val)
+                except (AttributeError, ValueError) as e:
+                    self.error(line.line_number, "{} is not a valid number format".format(val))
+                    valid = False
+
+        if line.instr is not None:
+            pc += line.instr.size * self.isa.INSTRUCTION_OFFSET
+            # Reported once, on the line running past it
+            if pc > ADDRESS_LIMIT >= pc - line.instr.size * self.isa.INSTRUCTION_OFFSET:
+                self.error(line.line_number, "{} is past the end of the address space".format(
+                    line.opcode or line.keyword))
+                valid = False
+
+        return (valid, pc)
+
+    def encode_line(self, line, pc):
+        """Encode an instruction line placed at pc.
+
+        Returns the list of encoded words, or None if it cannot be encoded.
+        """
+        operands = line.value if line.keyword == 'word' else line.operands
+
+        try:
+            if self.encoding_cache is not None:
+                return self.encoding_cache.encode(
+                    line.instr, line.keyword if line.keyword == 'word' else line.opcode, operands,
+                    pc, self.symbol_table, self.params)
+
+            return line.instr.encode(operands, pc=pc, symbols=self.symbol_table,
+                                     params=self.params)
+        except Exception as e:
+            self.error(line.line_number, str(e))
+            return None
+
+    def encode_batch(self, lines):
+        """Encode whatever lines the ISA can encode all at once.
+
+        ISAs may define encode_batch(instructions, symbols), taking
+        (mnemonic, operands) pairs and returning a list with the word of
+        every instruction that only needs its operands (None for the rest,
+        or None overall if it cannot be used). Returns that list, or None for
+        short programs and ISAs without it.
+        """
+        encode_batch = getattr(self.isa, 'encode_batch', None)
+        if encode_batch is None or len(lines) < BATCH_MIN_LINES:
+            return None
+
+        return encode_batch([(line.opcode, line.operands) for line in lines], self.symbol_table)
+
+    def pass1(self, file, keep_lines=True):
+        """Build the symbol table, returning whether the source is valid and its lines.
+
+        Without keep_lines only the symbol table is built and no lines are
+        returned, for use with pass2_stream.
+        """
+        self.verbose("\nBeginning Pass 1...\n")
+        ISA = self.isa
+        # Every run starts from an empty symbol table
+        self.symbol_table = symbol_table = {}
+        # use a program counter to keep track of addresses in the file
+        pc = 0
+        no_errors = True
+        lines = []
+
+        # Lines parsed for the scheduler, which lays them out afterwards
+        parsed_lines = []
+
+        for line_count, line in enumerate(file, 1):
+            # Skip blank lines and comments
+            if ISA.is_blank(line):
+                self.verbose(line)
+                continue
+
+            if self.scheduler is not None:
+                self.verbose(line.strip())
+                parsed, line = self.parse_line(line_count, line)
+                no_errors = no_errors and parsed
+                parsed_lines.append(line)
+                continue
+
+            self.verbose('{}: {}'.format(pc, line.strip()))
+
+            parsed, line = self.parse_line(line_count, line)
+            placed, pc = self.layout(line, pc, symbol_table)
+            no_errors = no_errors and parsed and placed
+
+            # Only lines that pass 2 has to act upon are kept
+            if keep_lines and (line.keyword == 'orig' or line.instr is not None):
+                lines.append(line)
+
+        if self.scheduler is not None:
+            if no_errors:
+                parsed_lines, filled, slots = self.scheduler(parsed_lines)
+                self.log("Filled {} of {} delay slots.".format(filled, slots))
+
+            for line in parsed_lines:
+                placed, pc = self.layout(line, pc, symbol_table)
+                no_errors = no_errors and placed
+                if keep_lines and (line.keyword == 'orig' or line.instr is not None):
+                    lines.append(line)
+
+        self.verbose("\nFinished Pass 1.\n")
+
+        return (no_errors, lines)
+
+    def pass1_parallel(self, file, jobs, chunk_lines=PASS1_CHUNK_LINES):
+        """Run pass 1 on a pool of jobs worker processes.
+
+        The source is split into chunks of chunk_lines that workers parse
+        and lay out from address 0, recording the size of every chunk and
+        the labels it defines relative to its start. A prefix sum over the
+        chunk sizes, restarting at every chunk containing an .orig, then
+        gives every chunk its start address and the final symbol table.
+        Errors are reported in source order as pass1 reports them; lines
+        are not echoed in verbose mode. Programs of ISAs with a scheduler are
+        run through pass1 instead.
+        """
+        if self.scheduler is not None:
+            return self.pass1(file)
+
+        self.verbose("\nBeginning Pass 1...\n")
+        self.symbol_table = symbol_table = {}
+        file = iter(file)
+        tasks = iter(lambda: list(itertools.islice(file, chunk_lines)), [])
+        tasks = ((index * chunk_lines + 1, texts) for index, texts in enumerate(tasks))
+
+        no_errors = True
+        lines = []
+        base = 0
+
+        pool = multiprocessing.Pool(jobs, __init_pass_worker__,
+                                    (isa_module_name(self.isa), self.params, self.file_name,
+                                     {}, False, 0))
+        try:
+            for chunk in pool.imap(__layout_chunk__, tasks):
+                valid, fields, definitions, end, based, messages, errors = chunk
+                no_errors = no_errors and valid
+                self.error_count += errors
+                messages = collections.deque(messages)
+
+                for line_number, name, value, relative in definitions:
+                    while messages and messages[0][0] <= line_number:
+                        self.log(messages.popleft()[1])
+
+                    if name in symbol_table:
+                        self.error(line_number, "label '{}' is defined more than once".format(name))
+                        no_errors = False
+                    else:
+                        symbol_table[name] = base + value if relative else value
+
+                for line_number, message in messages:
+                    self.log(message)
+
+                linked = __link_lines__(self.dispatch, fields)
+                if not based and base <= ADDRESS_LIMIT < base + end:
+                    # Workers only see the addresses of chunks with an .orig
+                    pc = base
+                    for line in linked:
+                        if line.instr is not None:
+                            pc += line.instr.size * self.isa.INSTRUCTION_OFFSET
+                        if pc > ADDRESS_LIMIT:
+                            self.error(line.line_number, "{} is past the end of the address space".format(
+                                line.opcode or line.keyword))
+                            no_errors = False
+                            break
+
+                lines.extend(linked)
+                base = end if based else base + end
+        finally:
+            pool.terminate()
+            pool.join()
+
+        self.verbose("\nFinished Pass 1.\n")
+        return (no_errors, lines)
+
+    def pass2(self, lines):
+        self.verbose("\nBeginning Pass 2...\n")
+        success, results = self.encode_lines(lines)
+        self.verbose("\nFinished Pass 2.\n")
+        if self.encoding_cache is not None:
+            self.verbose(repr(self.encoding_cache))
+        return (success, results)
+
+    def encode_lines(self, lines, pc=0):
+        """Encode lines kept by pass1, the first of them placed at pc.
+
+        Returns a tuple of whether every line could be encoded and an Image
+        of the encoded words.
+        """
+        offset = self.isa.INSTRUCTION_OFFSET
+
+        success = True
+        results = Image(self.isa.BIT_WIDTH)
+        batch = self.encode_batch(lines)
+
+        for index, line in enumerate(lines):
+            if self.verbose_enabled:
+                self.verbose('{}: {}'.format(pc, ' '.join(
+                    part for part in (line.keyword, line.value, line.opcode, line.operands) if part)))
+
+            if line.keyword == 'orig':
+                pc = parse_number(line.value)
+                continue
+
+            word = batch[index] if batch else None
+            if word is not None:
+                results.append(pc, word)
+                pc += line.instr.size * offset
+                continue
+
+            assembled = self.encode_line(line, pc)
+            if assembled is None:
                 success = False
 
-            try:
-                if val.startswith('0x'):
-                    pc = int(val, 16)
-                elif val.startswith('0b'):
-                    pc = int(val, 2)
+            if assembled:
+                results.extend(pc, assembled, offset)
+                pc += line.instr.size * offset
+
+        return (success, results)
+
+    def pass2_parallel(self, lines, jobs, chunk_lines=PASS2_CHUNK_LINES):
+        """Run pass 2 on a pool of jobs worker processes.
+
+        The lines are split into chunks of chunk_lines, each starting at the
+        address pass 1 placed it at, and encoded by workers holding a copy of
+        the symbol table (sent once per worker). Messages and words are
+        merged back in source order, so the result is the same as pass2's.
+        Lines reordered by a scheduler are encoded by pass2 instead.
+        """
+        if self.scheduler is not None:
+            return self.pass2(lines)
+
+        self.verbose("\nBeginning Pass 2...\n")
+        offset = self.isa.INSTRUCTION_OFFSET
+
+        # Dispatch entries cannot be pickled, workers look them up again
+        tasks = []
+        pc = 0
+        for start in range(0, len(lines), chunk_lines):
+            chunk = lines[start:start + chunk_lines]
+            tasks.append((pc, [line[:-1] for line in chunk]))
+
+            for line in chunk:
+                if line.keyword == 'orig':
+                    pc = parse_number(line.value)
                 else:
-                    pc = int(val)
+                    pc += line.instr.size * offset
+
+        success = True
+        results = Image(self.isa.BIT_WIDTH)
+
+        pool = multiprocessing.Pool(jobs, __init_pass_worker__,
+                                    (isa_module_name(self.isa), self.params, self.file_name,
+                                     self.symbol_table, self.verbose_enabled,
+                                     self.encoding_cache.maxsize if self.encoding_cache else 0))
+        try:
+            for encoded, chunk, messages, errors in pool.imap(__encode_chunk__, tasks):
+                for message in messages:
+                    self.log(message)
+                self.error_count += errors
+                success = success and encoded
+                results.concat(chunk)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        self.verbose("\nFinished Pass 2.\n")
+        return (success, results)
+
+    def pass2_stream(self, file):
+        """Encode a source one line at a time, yielding (address, word) pairs.
+
+        Runs after a successful pass1(file, keep_lines=False) over the same
+        source, parsing every line again instead of keeping it, so memory use
+        does not grow with the size of the program. Errors are reported as
+        they are found and counted in error_count.
+        """
+        ISA = self.isa
+        offset = ISA.INSTRUCTION_OFFSET
+        pc = 0
+
+        for line_count, line in enumerate(file, 1):
+            if ISA.is_blank(line):
+                continue
+
+            line = self.parse_line(line_count, line)[1]
+
+            if line.keyword == 'orig':
+                pc = parse_number(line.value)
+                continue
+
+            if line.instr is None:
+                continue
+
+            assembled = self.encode_line(line, pc)
+            if assembled:
+                for i, word in enumerate(assembled):
+                    yield (pc + (i * offset), word)
+                pc += line.instr.size * offset
 
-            except ValueError as e:
-                error(line_count, "{} is not a valid number format".format(val))
-                success = False
+    def assemble(self, file):
+        """Run both passes over an iterable of source lines.
 
-        if keyword == 'word':
-            instr = getattr(ISA, ISA.instruction_class(keyword))
-            assembled = None
+        Returns a tuple of whether assembly succeeded and an Image of
+        (address, word) pairs, where each word is an encoded integer.
+        """
+        success, lines = self.pass1(file)
+        if not success:
+            return (False, Image(self.isa.BIT_WIDTH))
 
-            if not val:
-                error(line_count, "{} is not valid format for {}".format(keyword, val))
-                success = False
+        return self.pass2(lines)
 
-            try:
-                if use_hex:
-                    assembled = instr.hex(val, pc=pc, instruction=keyword)
-                else:
-                    assembled = instr.binary(val, pc=pc, instruction=keyword)
-            except Exception as e:
-                error(line_count, str(e))
-                success = False
 
-            if assembled:
-                results.extend([(pc + (i * ISA.INSTRUCTION_OFFSET), instr)
-                                for i, instr in enumerate(assembled)])
-                pc += (instr.size() * ISA.INSTRUCTION_OFFSET)
+# The assembler of a pass1_parallel or pass2_parallel worker process, created
+# once by __init_pass_worker__
+__PASS_WORKER__ = None
+
 
-        elif op:
-            instr = getattr(ISA, ISA.instruction_class(op))
-            assembled = None
+def __init_pass_worker__(isa_name, params, file_name, symbol_table, verbose, encoding_cache_size):
+    global __PASS_WORKER__
+    __PASS_WORKER__ = Assembler(isa_name, params, verbose=verbose, file_name=file_name,
+                                encoding_cache_size=encoding_cache_size)
+    __PASS_WORKER__.symbol_table = symbol_table
+
+
+def __link_lines__(dispatch, fields):
+    """Turn Line fields sent without their dispatch entry back into Lines."""
+    lookup = dispatch.get
+    # tuple.__new__ skips the argument handling of Line(), twice as fast for many lines
+    return [tuple.__new__(Line, line + (lookup(line[1] if line[1] == 'word' else line[5]),))
+            for line in fields]
+
+
+def __layout_chunk__(task):
+    """Parse and lay out a chunk of source lines in a pass 1 worker.
+
+    Addresses start from 0 until the chunk's first .orig, after which they
+    are absolute. Returns whether the chunk is valid, the fields of its kept
+    lines, its definitions as (line number, name, value, relative to the
+    chunk's start) tuples, its end address, whether that is absolute, its
+    (line number, message) pairs and its number of errors.
+    """
+    first, texts = task
+    assembler = __PASS_WORKER__
+    is_blank = assembler.isa.is_blank
+    messages = []
+    current = [first]
+    assembler.log = lambda message: messages.append((current[0], message))
+    assembler.error_count = 0
+
+    no_errors = True
+    lines, definitions = [], []
+    pc, based = 0, False
+
+    for line_count, text in enumerate(texts, first):
+        if is_blank(text):
+            continue
+
+        current[0] = line_count
+        parsed, line = assembler.parse_line(line_count, text)
+        if line.keyword == 'orig' and not based:
             try:
-                if use_hex:
-                    assembled = instr.hex(operands, pc=pc, instruction=op)
-                else:
-                    assembled = instr.binary(operands, pc=pc, instruction=op)
-            except Exception as e:
-                error(line_count, str(e))
-                success = False
+                parse_number(line.value)
+                based = True
+            except (AttributeError, ValueError):  # Reported by layout, pc stays relative
+                pass
 
-            if assembled:
-                results.extend([(pc + (i * ISA.INSTRUCTION_OFFSET), instr)
-                                for i, instr in enumerate(assembled)])
-                pc += (instr.size() * ISA.INSTRUCTION_OFFSET)
+        # Symbols are checked for duplicates across chunks by pass1_parallel
+        defined = {}
+        placed, next_pc = assembler.layout(line, pc, defined)
+        no_errors = no_errors and parsed and placed
+
+        for name in (line.label, line.key if line.keyword else None):
+            if name in defined:
+                definitions.append((line_count, name, defined.pop(name),
+                                    name == line.label and not based))
+
+        if line.keyword == 'orig' or line.instr is not None:
+            lines.append(line[:-1])
+        pc = next_pc
 
-        line_count += 1
+    return (no_errors, lines, definitions, pc, based, messages, assembler.error_count)
 
-    verbose("\nFinished Pass 2.\n")
-    return (success, results)
+
+def __encode_chunk__(task):
+    """Encode a chunk of lines in a pass 2 worker, returning its messages instead of printing them."""
+    pc, fields = task
+    assembler = __PASS_WORKER__
+    messages = []
+    assembler.log = messages.append
+    assembler.error_count = 0
+
+    success, results = assembler.encode_lines(__link_lines__(assembler.dispatch, fields), pc)
+    return (success, results, messages, assembler.error_count)
 
 
 def separator(s):
@@ -238,14 +608,260 @@ def parse_params(values):
     return parsed
 
 
-def build_hex(number, width):
-    return "{0:0{1}X}".format(number, width)
+def parse_formats(value):
+    formats = [kind.strip().lower() for kind in value.split(',') if kind.strip()]
+
+    for kind in formats:
+        if kind not in FORMATS:
+            raise argparse.ArgumentTypeError(
+                "'{}' is not a valid output format (choose from {})".format(kind, ', '.join(FORMATS)))
+
+    return set(formats)
+
+
+def output_names(out_name, formats):
+    """Map every requested output format to the file it is written to, in FORMATS order."""
+    names = {'sym': out_name + '.sym'}
+    names.update((kind, out_name + cls.extension) for kind, cls in IMAGE_WRITERS.items())
+    return collections.OrderedDict((kind, names[kind]) for kind in FORMATS if kind in formats)
+
+
+def log_outputs(assembler, names):
+    if 'sym' in names:
+        assembler.log("Writing symbol table to {}...done!".format(names['sym']))
+
+    images = [name for kind, name in names.items() if kind != 'sym']
+    if images:
+        assembler.log("Writing to {}...done!".format(', '.join(images)))
+
+
+def write_outputs(assembler, results, out_name, formats, only_changed=False, **options):
+    """Write an assembled program in every requested format next to out_name.
+
+    options are passed on to every Writer. The image is walked once no
+    matter how many image formats are written. With only_changed, every
+    output is written to a temporary file first and only replaces the
+    existing one if their content differs; nothing is replaced if errors are
+    logged while writing.
+    Returns whether the image fits into the memory, which is left to the
+    caller to report.
+    """
+    names = output_names(out_name, formats)
+    errors = assembler.error_count
+
+    files = {}
+    try:
+        for kind, name in names.items():
+            binary = kind in IMAGE_WRITERS and IMAGE_WRITERS[kind].binary
+            if only_changed:
+                files[kind] = UpdatingFile(name, binary)
+            else:
+                files[kind] = open(name, 'wb' if binary else 'w')
+
+        fits = write_formats(files, assembler.isa, assembler.symbol_table, results, **options)
+    except Exception:
+        for write_file in files.values():
+            if only_changed:
+                write_file.discard()
+            else:
+                write_file.close()
+        raise
+
+    for kind, write_file in files.items():
+        if only_changed and assembler.error_count != errors:
+            write_file.discard()
+        elif write_file.close() is False:
+            assembler.verbose("{} is unchanged.".format(names[kind]))
+
+    return fits
+
+
+def dependencies(assembler, asmfile):
+    """Return the files the outputs of asmfile depend on."""
+    return [asmfile, os.path.abspath(inspect.getsourcefile(assembler.isa))]
+
+
+def assemble_file(assembler, asmfile, formats, cache=None, incremental=False, stream=False,
+                  only_changed=False, depfile=False, jobs=1, **options):
+    """Assemble one source file and write its outputs next to it.
+
+    With a BuildCache, outputs of a previous identical build are copied from
+    the cache instead. With incremental, the per-line state of the previous
+    run is kept in a .state file next to the outputs and only the lines an
+    edit affects are assembled again. With stream, the source is read twice
+    and encoded words go straight to the outputs, so memory use does not
+    depend on the size of the program. With only_changed, outputs whose
+    content did not change are left untouched, keeping their modification
+    time. With depfile, a Make rule listing the source and the ISA module as
+    prerequisites of the outputs is written to a .d file. With more than one
+    job, both passes over large programs run on a pool of that many processes.
+    options are passed on to write_outputs. Returns whether assembly
+    succeeded. Programs of ISAs with a scheduler are neither streamed nor
+    assembled incrementally.
+    """
+    assembler.file_name = os.path.basename(asmfile)
+    out_name = os.path.splitext(asmfile)[0]
+    names = output_names(out_name, formats)
+
+    if cache is not None:
+        with open(asmfile, 'rb') as read_file:
+            key = cache.key(read_file, assembler, formats, options)
+
+        if cache.get(key, names, copy_if_changed if only_changed else shutil.copyfile):
+            assembler.verbose("Found {} in the build cache.".format(asmfile))
+            log_outputs(assembler, names)
+            if depfile:
+                write_depfile(out_name + '.d', names.values(), dependencies(assembler, asmfile),
+                              only_changed)
+            return True
+
+    if assembler.scheduler is not None:
+        stream = incremental = False
+
+    if stream:
+        with open(asmfile, 'r') as read_file:
+            success = assembler.pass1(read_file, keep_lines=False)[0]
+
+        if success:
+            errors = assembler.error_count
+            with open(asmfile, 'r') as read_file:
+                fits = write_outputs(assembler, assembler.pass2_stream(read_file), out_name,
+                                     formats, only_changed, **options)
+            success = assembler.error_count == errors
+
+            if not success and not only_changed:
+                # Outputs were written up to the first error
+                for name in names.values():
+                    os.remove(name)
+    else:
+        with open(asmfile, 'r') as read_file:
+            source = read_file.read().splitlines(True)
+
+        if incremental:
+            reassembler = IncrementalAssembler(assembler)
+            reassembler.load(out_name + '.state')
+            success, results = reassembler.assemble(source)
+            if reassembler.state is not None:
+                reassembler.save(out_name + '.state')
+        else:
+            if jobs > 1 and len(source) >= PARALLEL_MIN_LINES:
+                success, lines = assembler.pass1_parallel(source, jobs)
+            else:
+                success, lines = assembler.pass1(source)
+
+            if success and jobs > 1 and len(lines) >= PARALLEL_MIN_LINES:
+                success, results = assembler.pass2_parallel(lines, jobs)
+            elif success:
+                success, results = assembler.pass2(lines)
+
+        if success:
+            try:
+                fits = write_outputs(assembler, results, out_name, formats, only_changed, **options)
+            except ImageError as e:
+                assembler.error(-1, str(e))
+                success = False
+                if not only_changed:
+                    for name in names.values():
+                        if os.path.exists(name):
+                            os.remove(name)
+
+    if success and not fits:
+        # Not fatal, the outputs are kept
+        assembler.error(-1, "Memory limit exceeded! Cannot be uploaded to ALTERA Cyclone V")
+
+    if not success:
+        assembler.log("Assemble failed.\n")
+        return False
+
+    log_outputs(assembler, names)
+    if depfile:
+        write_depfile(out_name + '.d', names.values(), dependencies(assembler, asmfile),
+                      only_changed)
+
+    if cache is not None and fits:
+        cache.put(key, names)
+
+    return True
+
+
+def read_manifest(path):
+    """Read a list of source files, one per line (# starts a comment)."""
+    base = os.path.dirname(path)
+    files = []
+
+    with open(path, 'r') as manifest:
+        for line in manifest:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                files.append(os.path.join(base, line))
+
+    return files
+
+
+# The assembler of a batch worker process, created once by __init_worker__
+__WORKER__ = None
+
+
+def __init_worker__(isa_name, params, verbose, encoding_cache_size, formats, cache, incremental,
+                    stream, options):
+    global __WORKER__
+    __WORKER__ = (Assembler(isa_name, params, verbose=verbose,
+                            encoding_cache_size=encoding_cache_size),
+                  formats, cache, incremental, stream, options)
+
+
+def __assemble_in_worker__(asmfile):
+    """Assemble a file in a batch worker, returning its messages instead of printing them."""
+    assembler, formats, cache, incremental, stream, options = __WORKER__
+    messages = []
+    assembler.log = messages.append
+
+    try:
+        success = assemble_file(assembler, asmfile, formats, cache, incremental, stream,
+                                **options)
+    except Exception as e:
+        messages.append("Error {}: {}.\n".format(asmfile, str(e)))
+        success = False
+
+    return (asmfile, success, messages)
+
+
+def assemble_batch(isa_name, params, asmfiles, formats, jobs=1, verbose=False, cache=None,
+                   incremental=False, stream=False, encoding_cache_size=0, **options):
+    """Assemble many files, loading the ISA once per worker process.
+
+    options are passed on to assemble_file.
+
+    Results are yielded as (file, success, messages) in the order of asmfiles,
+    whatever order the workers finish in.
+    """
+    initargs = (isa_name, params, verbose, encoding_cache_size, formats, cache, incremental,
+                stream, options)
+
+    if jobs <= 1:
+        __init_worker__(*initargs)
+        for asmfile in asmfiles:
+            yield __assemble_in_worker__(asmfile)
+        return
+
+    pool = multiprocessing.Pool(jobs, __init_worker__, initargs)
+    try:
+        for result in pool.imap(__assemble_in_worker__, asmfiles):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
 
 if __name__ == "__main__":
     # Parse arguments
     parser = argparse.ArgumentParser(
         'assembler.py', description='Assembles generic ISA-defined assembly code into hex or binary.')
-    parser.add_argument('asmfile', help='the .s file to be assembled')
+    parser.add_argument('asmfile', nargs='*', help='the .s file(s) to be assembled')
+    parser.add_argument('--manifest', required=False, type=str,
+                        help='a file listing additional .s files to assemble, one per line')
+    parser.add_argument('-j', '--jobs', required=False, type=int, default=1,
+                        help='number of worker processes assembling files in parallel, or encoding '
+                        'a single large file in parallel [default: 1]')
     parser.add_argument('-i', '--isa', required=False, type=str, default='cs3220',
                         help='define the Python ISA module to load [default: cs3220]')
     parser.add_argument('-m', '--memory', required=False, type=int, default=16384,
@@ -262,120 +878,118 @@ if __name__ == "__main__":
                         help='custom parameters to pass to an architecture, formatted as "key1=value1, key2=value2, key3=value3"')
     parser.add_argument('-ms', '--modelsim', action='store_true', required=False,
                         default=False, help='Generate the hex file for modelsim')
+    parser.add_argument('-e', '--emit', required=False, type=parse_formats,
+                        help='comma separated output formats to write from a single assembly, any of '
+                        'mif, bin (binary radix .mif), hex (modelsim), raw (binary memory image), '
+                        'ihex (Intel HEX), memh (Verilog $readmemh) and sym [default: mif]')
+    parser.add_argument('--endian', required=False, choices=('little', 'big'), default='little',
+                        help='byte order of the raw and ihex outputs [default: little]')
+    parser.add_argument('--compress-mif', action='store_true',
+                        help='merge runs of identical consecutive words into range entries in .mif and .bin')
+    parser.add_argument('--no-mif-comments', action='store_true',
+                        help='leave out the address comment before every entry in .mif and .bin')
+    parser.add_argument('--cache-dir', required=False, type=str,
+                        default=os.environ.get('ASSEMBLER_CACHE_DIR'),
+                        help='reuse outputs of identical earlier builds stored in this directory '
+                        '[default: $ASSEMBLER_CACHE_DIR, caching is off if unset]')
+    parser.add_argument('--cache-size', required=False, type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help='size limit of the build cache in MiB, least recently used outputs are evicted first '
+                        '[default: {}]'.format(DEFAULT_MAX_SIZE // (1024 * 1024)))
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always assemble, neither reading nor writing the build cache')
+    parser.add_argument('--incremental', action='store_true',
+                        help='keep per-line state in a .state file next to the outputs and only '
+                        'reassemble the lines affected by edits on the next run')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the source twice and write words as they are encoded instead of '
+                        'keeping the program in memory, for very large sources (not with raw, ihex '
+                        'or memh, which are written from the whole image)')
+    parser.add_argument('--encoding-cache-size', required=False, type=int, default=0,
+                        help='number of encoded instructions kept for reuse by lines with the same '
+                        'text, worth it for generated code repeating many lines (-v prints the hits '
+                        'and misses, try {}) [default: 0, off]'.format(DEFAULT_CACHE_SIZE))
+    parser.add_argument('--only-changed', action='store_true',
+                        help='only replace output files whose content changed, keeping the '
+                        'modification time of the others')
+    parser.add_argument('--depfile', action='store_true',
+                        help='also write a Make dependency file (.d) listing the source and ISA '
+                        'module the outputs depend on')
     args = parser.parse_args()
 
+    asmfiles = list(args.asmfile)
+    if args.manifest:
+        asmfiles.extend(read_manifest(args.manifest))
+
+    if not asmfiles:
+        parser.error('no .s file to assemble')
+
+    if args.stream and args.incremental:
+        parser.error('--stream and --incremental cannot be combined')
+
     # Try to dynamically load ISA module
     try:
-        ISA = importlib.import_module(args.isa)
+        isa = load_isa(args.isa)
     except Exception as e:
         print("Error: Failed to load ISA definition module '{}'. {}\n".format(
             args.isa, str(e)))
         exit(1)
 
-    print("Assembling for {} architecture...".format(ISA.__name__))
+    print("Assembling for {} architecture...".format(isa.__name__))
 
     # Pass in custom parameters
+    params = parse_params(args.params)
     try:
-        ISA.receive_params(parse_params(args.params))
+        isa.receive_params(params)
     except Exception as e:
         print("Error: Failed to parse custom parameters for {}. {}\n".format(
-            ISA.__name__, str(e)))
+            isa.__name__, str(e)))
         exit(1)
 
-    VERBOSE = args.verbose
-    FILE_NAME = os.path.basename(args.asmfile)
+    if args.emit:
+        formats = args.emit
+    elif args.modelsim:
+        formats = set(['hex'])
+    else:
+        formats = set(['bin' if args.bin else 'mif'])
 
-    with open(args.asmfile, 'r') as read_file:
-        if not pass1(read_file):
-            print("Assemble failed.\n")
+    if args.sym:
+        formats.add('sym')
+
+    bulk = sorted(kind for kind in formats if issubclass(IMAGE_WRITERS.get(kind, object), BulkWriter))
+    if args.stream and bulk:
+        parser.error('--stream cannot write {}, which need the whole image'.format(', '.join(bulk)))
+
+    options = {'sep': args.separator, 'depth': args.memory or ALTERA_SIZE,
+               'use_hex': not args.bin, 'endian': args.endian,
+               'compress_mif': args.compress_mif, 'mif_comments': not args.no_mif_comments}
+
+    cache = None
+    if args.cache_dir and not args.no_cache:
+        cache = BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    if len(asmfiles) == 1:
+        assembler = Assembler(isa, params, verbose=args.verbose,
+                              encoding_cache_size=args.encoding_cache_size)
+        if not assemble_file(assembler, asmfiles[0], formats, cache, args.incremental,
+                             args.stream, args.only_changed, args.depfile, args.jobs,
+                             **options):
             exit(1)
-
-        success, results = pass2(read_file, not args.bin)
+        exit(0)
+
+    failed = 0
+    for asmfile, success, messages in assemble_batch(args.isa, params, asmfiles, formats,
+                                                     jobs=args.jobs, verbose=args.verbose,
+                                                     cache=cache, incremental=args.incremental,
+                                                     encoding_cache_size=args.encoding_cache_size,
+                                                     stream=args.stream,
+                                                     only_changed=args.only_changed,
+                                                     depfile=args.depfile, **options):
+        print("{}:".format(asmfile))
+        for message in messages:
+            print(message)
         if not success:
-            print("Assemble failed.\n")
-            exit(1)
-
-    outFileName = os.path.splitext(args.asmfile)[0]
-    code_ext = '.bin' if args.bin else '.mif'
-    sep = args.separator
+            failed += 1
 
-    if args.sym:
-        sym_ext = '.sym'
-        print("Writing symbol table to {}...".format(
-            outFileName + sym_ext), end="")
-
-        sym_sorted = sorted(ISA.SYMBOL_TABLE.items(),
-                            key=operator.itemgetter(1))
-
-        with open(outFileName + sym_ext, 'w') as write_file:
-            for (symbol, addr) in sym_sorted:
-                write_file.write("{}: {}\n".format(symbol, hex(addr)))
-
-        print('done!')
-
-    if not args.modelsim:
-        print("Writing to {}...".format(outFileName + code_ext), end="")
-        with open(outFileName + code_ext, 'w') as write_file:
-            mem_size = 16384
-            if args.memory:
-                mem_size = args.memory
-            altera_size = 16384
-
-            data_radix = 'BIN' if args.bin else 'HEX'
-            write_file.write("WIDTH={};{}".format(ISA.BIT_WIDTH, sep))
-            write_file.write("DEPTH={};{}".format(mem_size, sep))
-            write_file.write("ADDRESS_RADIX={};{}".format('HEX', sep))
-            write_file.write("DATA_RADIX={};{}".format(data_radix, sep))
-            write_file.write("CONTENT BEGIN{}".format(sep))
-
-            pre_mem = -1
-            for pc, instr in results:
-                mem_addr = pc // ISA.INSTRUCTION_OFFSET
-
-                if pre_mem + 1 != mem_addr:
-                    write_file.write("[{}..{}] : {};{}".format(
-                        build_hex(pre_mem + 1, 8), build_hex(mem_addr - 1, 8), 'DEAD', sep))
-
-                write_file.write("-- @ 0x{}{}".format(build_hex(pc, 8), sep))
-                write_file.write("{} : {};{}".format(
-                    build_hex(mem_addr, 8), instr, sep))
-                pre_mem = mem_addr
-
-            if pre_mem >= mem_size:
-                error(-1, "Memory limit exceeded! Cannot be uploaded to ALTERA Cyclone V")
-
-            if pre_mem < mem_size:
-                write_file.write("[{}..{}] : {};{}".format(
-                    build_hex(pre_mem + 1, 8), build_hex(altera_size - 1, 8), 'DEAD', sep))
-
-            write_file.write("END;")
-    else:
-        print("Writing to {}...".format(outFileName + '.hex'), end="")
-        with open(outFileName + '.hex', 'w') as write_file:
-            mem_size = 16384
-            if args.memory:
-                mem_size = args.memory
-            altera_size = 16384
-
-            # data_radix = 'BIN' if args.bin else 'HEX'
-            # write_file.write("WIDTH={};{}".format(ISA.BIT_WIDTH, sep))
-            # write_file.write("DEPTH={};{}".format(mem_size, sep))
-            # write_file.write("ADDRESS_RADIX={};{}".format('HEX', sep))
-            # write_file.write("DATA_RADIX={};{}".format(data_radix, sep))
-            # write_file.write("CONTENT BEGIN{}".format(sep))
-
-            pre_mem = -1
-            for pc, instr in results:
-                mem_addr = pc // ISA.INSTRUCTION_OFFSET
-
-                if pre_mem + 1 != mem_addr:
-                    write_file.write("@{}{}".format(
-                        build_hex(mem_addr, 8), sep))
-
-                write_file.write("{}{}".format(instr, sep))
-                pre_mem = mem_addr
-
-            if pre_mem >= mem_size:
-                error(-1, "Memory limit exceeded! Cannot be uploaded to ALTERA Cyclone V")
-
-    print('done!')
+    print("Assembled {} files, {} failed.".format(len(asmfiles), failed))
+    if failed:
+        exit(1)
@@ -0,0 +1,216 @@
+"""generate.py: Synthetic assembly programs for benchmarking.
+
+Programs are built from blocks of BLOCK_LINES lines, each starting with a
+label. Every line is drawn at random (seeded, so a program can be generated
+again identically) from a weighted mix of R-type, immediate, branch, memory,
+pseudo-instruction and data lines, with branches only targeting the labels of
+nearby blocks so their offsets stay in range however long the program is.
+The cs3220 programs also define constants with .NAME lines, which the LC
+architectures do not support.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import random
+
+# Lines per labelled block
+BLOCK_LINES = 32
+
+__CS3220_REGISTERS__ = ('zero', 'a0', 'a1', 'a2', 'a3', 't0', 't1', 's0', 's1', 's2', 'fp', 'sp', 'ra')
+__LC_REGISTERS__ = ('$zero', '$at', '$v0', '$a0', '$a1', '$a2', '$t0', '$t1', '$t2',
+                    '$s0', '$s1', '$s2', '$k0', '$sp', '$fp', '$ra')
+
+
+class Program(object):
+    """State shared by the lines of a program being generated."""
+
+    def __init__(self, isa, seed, blocks):
+        self.isa = isa
+        self.rnd = random.Random(seed)
+        self.blocks = blocks
+        self.block = 0
+        # Constants defined so far (cs3220 .NAME)
+        self.names = []
+
+    def label(self, block=None):
+        return 'b{}'.format(self.block if block is None else block)
+
+    def target(self):
+        """Return the label of a block near the current one."""
+        block = self.block + self.rnd.randint(-2, 1)
+        return self.label(min(max(block, 0), self.blocks - 1))
+
+    def pick(self, choices):
+        return self.rnd.choice(choices)
+
+
+def __weighted__(rnd, kinds):
+    point = rnd.random() * sum(weight for weight, _ in kinds)
+    for weight, kind in kinds:
+        point -= weight
+        if point < 0:
+            return kind
+    return kinds[-1][1]
+
+
+def __cs3220_line__(program):
+    rnd, reg = program.rnd, lambda: program.pick(__CS3220_REGISTERS__)
+    kind = __weighted__(rnd, __CS3220_MIX__)
+
+    if kind == 'r':
+        op = program.pick(('add', 'sub', 'and', 'or', 'xor', 'nand', 'nor', 'nxor',
+                           'rshf', 'lshf', 'eq', 'lt', 'le', 'ne'))
+        return '\t{}\t{},{},{}'.format(op, reg(), reg(), reg())
+    elif kind == 'imm':
+        op = program.pick(('addi', 'andi', 'ori', 'xori'))
+        imm = rnd.randint(-2048, 2047) if rnd.random() < 0.8 else hex(rnd.randint(0, 0x7FFF))
+        return '\t{}\t{},{},{}'.format(op, reg(), reg(), imm)
+    elif kind == 'branch':
+        op = program.pick(('beq', 'blt', 'ble', 'bne'))
+        return '\t{}\t{},{},{}'.format(op, reg(), reg(), program.target())
+    elif kind == 'mem':
+        offset = program.pick(program.names) if rnd.random() < 0.3 else 4 * rnd.randint(-64, 64)
+        return '\t{}\t{},{}({})'.format(program.pick(('lw', 'sw')), reg(), offset, reg())
+    elif kind == 'pseudo':
+        form = rnd.randrange(7)
+        if form == 0:
+            return '\tnot\t{},{}'.format(reg(), reg())
+        elif form == 1:
+            return '\t{}\t{},{},{}'.format(program.pick(('ge', 'gt')), reg(), reg(), reg())
+        elif form == 2:
+            return '\t{}\t{},{},{}'.format(program.pick(('bgt', 'bge')), reg(), reg(),
+                                           program.target())
+        elif form == 3:
+            return '\tsubi\t{},{},{}'.format(reg(), reg(), rnd.randint(0, 255))
+        elif form == 4:
+            return '\tbr\t{}'.format(program.target())
+        elif form == 5:
+            return '\tret'
+        return '\t{}\t0({})'.format(program.pick(('call', 'jmp')), reg())
+    elif kind == 'word':
+        value = program.target() if rnd.random() < 0.2 else '0x{:08X}'.format(rnd.getrandbits(32))
+        return '\t.WORD\t{}'.format(value)
+    elif kind == 'name':
+        name = 'c{}'.format(len(program.names))
+        program.names.append(name)
+        return '.NAME\t{}=0x{:X}'.format(name, 4 * rnd.randint(0, 0x1FFF))
+    elif kind == 'comment':
+        return '; {} block {}'.format(program.pick(('loop', 'check', 'update')), program.block)
+    return ''
+
+
+def __cs3220_header__(program):
+    program.names.extend(['c0', 'c1'])
+    return ['; generated CS-3220 benchmark program',
+            '.NAME\tc0=0x1000',
+            '.NAME\tc1=0x2000',
+            '\t.ORIG 0x100']
+
+
+__CS3220_MIX__ = ((30, 'r'), (22, 'imm'), (12, 'branch'), (14, 'mem'), (10, 'pseudo'),
+                  (5, 'word'), (3, 'name'), (3, 'comment'), (1, 'blank'))
+
+
+def __lc_line__(program):
+    rnd, reg = program.rnd, lambda: program.pick(__LC_REGISTERS__)
+    mix, r_ops, mem_ops, pseudo_ops, branch = __LC_ISAS__[program.isa]
+    kind = __weighted__(rnd, mix)
+
+    if kind == 'r':
+        return '\t{} {}, {}, {}'.format(program.pick(r_ops), reg(), reg(), reg())
+    elif kind == 'neg':
+        return '\tneg {}, {}'.format(reg(), reg())
+    elif kind == 'imm':
+        return '\taddi {}, {}, {}'.format(reg(), reg(), rnd.randint(-512, 511))
+    elif kind == 'shf':
+        return '\t{} {}, {}, {}'.format(program.pick(('shfll', 'shfrl', 'shfra')),
+                                        reg(), reg(), rnd.randint(0, 31))
+    elif kind == 'branch':
+        return branch(program)
+    elif kind == 'mem':
+        return '\t{} {}, {}({})'.format(program.pick(mem_ops), reg(), rnd.randint(-64, 64), reg())
+    elif kind == 'jalr':
+        return '\tjalr {}, {}'.format(reg(), reg())
+    elif kind == 'pseudo':
+        # la/lea cannot target $zero
+        return '\t' + program.pick(pseudo_ops).format(program.pick(__LC_REGISTERS__[1:]),
+                                                      program.target())
+    elif kind == 'word':
+        return '\t{} {}'.format(program.pick(('.word', '.fill')), rnd.randint(-(1 << 20), 1 << 20))
+    elif kind == 'comment':
+        return '! {} block {}'.format(program.pick(('loop', 'check', 'update')), program.block)
+    return ''
+
+
+def __lc_header__(program):
+    return ['! generated {} benchmark program'.format(program.isa)]
+
+
+def __lc2200_branch__(program):
+    return '\tbeq {}, {}, {}'.format(
+        program.pick(__LC_REGISTERS__), program.pick(__LC_REGISTERS__), program.target())
+
+
+def __lc32200a_branch__(program):
+    return '\t{} {}'.format(
+        program.pick(('br', 'brn', 'brz', 'brp', 'brnz', 'brzp', 'brnp', 'brnzp')), program.target())
+
+
+def __lc32200b_branch__(program):
+    return '\t{} {}, {}, {}'.format(program.pick(('beq', 'bne')), program.pick(__LC_REGISTERS__),
+                                    program.pick(__LC_REGISTERS__), program.target())
+
+
+__LC2200_MIX__ = ((25, 'r'), (8, 'neg'), (22, 'imm'), (12, 'branch'), (14, 'mem'),
+                  (4, 'jalr'), (7, 'pseudo'), (5, 'word'), (2, 'comment'), (1, 'blank'))
+
+__LC32200_MIX__ = ((25, 'r'), (20, 'imm'), (8, 'shf'), (12, 'branch'), (14, 'mem'),
+                   (4, 'jalr'), (9, 'pseudo'), (5, 'word'), (2, 'comment'), (1, 'blank'))
+
+# Per LC architecture: line mix, R-type, memory and pseudo-instructions, branch generator
+__LC_ISAS__ = {
+    'lc2200':   (__LC2200_MIX__, ('add',), ('lw', 'sw'), ('la {}, {}', 'noop', 'halt'),
+                 __lc2200_branch__),
+    'lc32200a': (__LC32200_MIX__, ('add', 'nand'), ('ldr', 'str'),
+                 ('lea {}, {}', 'noop', 'ret', 'halt'), __lc32200a_branch__),
+    'lc32200b': (__LC32200_MIX__, ('add', 'nand'), ('ldr', 'str'),
+                 ('lea {}, {}', 'noop', 'ret', 'halt'), __lc32200b_branch__),
+}
+
+# Line and header generators of every supported ISA
+GENERATORS = {
+    'cs3220':   (__cs3220_header__, __cs3220_line__),
+    'lc2200':   (__lc_header__, __lc_line__),
+    'lc32200a': (__lc_header__, __lc_line__),
+    'lc32200b': (__lc_header__, __lc_line__),
+}
+
+
+def generate(isa, lines, seed=0):
+    """Yield the lines (without newlines) of a program of about the given length."""
+    header, line = GENERATORS[isa]
+    blocks = max(1, (lines + BLOCK_LINES - 1) // BLOCK_LINES)
+    program = Program(isa, seed, blocks)
+
+    for text in header(program):
+        yield text
+
+    label = None
+    for count in range(lines):
+        program.block = count // BLOCK_LINES
+        if count % BLOCK_LINES == 0:
+            label = program.label()
+
+        text = line(program)
+        # A block's label goes on its first line that is not data or a definition
+        if label and not text.lstrip().startswith('.'):
+            text = '{}:{}'.format(label, text)
+            label = None
+        yield text
+
+
+def write_program(path, isa, lines, seed=0):
+    """Generate a program into the file at path."""
+    with open(path, 'w') as program:
+        for text in generate(isa, lines, seed):
+            program.write(text)
+            program.write('\n')
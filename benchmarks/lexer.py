@@ -0,0 +1,234 @@
+"""lexer.py: Time the shared lexer against the regular expressions it replaced.
+
+Run from the repository root:
+
+    python3 -m benchmarks.lexer
+    python3 -m benchmarks.lexer --lines 100000 --repeat 10
+
+Every test fixture (and a generated program of --lines lines per ISA) is
+split into its parts by the old per-ISA line expressions and by
+Lexer.is_blank and Lexer.parts, then the operands of every instruction are
+matched by the old operand expression of its syntax and by lexer.match.
+Both stages are reported in microseconds per line, the best of --repeat
+runs. The operands every instruction matches are recorded in one
+untimed assembly of the program, so both paths see exactly the same work.
+Operands are matched the way the compiled encoders match them: by the
+regular expression of their single form, or with lexer.match.
+"""
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import layouts
+import lexer
+from assembler import Assembler
+from benchmarks.generate import GENERATORS, write_program
+from benchmarks.run import DEFAULT_PARAMS
+
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+timer = getattr(time, 'perf_counter', time.time)
+
+FIXTURES = [
+    ('cs3220', 'tests/3220/*.asm'),
+    ('lc32200a', 'tests/lc32200a.s'),
+    ('lc32200b', 'tests/lc32200b.s'),
+]
+
+# The line expressions the ISAs used before the lexer
+__CS3220_LINE__ = (
+    re.compile(r'^\s*(;.*)?$'),
+    re.compile(r'^\s*(\.(?P<Keyword>\w+)?\s*((?P<Key>\w+)\s*\=)?\s*(?P<Value>[^;\s]+))?\s*'
+               r'((?P<Label>\w+):)?\s*((?P<Opcode>\.?[\w]+)\s*(?P<Operands>[^;]*))?(;.*)?'))
+__LC_LINE__ = (
+    re.compile(r'^\s*(!.*)?$'),
+    re.compile(r'^\s*((?P<Label>\w+):)?\s*((?P<Opcode>\.?[\w]+)(?P<Operands>[^!]*))?(!.*)?'))
+
+# The operand expressions they used, by the syntax of the instructions using them now
+__LC_R__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<RY>\$\w+?)\s*,\s*(?P<RZ>\$\w+?)\s*$')
+__LC_J__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<RY>\$\w+?)\s*$')
+__LC_I__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<RY>\$\w+?)\s*,\s*(?P<Offset>\S+?)\s*$')
+__LC_OFF__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<Offset>\S+?)\s*\((?P<RY>\$\w+?)\)\s*$')
+__LC_LEA__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<Offset>\S+?)\s*$')
+__LC_BR__ = re.compile(r'^\s*(?P<Offset>\S+?)\s*$')
+__LC_LA__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<Label>\w+?)\s*$')
+
+__CS3220_R__ = re.compile(r'^\s*(?P<RD>\S+?)\s*,\s*(?P<RS>\S+?)\s*(,\s*(?P<RT>\S+?))?\s*$')
+__CS3220_IMM__ = re.compile(r'(^\s*(?P<RS>\w+?)\s*,)?\s*((?P<RT>\w+?)?\s*,)?\s*(?P<Immediate>\S+?)\s*$')
+__CS3220_MEM_JMP__ = re.compile(r'^(\s*(?P<RT>\w+?)\s*,)?\s*((?P<Immediate>\S+?)\s*\((?P<RS>\w+?)\))?\s*$')
+
+__CS3220_OPERANDS__ = {
+    'rd, rs, rt': __CS3220_R__,
+    'rd, rt, rs': __CS3220_R__,
+    'rd, rs': __CS3220_R__,
+    'rs, rt, imm': __CS3220_IMM__,
+    'rt, rs, imm': __CS3220_IMM__,
+    'imm': __CS3220_IMM__,
+    'rt, imm(rs)': __CS3220_MEM_JMP__,
+    'imm(rs)': __CS3220_MEM_JMP__,
+}
+__LC_OPERANDS__ = {
+    'rx, ry, rz': __LC_R__,
+    'rx, ry': __LC_J__,
+    'ry, rx': __LC_J__,
+    'rx, ry, offset': __LC_I__,
+    'rx, offset(ry)': __LC_OFF__,
+    'rx, offset': __LC_LEA__,
+    'offset': __LC_BR__,
+    'rx, label': __LC_LA__,
+}
+
+LEGACY = {
+    'cs3220': (__CS3220_LINE__, __CS3220_OPERANDS__),
+    'lc2200': (__LC_LINE__, __LC_OPERANDS__),
+    'lc32200a': (__LC_LINE__, __LC_OPERANDS__),
+    'lc32200b': (__LC_LINE__, __LC_OPERANDS__),
+}
+
+
+def record_operands(isa, source):
+    """Assemble source once, returning the (operands, forms) every operand match was asked for."""
+    assembler = Assembler(isa, DEFAULT_PARAMS.get(isa), log=lambda message: None)
+    module = assembler.isa
+    matches = []
+
+    def recording_match(operands, forms):
+        matches.append((operands, forms))
+        return lexer.match(operands, forms)
+
+    def recording_forms(syntax):
+        compiled = forms(syntax)
+
+        def recording_form(match_form):
+            def match(operands):
+                matches.append((operands, compiled))
+                return match_form(operands)
+            return match
+
+        return tuple((recording_form(match_form), fields) for match_form, fields in compiled)
+
+    # The encoders bind match and the forms of their syntax when they are
+    # compiled, the batch encoder looks match up
+    forms = layouts.forms
+    module.match = layouts.match = recording_match
+    layouts.forms = recording_forms
+    try:
+        assembler.dispatch = layouts.compile_dispatch(vars(module), module.INSTRUCTIONS, assembler.params)
+        success, lines = assembler.pass1(source)
+        if success:
+            assembler.pass2(lines)
+    finally:
+        module.match = layouts.match = lexer.match
+        layouts.forms = forms
+
+    return module, matches
+
+
+def __best__(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = timer()
+        function()
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(isa, source, repeat=5):
+    """Time both paths on the lines of source.
+
+    Returns the number of lines and the best times of the regex and the
+    lexer path, for splitting lines and for matching operands.
+    """
+    (blank, parts), operand_expressions = LEGACY[isa]
+    module, matches = record_operands(isa, source)
+    # As Assembler.parse_line sees them
+    lines = [(line, line.strip().lower()) for line in source]
+
+    def regex_lines():
+        for raw, line in lines:
+            if blank.match(raw) is None:
+                parts.match(line).group('Label', 'Opcode', 'Operands')
+
+    def lexer_lines():
+        is_blank, split = module.LEXER.is_blank, module.LEXER.parts
+        for raw, line in lines:
+            if not is_blank(raw):
+                split(line)
+
+    # Only the operands the old expressions matched (.fill values were not)
+    by_forms = dict((id(layouts.forms(syntax)), expression)
+                    for syntax, expression in operand_expressions.items())
+    matches = [(operands, forms) for operands, forms in matches if id(forms) in by_forms]
+    regex_matches = [(by_forms[id(forms)], operands) for operands, forms in matches]
+
+    def regex_operands():
+        for expression, operands in regex_matches:
+            expression.match(operands).groups()
+
+    # As the encoders match them: in place if there is a single form of groups
+    single = [(operands, forms[0][0] if len(forms) == 1 and forms[0][1] is lexer.GROUPS else None, forms)
+              for operands, forms in matches]
+
+    def lexer_operands():
+        match = lexer.match
+        for operands, match_form, forms in single:
+            if match_form is not None:
+                match_form(operands).groups()
+            else:
+                match(operands, forms)
+
+    return (len(lines), len(matches),
+            __best__(regex_lines, repeat), __best__(lexer_lines, repeat),
+            __best__(regex_operands, repeat), __best__(lexer_operands, repeat))
+
+
+def __per__(seconds, count):
+    return seconds * 1e6 / count if count else 0.0
+
+
+def report(name, result):
+    lines, matches, regex_lines, lexer_lines, regex_operands, lexer_operands = result
+    print('{:24} {:>8} {:>8.2f} {:>8.2f} {:>7.2f}x {:>8} {:>8.2f} {:>8.2f} {:>7.2f}x'.format(
+        name, lines, __per__(regex_lines, lines), __per__(lexer_lines, lines),
+        regex_lines / lexer_lines, matches, __per__(regex_operands, matches),
+        __per__(lexer_operands, matches), regex_operands / lexer_operands if matches else 0.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser('benchmarks.lexer',
+                                     description='Times the lexer against the regular expressions it replaced.')
+    parser.add_argument('-n', '--lines', type=int, default=10000,
+                        help='lines of the generated program timed for every ISA, 0 for none [default: 10000]')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='timed runs per program, the fastest is reported [default: 5]')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the program generator [default: 0]')
+    args = parser.parse_args()
+
+    print('{:24} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'program', 'lines', 'regex', 'lexer', '', 'operands', 'regex', 'lexer', ''))
+
+    for isa, pattern in FIXTURES:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, 'r') as source:
+                report(os.path.basename(path), benchmark(isa, source.readlines(), args.repeat))
+
+    if args.lines:
+        work_dir = tempfile.mkdtemp(prefix='asm-bench-')
+        try:
+            for isa in sorted(GENERATORS):
+                path = os.path.join(work_dir, '{}-{}.s'.format(isa, args.lines))
+                write_program(path, isa, args.lines, args.seed)
+                with open(path, 'r') as source:
+                    report(os.path.basename(path), benchmark(isa, source.readlines(), args.repeat))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print('Times are microseconds per line (per operand match), the best of {} runs.'.format(args.repeat))
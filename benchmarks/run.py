@@ -0,0 +1,216 @@
+"""run.py: Time the assembler on generated programs.
+
+Run from the repository root:
+
+    python3 -m benchmarks.run --isa cs3220,lc2200 --lines 1000,100000 -o results.json
+    python3 -m benchmarks.run --lines 100000 --compare results.json
+
+Pass 1, pass 2 and output writing are timed separately (the best of
+--repeat runs) and reported with their throughput in source lines per
+second. Peak memory of each phase is measured with tracemalloc in one extra
+run, so tracing does not slow down the timed ones.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from assembler import Assembler, parse_formats, parse_params
+from benchmarks.generate import GENERATORS, write_program
+from writers import write_formats
+
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+timer = getattr(time, 'perf_counter', time.time)
+
+PHASES = ('pass1', 'pass2', 'write')
+
+# Parameters every ISA is benchmarked with
+DEFAULT_PARAMS = {
+    'lc32200b': {'delay_slots': '1'},
+}
+
+
+def run_once(isa, params, path, out_dir, formats, measure=None):
+    """Assemble the program at path once.
+
+    Returns the number of words and a dict with the value measure() returns
+    after every phase, or the phase's duration without measure.
+    """
+    messages = []
+    assembler = Assembler(isa, params, log=messages.append)
+    phases = {}
+
+    def finish(phase, start):
+        phases[phase] = measure() if measure else timer() - start
+
+    start = timer()
+    with open(path, 'r') as source:
+        success, lines = assembler.pass1(source)
+    finish('pass1', start)
+
+    if success:
+        start = timer()
+        success, results = assembler.pass2(lines)
+        finish('pass2', start)
+
+    if not success:
+        raise RuntimeError('{} does not assemble: {}'.format(path, ''.join(messages[:5])))
+
+    start = timer()
+    files = dict((kind, open(os.path.join(out_dir, 'out.' + kind), 'w')) for kind in formats)
+    try:
+        write_formats(files, assembler.isa, assembler.symbol_table, results)
+    finally:
+        for output in files.values():
+            output.close()
+    finish('write', start)
+
+    return (len(results), phases)
+
+
+def __peak__():
+    peak = tracemalloc.get_traced_memory()[1]
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    return peak
+
+
+def benchmark(isa, lines, formats, repeat=3, seed=0, params=None, memory=True):
+    """Benchmark one generated program, returning its result record."""
+    params = DEFAULT_PARAMS.get(isa) if params is None else params
+    work_dir = tempfile.mkdtemp(prefix='asm-bench-')
+
+    try:
+        path = os.path.join(work_dir, '{}-{}.s'.format(isa, lines))
+        write_program(path, isa, lines, seed)
+
+        best = dict((phase, None) for phase in PHASES)
+        for _ in range(repeat):
+            words, times = run_once(isa, params, path, work_dir, formats)
+            for phase in PHASES:
+                if best[phase] is None or times[phase] < best[phase]:
+                    best[phase] = times[phase]
+
+        peaks = None
+        if memory and tracemalloc is not None:
+            tracemalloc.start()
+            try:
+                peaks = run_once(isa, params, path, work_dir, formats, measure=__peak__)[1]
+            finally:
+                tracemalloc.stop()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(best.values())
+    return {
+        'isa': isa,
+        'lines': lines,
+        'words': words,
+        'seed': seed,
+        'params': params or {},
+        'formats': sorted(formats),
+        'seconds': best,
+        'total_seconds': total,
+        'lines_per_second': dict([(phase, lines / best[phase] if best[phase] else None)
+                                  for phase in PHASES] + [('total', lines / total)]),
+        'peak_bytes': peaks,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        return None
+
+
+def __mib__(size):
+    return '-' if size is None else '{:.1f}'.format(size / (1024.0 * 1024.0))
+
+
+def report(result, baseline=None):
+    """Print one result, with its speedup over a matching baseline result."""
+    seconds, rates = result['seconds'], result['lines_per_second']
+    peaks = result['peak_bytes'] or {}
+    line = '{:9} {:>9} {:>8.3f}s {:>8.3f}s {:>8.3f}s {:>11.0f}/s {:>8} MiB'.format(
+        result['isa'], result['lines'], seconds['pass1'], seconds['pass2'], seconds['write'],
+        rates['total'], __mib__(max(peaks.values()) if peaks else None))
+
+    if baseline:
+        line += '  {:.2f}x'.format(baseline['total_seconds'] / result['total_seconds'])
+
+    print(line)
+
+
+def load_baseline(path):
+    with open(path, 'r') as results:
+        saved = json.load(results)
+    return dict(((result['isa'], result['lines']), result) for result in saved['results'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser('benchmarks.run',
+                                     description='Times the assembler on generated programs.')
+    parser.add_argument('-i', '--isa', type=str, default=','.join(sorted(GENERATORS)),
+                        help='comma separated ISAs to benchmark [default: all]')
+    parser.add_argument('-n', '--lines', type=str, default='1000,10000,100000',
+                        help='comma separated program sizes in lines [default: 1000,10000,100000]')
+    parser.add_argument('-e', '--emit', type=parse_formats, default=set(['mif', 'hex', 'sym']),
+                        help='output formats written in the write phase [default: mif,hex,sym]')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='timed runs per program, the fastest is reported [default: 3]')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the program generator [default: 0]')
+    parser.add_argument('--params', type=str,
+                        help='custom parameters passed to every ISA instead of the defaults')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced run measuring peak memory')
+    parser.add_argument('-o', '--output', type=str,
+                        help='save the results as JSON to this file')
+    parser.add_argument('-c', '--compare', type=str,
+                        help='JSON results of an earlier run to report speedups against')
+    args = parser.parse_args()
+
+    isas = [isa.strip() for isa in args.isa.split(',') if isa.strip()]
+    for isa in isas:
+        if isa not in GENERATORS:
+            parser.error("no program generator for '{}' (choose from {})".format(
+                isa, ', '.join(sorted(GENERATORS))))
+
+    sizes = [int(size) for size in args.lines.split(',') if size.strip()]
+    baseline = load_baseline(args.compare) if args.compare else {}
+
+    print('{:9} {:>9} {:>9} {:>9} {:>9} {:>13} {:>12}'.format(
+        'isa', 'lines', 'pass1', 'pass2', 'write', 'total', 'peak'))
+
+    results = []
+    for isa in isas:
+        for size in sizes:
+            result = benchmark(isa, size, args.emit, args.repeat, args.seed,
+                               parse_params(args.params), not args.no_memory)
+            report(result, baseline.get((isa, size)))
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, output, indent=2, sort_keys=True)
+        print('Saved results to {}.'.format(args.output))
@@ -0,0 +1,138 @@
+"""buildcache.py: Content-addressed on-disk cache of assembled outputs.
+
+Every entry is a directory named after the hash of everything the outputs
+depend on (the source bytes, the sources of the assembler, the ISA
+definition and the writers, the parameters and the output options) holding one file per output format. A
+hit is written out by copying files, without assembling anything.
+
+Entries are evicted least recently used first (by directory mtime, which is
+refreshed on every hit) once the cache grows beyond its size limit.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import hashlib
+import inspect
+import os
+import shutil
+import sys
+import tempfile
+
+import encoding
+import image
+import layouts
+import lexer
+import scheduling
+import writers
+
+# Default size limit of a cache directory (bytes)
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def source_digest(modules):
+    """Return a SHA-256 hash object fed with the source files of modules."""
+    digest = hashlib.sha256()
+
+    for module in modules:
+        with open(inspect.getsourcefile(module), 'rb') as source:
+            digest.update(source.read())
+        digest.update(b'\0')
+
+    return digest
+
+
+def assembler_modules(assembler):
+    """Return the modules the words an Assembler encodes depend on.
+
+    These are the module of its class (parsing, layout and the encoding
+    driver, which is __main__ when run as a script), image, and the shared
+    encoding, layout and lexing modules, followed by its ISA definition.
+    """
+    return (sys.modules[type(assembler).__module__], image, encoding, layouts, lexer, scheduling,
+            assembler.isa)
+
+
+class BuildCache(object):
+    """A size-bounded cache of assembled outputs in a local directory."""
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, source, assembler, formats, options):
+        """Return the cache key of assembling source with an Assembler and output settings.
+
+        source is either bytes or a file opened in binary mode, which is read
+        in chunks.
+        """
+        digest = source_digest(assembler_modules(assembler) + (writers,))
+
+        if hasattr(source, 'read'):
+            for chunk in iter(lambda: source.read(1 << 20), b''):
+                digest.update(chunk)
+        else:
+            digest.update(source)
+        settings = (sorted((assembler.params or {}).items()), sorted(formats), sorted(options.items()))
+        digest.update(repr(settings).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def get(self, key, outputs, copy=shutil.copyfile):
+        """Copy a cached entry to the files in outputs (kind -> path).
+
+        Files are copied with copy(source, destination). Returns False,
+        leaving the files alone, if the entry is missing or does not hold
+        every requested kind.
+        """
+        entry = os.path.join(self.directory, key)
+        if not all(os.path.isfile(os.path.join(entry, kind)) for kind in outputs):
+            return False
+
+        for kind, path in outputs.items():
+            copy(os.path.join(entry, kind), path)
+
+        try:
+            os.utime(entry, None)
+        except OSError:  # Evicted by another process meanwhile
+            pass
+
+        return True
+
+    def put(self, key, outputs):
+        """Store the files in outputs (kind -> path) under key."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        for kind, path in outputs.items():
+            shutil.copyfile(path, os.path.join(staging, kind))
+
+        try:
+            os.rename(staging, os.path.join(self.directory, key))
+        except OSError:  # Already stored, possibly by a concurrent build
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits max_size."""
+        entries = []
+        total = 0
+
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, kind)) for kind in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+            total += size
+
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -1,5 +1,11 @@
-import re
-from lc2200 import Instruction
+from encoding import mask
+from layouts import ABSOLUTE, RELATIVE, Format, Value, compile_dispatch, forms, instruction, pc_relative, pseudo
+from lexer import Lexer, match
+
+try:
+    import numpy
+except ImportError:  # The batch encoder is optional
+    numpy = None
 
 """cs3220.py: A definition of the CS3220 architecture"""
 __authors__ = "Dhruv Mehra and Christopher Tam"
@@ -45,697 +51,200 @@ REGISTERS = {
     'ra':   15
 }
 
-SYMBOL_TABLE = {}
-
-ALIASES = {
-    'and': 'and_',
-    'or': 'or_',
-    'not': 'not_',
-}
-
-__R_BLANK_BITS__ = BIT_WIDTH - \
-    (PRIMARY_OPCODE_WIDTH + SECONDARY_OPCODE_WIDTH + 3 * REGISTER_WIDTH)
-__IMM_BLANK_BITS__ = BIT_WIDTH - \
-    (PRIMARY_OPCODE_WIDTH + IMMEDIATE_WIDTH + 2 * REGISTER_WIDTH)
-
-__RE_BLANK__ = re.compile(r'^\s*(;.*)?$')
-__RE_PARTS__ = re.compile(
-    r'^\s*(\.(?P<Keyword>\w+)?\s*((?P<Key>\w+)\s*\=)?\s*(?P<Value>[^;\s]+))?\s*((?P<Label>\w+):)?\s*((?P<Opcode>\.?[\w]+)\s*(?P<Operands>[^;]*))?(;.*)?')
-__RE_HEX__ = re.compile(r'0x[A-z0-9]*')
-__RE_IMM__ = re.compile(
-    r'(^\s*(?P<RS>\w+?)\s*,)?\s*((?P<RT>\w+?)?\s*,)?\s*(?P<Immediate>\S+?)\s*$')
-__RE_R__ = re.compile(
-    r'^\s*(?P<RD>\S+?)\s*,\s*(?P<RS>\S+?)\s*(,\s*(?P<RT>\S+?))?\s*$')
-__RE_MEM_JMP__ = re.compile(
-    r'^(\s*(?P<RT>\w+?)\s*,)?\s*((?P<Immediate>\S+?)\s*\((?P<RS>\w+?)\))?\s*$')
+# Bit positions of the instruction fields
+__PRIMARY_SHIFT__ = BIT_WIDTH - PRIMARY_OPCODE_WIDTH
+__SECONDARY_SHIFT__ = __PRIMARY_SHIFT__ - SECONDARY_OPCODE_WIDTH
+__IMM_SHIFT__ = 2 * REGISTER_WIDTH
+__RD_SHIFT__ = 2 * REGISTER_WIDTH
+__RS_SHIFT__ = REGISTER_WIDTH
+
+LEXER = Lexer(';', directives=True)
+
+# Instruction formats
+__R__ = Format(primary=(BIT_WIDTH - 1, __PRIMARY_SHIFT__),
+               secondary=(__PRIMARY_SHIFT__ - 1, __SECONDARY_SHIFT__),
+               rd=(__RD_SHIFT__ + REGISTER_WIDTH - 1, __RD_SHIFT__),
+               rs=(__RS_SHIFT__ + REGISTER_WIDTH - 1, __RS_SHIFT__),
+               rt=(REGISTER_WIDTH - 1, 0))
+__I__ = Format(primary=(BIT_WIDTH - 1, __PRIMARY_SHIFT__),
+               imm=(__IMM_SHIFT__ + IMMEDIATE_WIDTH - 1, __IMM_SHIFT__),
+               rs=(__RS_SHIFT__ + REGISTER_WIDTH - 1, __RS_SHIFT__),
+               rt=(REGISTER_WIDTH - 1, 0))
+__WORD__ = Format(value=(BIT_WIDTH - 1, 0))
+
+# Operand values: all of them are truncated to their field
+__IMM__ = Value(checked=False, labels=ABSOLUTE)
+__NEG_IMM__ = Value(checked=False, labels=ABSOLUTE, negate=True)
+__BRANCH__ = Value(checked=False, labels=RELATIVE, scale=INSTRUCTION_OFFSET)
+__JUMP__ = Value(checked=False, labels=ABSOLUTE, scale=INSTRUCTION_OFFSET)
+
+
+def __r__(mnemonic, secondary, syntax='rd, rs, rt'):
+    return instruction(mnemonic, __R__, syntax, primary=0, secondary=secondary)
+
+
+def __imm__(mnemonic, primary, syntax='rs, rt, imm', imm=__IMM__, **constants):
+    return instruction(mnemonic, __I__, syntax, {'imm': imm}, primary=primary, **constants)
+
+
+INSTRUCTIONS = [
+    __r__('eq', 0x08),
+    __r__('lt', 0x09),
+    __r__('le', 0x0a),
+    __r__('ne', 0x0b),
+    __r__('add', 0x20),
+    __r__('and', 0x24),
+    __r__('or', 0x25),
+    __r__('xor', 0x26),
+    __r__('sub', 0x28),
+    __r__('nand', 0x2c),
+    __r__('nor', 0x2d),
+    __r__('nxor', 0x2e),
+    __r__('rshf', 0x30),
+    __r__('lshf', 0x31),
+    # Comparisons the other way around
+    __r__('ge', 0x0a, 'rd, rt, rs'),
+    __r__('gt', 0x09, 'rd, rt, rs'),
+
+    __imm__('beq', 0b001000, imm=__BRANCH__),
+    __imm__('blt', 0b001001, imm=__BRANCH__),
+    __imm__('ble', 0b001010, imm=__BRANCH__),
+    __imm__('bne', 0b001011, imm=__BRANCH__),
+    __imm__('bgt', 0b001001, 'rt, rs, imm', imm=__BRANCH__),
+    __imm__('bge', 0b001010, 'rt, rs, imm', imm=__BRANCH__),
+    __imm__('br', 0b001000, 'imm', imm=__BRANCH__, rs=REGISTERS['zero'], rt=REGISTERS['zero']),
+
+    __imm__('addi', 0b100000),
+    __imm__('subi', 0b100000, imm=__NEG_IMM__),
+    __imm__('andi', 0b100100),
+    __imm__('ori', 0b100101),
+    __imm__('xori', 0b100110),
+    __imm__('lw', 0b010010, 'rt, imm(rs)'),
+    __imm__('sw', 0b011010, 'rt, imm(rs)'),
+
+    __imm__('jal', 0b001100, 'rt, imm(rs)', imm=__JUMP__),
+    __imm__('call', 0b001100, 'imm(rs)', imm=__JUMP__, rt=REGISTERS['ra']),
+    __imm__('jmp', 0b001100, 'imm(rs)', imm=__JUMP__, rt=10),
+    instruction('ret', __I__, primary=0b001100, imm=0, rs=REGISTERS['ra'], rt=10),
+
+    pseudo('not', 'rd, rs', [('nand', '{rd}, {rs}, {rs}')]),
+
+    # The .WORD directive
+    instruction('word', __WORD__, 'value', {'value': Value(checked=False, labels=ABSOLUTE)}),
+]
+
+# Mnemonics encoding labels as distances from their own address
+PC_RELATIVE = pc_relative(INSTRUCTIONS)
 
 
 def receive_params(value_table):
+    """Validate custom parameters and return the parameters for a run."""
     if value_table:
         raise RuntimeError('Custom parameters are not supported')
 
+    return {}
+
 
 def is_blank(line):
-    return __RE_BLANK__.match(line) is not None
+    return LEXER.is_blank(line)
 
 
 def get_parts(line):
-    """Break an instruction into Opcode, Operands and Label"""
-    m = __RE_PARTS__.match(line)
-
-    try:
-        return (m.group('Keyword'), m.group('Key'), m.group('Value'), m.group('Label'), m.group('Opcode'), m.group('Operands'))
-    except Exception as e:
-        return None
-
-
-def instruction_class(name):
-    """Translate a given instruction name to its corresponding class name."""
-    return ALIASES.get(name, name)
-
-
-def __zero_extend__(binary, target, pad_right=False):
-    if binary.startswith('0b'):
-        binary = binary[2:]
+    """Break an instruction into Keyword, Key, Value, Label, Opcode and Operands"""
+    return LEXER.parts(line)
 
-    zeros = '0' * (target - len(binary))
 
-    if pad_right:
-        return binary + zeros
-    else:
-        return zeros + binary
+def dispatch_table(params):
+    """Return the read-only mnemonic dispatch table for a set of parameters."""
+    return DISPATCH
 
 
-def __sign_extend__(binary, target):
-    if binary.startswith('0b'):
-        binary = binary[2:]
+# Dispatch table of every mnemonic, compiled once when the ISA is loaded
+DISPATCH = compile_dispatch(globals(), INSTRUCTIONS, receive_params(None))
 
-    return binary[0] * (target - len(binary)) + binary
-
-
-def __bin2hex__(binary):
-    return '%0*X' % ((len(binary) + 3) // 4, int(binary, 2))
-
-
-def __hex2bin__(hexadecimal):
-    return bin(int(hexadecimal, 16))[2:]
-
-
-def __dec2bin__(num, bits):
-    """Compute the 2's complement binary of an int value."""
-    binary = format(num if num >= 0 else (
-        1 << bits) + num, '0{}b'.format(bits))
-    return binary if len(binary) <= bits else binary[-bits:]
-
-
-def __parse_value__(offset, size, pc=None, jmp=False):
-    bin_offset = None
-
-    if type(offset) is str:
-        if jmp and offset in SYMBOL_TABLE:
-            offset = SYMBOL_TABLE[offset]
-            offset //= 4
-        elif pc is not None and offset in SYMBOL_TABLE:
-            offset = SYMBOL_TABLE[offset] - (pc + 4)
-            offset //= 4
-        elif offset.startswith('0x'):
-            try:
-                offset = int(offset, 16)
-            except Exception:
-                raise RuntimeError("'{}' is not valid hexadecimal format")
-        elif offset.startswith('0b'):
-            try:
-                offset = int(offset, 2)
-            except Exception:
-                raise RuntimeError("'{}' is not valid binary format")
-        elif pc is None and offset in SYMBOL_TABLE:
-            offset = SYMBOL_TABLE[offset]
 
+def __literal__(value):
+    """Parse a numeric operand the way its encoder does, or return None."""
     try:
-        offset = int(offset)
-        # print("OFFSET#", offset)
-    except Exception:
-        if pc is not None:
-            raise RuntimeError(
-                "'{}' cannot be resolved as a label or a value.".format(offset))
+        if value.startswith('0x'):
+            value = int(value, 16)
+        elif value.startswith('0b'):
+            value = int(value, 2)
         else:
-            raise RuntimeError(
-                "'{}' cannot be resolved as a value.".format(offset))
-
-    bin_offset = __dec2bin__(offset, size)
-
-    return bin_offset
-
+            value = int(value)
+    except (AttributeError, ValueError):
+        return None
 
-def __parse_mem_value__(offset, size=IMMEDIATE_WIDTH):
-    bin_offset = None
+    # Larger values do not fit the int64 arrays the fields are packed in
+    return value if -(1 << 63) <= value < (1 << 63) else None
 
-    if offset in SYMBOL_TABLE:
-        offset = SYMBOL_TABLE[offset]
-    elif offset.startswith('0x'):
-        try:
-            offset = int(offset, 16)
-        except Exception:
-            raise RuntimeError("'{}' is not valid hexadecimal format")
-    elif offset.startswith('0b'):
-        try:
-            offset = int(offset, 2)
-        except Exception:
-            raise RuntimeError("'{}' is not a valid binary format")
 
-    try:
-        offset = int(offset)
-    except Exception:
-        raise RuntimeError("'{}' cannot be resolved".format(offset))
+def __batch_kind__(spec):
+    """Return how encode_batch gathers the fields of an instruction, or None for one at a time."""
+    if getattr(spec, 'format', None) is __R__ and spec.syntax == 'rd, rs, rt':
+        return 'r'
+    elif spec.operands.get('imm') is __IMM__:
+        return {'rs, rt, imm': 'imm', 'rt, imm(rs)': 'mem'}.get(spec.syntax)
+    return None
 
-    bin_offset = __dec2bin__(offset, size)
 
-    return bin_offset
+# The gathering kind, operand forms and template of every mnemonic encode_batch handles
+__BATCH__ = dict((mnemonic, (__batch_kind__(spec), forms(spec.syntax), DISPATCH[mnemonic].template))
+                 for spec in INSTRUCTIONS for mnemonic in spec.mnemonics if __batch_kind__(spec))
 
 
-def __parse_r__(operands):
-    result_list = []
+def encode_batch(instructions, symbols):
+    """Encode many plain R-type, immediate and memory instructions at once with NumPy.
 
-    match = __RE_R__.match(operands)
+    instructions is a sequence of (mnemonic, operands). The fields of every
+    supported instruction are gathered into arrays, checked and packed with
+    vectorized operations. Returns a list with the word of every
+    instruction, None for those that have to be encoded one at a time
+    (other instructions, operands naming a label and invalid operands, whose
+    errors the scalar encoder reports), or None without NumPy.
+    """
+    if numpy is None:
+        return None
 
-    if match is None:
-        raise RuntimeError(
-            "Operands '{}' are in an incorrect format.".format(operands.strip()))
+    registers = REGISTERS.get
+    # One row of index, template, immediate, rd, rs, rt per gathered instruction
+    rows = []
+    gather = rows.append
 
-    for op in (match.group('RD'), match.group('RS'), match.group('RT')):
-        if not op:
-            result_list.append(None)
+    for index, (mnemonic, operands) in enumerate(instructions):
+        batch = __BATCH__.get(mnemonic)
+        if batch is None or operands is None:
             continue
 
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(
-                bin(REGISTERS[op])[2:], REGISTER_WIDTH))
-        else:
-            raise RuntimeError(
-                "Register identifier '{}' is not valid in {}.".format(op, __name__))
-
-    return tuple(result_list)
-
-
-def __parse_imm__(operands, is_br=False, pc=None):
-    result_list = []
-
-    match = __RE_IMM__.match(operands)
-
-    if match is None:
-        raise RuntimeError(
-            "Operands '{}' are in an incorrect format.".format(operands.strip()))
-
-    result_list.append(__parse_value__(
-        match.group('Immediate'), IMMEDIATE_WIDTH, pc))
-
-    for op in (match.group('RS'), match.group('RT')):
-        if not op:
-            result_list.append(None)
+        kind, forms, template = batch
+        fields = match(operands, forms)
+        if fields is None:
             continue
-
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(
-                bin(REGISTERS[op]), REGISTER_WIDTH))
+        if kind == 'r':
+            rd, rs, rt = fields
+            gather((index, template, 0, registers(rd, -1), registers(rs, -1), registers(rt, -1)))
         else:
-            raise RuntimeError(
-                "Register identifier '{}' is not valid in {}.".format(op, __name__))
-
-    return tuple(result_list)
-
-
-def __parse_mem_jmp__(operands, pc=None, mem=False):
-    result_list = []
-
-    match = __RE_MEM_JMP__.match(operands)
-
-    if match is None:
-        raise RuntimeError(
-            "Operands '{}' are in an incorrect format.".format(operands.strip()))
-
-    if mem:
-        result_list.append(__parse_mem_value__(match.group('Immediate')))
-    else:
-        result_list.append(__parse_value__(match.group(
-            'Immediate'), size=IMMEDIATE_WIDTH, pc=pc, jmp=True))
-
-    for op in (match.group('RS'), match.group('RT')):
-        if not op:
-            result_list.append(None)
-            continue
-
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(
-                bin(REGISTERS[op]), REGISTER_WIDTH))
-        else:
-            raise RuntimeError(
-                "Register identifier '{}' is not valid in {}.".format(op, __name__))
-
-    return tuple(result_list)
-
-
-class RInstruction(Instruction):
-
-    @classmethod
-    def opcode(cls):
-        return (cls.primary_opcode(), RInstruction.secondary_opcode())
-
-    @classmethod
-    def size(cls):
-        return 1
-
-    @classmethod
-    def primary_opcode(cls):
-        return 0
-
-    @classmethod
-    def secondary_opcode(cls):
-        raise NotImplementedError()
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        return ''.join(__parse_r__(operands))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        opcode = __zero_extend__(bin(cls.primary_opcode()), PRIMARY_OPCODE_WIDTH) + \
-            __zero_extend__(bin(cls.secondary_opcode()),
-                            SECONDARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + SECONDARY_OPCODE_WIDTH + __R_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands)
-        return [opcode + operands]
-
-    @classmethod
-    def hex(cls, operands, **kwargs):
-        return [__bin2hex__(instr) for instr in cls.binary(operands, **kwargs)]
-
-
-class eq(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('08', 16)
-
-
-class lt(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('09', 16)
-
-
-class le(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('0a', 16)
-
-
-class ne(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('0b', 16)
-
-
-class add(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('20', 16)
-
-
-class and_(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('24', 16)
-
-
-class or_(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('25', 16)
-
-
-class xor(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('26', 16)
-
-
-class sub(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('28', 16)
-
-
-class nand(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('2c', 16)
-
-
-class nor(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('2d', 16)
-
-
-class nxor(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('2e', 16)
-
-
-class rshf(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('30', 16)
-
-
-class lshf(RInstruction):
-
-    @classmethod
-    def secondary_opcode(cls):
-        return int('31', 16)
-
-
-class IInstruction(Instruction):
-
-    @classmethod
-    def opcode(cls):
-        raise NotImplementedError()
-
-    @classmethod
-    def size(cls):
-        return 1
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        return ''.join(__parse_imm__(operands))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands)
-        return [opcode + operands]
-
-    @classmethod
-    def hex(cls, operands, **kwargs):
-        return [__bin2hex__(instr) for instr in cls.binary(operands, **kwargs)]
-
-
-class beq(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('001000', 2)
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        return ''.join(__parse_imm__(operands, pc=kwargs['pc']))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands, **kwargs)
-        return [opcode + operands]
-
-
-class blt(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('001001', 2)
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        return ''.join(__parse_imm__(operands, pc=kwargs['pc']))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands, **kwargs)
-        return [opcode + operands]
-
-
-class ble(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('001010', 2)
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        return ''.join(__parse_imm__(operands, pc=kwargs['pc']))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands, **kwargs)
-        return [opcode + operands]
-
-
-class bne(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('001011', 2)
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        return ''.join(__parse_imm__(operands, pc=kwargs['pc']))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands, **kwargs)
-        return [opcode + operands]
-
-
-class beq(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('001000', 2)
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        return ''.join(__parse_imm__(operands, pc=kwargs['pc']))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-        operands = cls.build_operands(operands, **kwargs)
-        return [opcode + operands]
-
-
-class addi(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('100000', 2)
-
-
-class andi(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('100100', 2)
-
-
-class ori(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('100101', 2)
-
-
-class xori(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('100110', 2)
-
-
-class jal(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('001100', 2)
-
-    @classmethod
-    def build_operands(cls, operands, pc=None):
-        return ''.join(__parse_mem_jmp__(operands, pc))
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        assert('pc' in kwargs)  # sanity check
-
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-
-        operands = cls.build_operands(operands, pc=kwargs['pc'])
-        return [opcode + operands]
-
-
-class lw(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('010010', 2)
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-
-        operands = __parse_mem_jmp__(operands, mem=True)
-        return [opcode + ''.join(operands)]
-
-
-class sw(IInstruction):
-
-    @classmethod
-    def opcode(cls):
-        return int('011010', 2)
-
-    @classmethod
-    def binary(cls, operands, **kwargs):
-        opcode = __zero_extend__(bin(cls.opcode()), PRIMARY_OPCODE_WIDTH)
-        length = PRIMARY_OPCODE_WIDTH + __IMM_BLANK_BITS__
-        opcode = __zero_extend__(opcode, length, pad_right=True)
-
-        operands = __parse_mem_jmp__(operands, mem=True)
-        return [opcode + ''.join(operands)]
-
-
-class not_(nand):
-
-    @classmethod
-    def build_operands(cls, operands):
-        rd, rs, rt = __parse_r__(operands)
-        return ''.join((rd, rs, rs))
-
-
-class ge(le):
-
-    @classmethod
-    def build_operands(cls, operands):
-        rd, rs, rt = __parse_r__(operands)
-        return ''.join((rd, rt, rs))
-
-
-class gt(lt):
-
-    @classmethod
-    def build_operands(cls, operands):
-        rd, rs, rt = __parse_r__(operands)
-        return ''.join((rd, rt, rs))
-
-
-class bgt(blt):
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        imm, rd, rs = __parse_imm__(operands, pc=kwargs['pc'])
-        return ''.join((imm, rs, rd))
-
-
-class bge(ble):
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        imm, rd, rs = __parse_imm__(operands, pc=kwargs['pc'])
-        return ''.join((imm, rs, rd))
-
-
-class subi(addi):
-
-    @classmethod
-    def build_operands(cls, operands, pc=None):
-        imm, rd, rs = __parse_imm__(operands)
-        imm = __parse_value__(-int(imm, 2), IMMEDIATE_WIDTH)
-        return ''.join((imm, rd, rs))
-
-
-class br(beq):
-
-    @classmethod
-    def build_operands(cls, operands, **kwargs):
-        assert('pc' in kwargs)
-        imm, rd, rs = __parse_imm__(operands, pc=kwargs['pc'])
-        l = [
-            imm,
-            __dec2bin__(REGISTERS['zero'], REGISTER_WIDTH),
-            __dec2bin__(REGISTERS['zero'], REGISTER_WIDTH)
-        ]
-        return ''.join((l))
-
-
-class ret(jal):
-
-    @classmethod
-    def build_operands(cls, operands, pc=None):
-        l = [
-            __zero_extend__('0', IMMEDIATE_WIDTH),
-            __dec2bin__(REGISTERS['ra'], REGISTER_WIDTH),
-            __dec2bin__(10, REGISTER_WIDTH)
-        ]
-        return ''.join(l)
-
-
-class call(jal):
-
-    @classmethod
-    def build_operands(cls, operands, pc=None):
-        imm, rs, rt = __parse_mem_jmp__(operands, pc)
-        return ''.join((imm, rs, __dec2bin__(REGISTERS['ra'], REGISTER_WIDTH)))
-
-
-class jmp(jal):
-
-    @classmethod
-    def build_operands(cls, operands, pc=None):
-        imm, rs, rt = __parse_mem_jmp__(operands, pc)
-        return ''.join((imm, rs, __dec2bin__(10, REGISTER_WIDTH)))
-
-
-class word():
-
-    @classmethod
-    def size(cls):
-        return 1
-
-    @classmethod
-    def binary(cls, val, **kwargs):
-        try:
-            val = __parse_value__(val, BIT_WIDTH)
-        except:
-            raise ValueError(
-                "{} could not be resolved as a label or value".format(val))
-        return [val]
-
-    @classmethod
-    def hex(cls, val, **kwargs):
-        return [__bin2hex__(instr) for instr in cls.binary(val, **kwargs)]
+            if kind == 'imm':
+                rs, rt, value = fields
+            else:
+                rt, value, rs = fields
+            value = None if value in symbols else __literal__(value)
+            if value is not None:
+                gather((index, template, value, 0, registers(rs, -1), registers(rt, -1)))
+
+    words = [None] * len(instructions)
+    if not rows:
+        return words
+
+    index, template, value, rd, rs, rt = numpy.array(rows, dtype=numpy.int64).T
+    # Unknown or missing registers are left to the scalar encoder
+    valid = (rd >= 0) & (rs >= 0) & (rt >= 0)
+
+    # R-type lines have no immediate, rd sits where the immediate would
+    packed = template | (((value & mask(IMMEDIATE_WIDTH)) | rd) << __IMM_SHIFT__) | \
+        (rs << __RS_SHIFT__) | rt
+
+    for index, word in zip(index[valid].tolist(), packed[valid].tolist()):
+        words[index] = word
+
+    return words
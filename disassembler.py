@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import os
+import sys
+
+from assembler import load_isa, parse_params
+from encoding import mask
+from layouts import ABSOLUTE, RELATIVE, Instruction, Value
+from lexer import split_operands
+
+"""disassembler.py: Table-driven disassembler for assembled .mif and ModelSim .hex images."""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+
+# Radixes of MIF addresses and data
+MIF_RADIXES = {'HEX': 16, 'BIN': 2, 'DEC': 10, 'UNS': 10, 'OCT': 8}
+
+
+def read_mif(lines):
+    """Read the entries of a Quartus memory initialization file.
+
+    Returns the word width (None if the header has none) and a list of
+    (first address, last address, word) entries in file order, one per
+    single address or [first..last] range. Entries listing several words
+    are split into one per address.
+    """
+    header = {}
+    entries = []
+    content = False
+
+    for line in lines:
+        if '--' in line:
+            line = line.split('--', 1)[0]
+        if '%' in line:
+            # % block comments %, within a line
+            line = ''.join(line.split('%')[::2])
+
+        for statement in line.split(';'):
+            statement = statement.strip()
+            if not statement:
+                continue
+
+            if not content:
+                key, _, value = statement.partition('=')
+                key = key.strip().upper()
+                if key.startswith('CONTENT'):
+                    content = True
+                    address_radix = MIF_RADIXES[header.get('ADDRESS_RADIX', 'HEX')]
+                    data_radix = MIF_RADIXES[header.get('DATA_RADIX', 'HEX')]
+                else:
+                    header[key] = value.strip().upper()
+                continue
+
+            address, _, data = statement.partition(':')
+            words = data.split()
+            if len(words) == 1 and address[0] != '[':
+                # The common case, a single word
+                first = int(address, address_radix)
+                entries.append((first, first, int(words[0], data_radix)))
+                continue
+
+            if statement.upper() == 'END':
+                return (int(header['WIDTH']) if 'WIDTH' in header else None, entries)
+            if not words:
+                raise ValueError("'{}' is not a valid MIF entry".format(statement))
+
+            words = [int(value, data_radix) for value in words]
+            address = address.strip()
+            if address.startswith('['):
+                first, _, last = address[1:-1].partition('..')
+                first, last = int(first, address_radix), int(last, address_radix)
+                if len(words) == 1:
+                    entries.append((first, last, words[0]))
+                    continue
+            else:
+                first = int(address, address_radix)
+
+            for offset, word in enumerate(words):
+                entries.append((first + offset, first + offset, word))
+
+    raise ValueError('MIF image has no END')
+
+
+def read_hex(lines):
+    """Read the entries of a ModelSim (or Verilog $readmemh) image with @address markers.
+
+    Returns a list of (address, address, word) entries in file order.
+    """
+    entries = []
+    address = 0
+
+    for line in lines:
+        for token in line.split('//', 1)[0].split():
+            if token.startswith('@'):
+                address = int(token[1:], 16)
+            else:
+                entries.append((address, address, int(token, 16)))
+                address += 1
+
+    return entries
+
+
+def read_symbols(lines):
+    """Read a symbol table written by the assembler (.sym), as a dict of names to addresses."""
+    symbols = {}
+
+    for line in lines:
+        name, _, address = line.partition(':')
+        if address.strip():
+            symbols[name.strip()] = int(address, 0)
+
+    return symbols
+
+
+# Readers of the image formats, by file extension
+READERS = {
+    '.mif': 'mif',
+    '.bin': 'mif',
+    '.hex': 'hex',
+    '.memh': 'hex',
+}
+
+
+def __operand_template__(syntax):
+    """Turn a syntax like 'rt, imm(rs)' into a format string like '{0}, {1}({2})' and its names."""
+    names = []
+    text = []
+    for token in split_operands(syntax):
+        if token == ',':
+            text.append(', ')
+        elif token in '()':
+            text.append(token)
+        else:
+            if token not in names:
+                names.append(token)
+            text.append('{{{}}}'.format(names.index(token)))
+    return ''.join(text), names
+
+
+def __bit_count__(value):
+    return bin(value).count('1')
+
+
+class Disassembler(object):
+    """Decodes the words of an ISA back into assembly.
+
+    The lookup tables are built from the ISA's INSTRUCTIONS. Words are
+    indexed by their opcode bits (the bits every instruction with constant
+    fields fixes), and matched against the instructions sharing them, most
+    fixed bits first. Pseudo-instructions without operands that
+    expand to a single word (e.g. noop) are matched before anything else.
+    Words matching no instruction are shown as data.
+
+    symbols maps label names to addresses. Branch targets and scaled jump
+    targets are shown as the labels at their address.
+    """
+
+    def __init__(self, isa, params=None, symbols=None):
+        self.isa = isa
+        self.width = isa.BIT_WIDTH
+        self.offset = isa.INSTRUCTION_OFFSET
+        self.labels = {}
+        for name, address in sorted((symbols or {}).items(), key=lambda item: (item[1], item[0])):
+            self.labels.setdefault(address, []).append(name)
+        # Register names by number, the first name of every register
+        self.registers = {}
+        for name, number in isa.REGISTERS.items():
+            self.registers.setdefault(number, name)
+
+        specs = isa.INSTRUCTIONS
+        dispatch = isa.dispatch_table(isa.receive_params(params))
+        # (fixed bits, template, text, decode, relative) of every instruction with constant fields
+        decoders = []
+        data = None
+        for spec in specs:
+            if isinstance(spec, Instruction):
+                if spec.constants:
+                    decoders.append(self.__instruction__(spec))
+                elif data is None:
+                    data = ([name for name in spec.mnemonics if name.startswith('.')] +
+                            ['.' + name for name in spec.mnemonics])[0]
+            elif spec.syntax is None and dispatch[spec.mnemonics[0]].size == 1:
+                word = dispatch[spec.mnemonics[0]].encode('', pc=0, symbols={}, params=None)[0]
+                decoders.append((mask(self.width), word, spec.mnemonics[0], None, False))
+
+        self.data = (data or '.word') + ' {:#x}'
+
+        # The opcode bits, fixed by every instruction
+        self.key = mask(self.width)
+        for decoder in decoders:
+            self.key &= decoder[0]
+
+        self.table = {}
+        for decoder in sorted(decoders, key=lambda decoder: -__bit_count__(decoder[0])):
+            self.table.setdefault(decoder[1] & self.key, []).append(decoder)
+
+        # Text of words decoded the same wherever they are
+        self.decoded = {}
+
+    def __instruction__(self, spec):
+        """Return the (fixed bits, template, text, decode, relative) of an instruction spec.
+
+        Every bit outside the operand fields is fixed: constant fields hold
+        their value and unused bits are zero. text is the whole instruction
+        if it has no operands, else decode is a function (word, pc) returning
+        it (None if a register has no name), and relative tells whether that
+        depends on pc.
+        """
+        fmt = spec.format
+        template = 0
+        for name, value in spec.constants.items():
+            template |= value << fmt.shift(name)
+
+        mnemonic = spec.mnemonics[0]
+        if spec.syntax is None:
+            return (mask(self.width), template, mnemonic, None, False)
+
+        text, names = __operand_template__(spec.syntax)
+        text = mnemonic + ' ' + text
+        bits = mask(self.width)
+        fields = []
+        relative = False
+        for name in names:
+            kind = spec.operands.get(name)
+            shift, width = fmt.shift(name), fmt.width(name)
+            bits &= ~(mask(width) << shift)
+            fields.append((shift, width, kind))
+            relative = relative or getattr(kind, 'labels', None) == RELATIVE
+
+        registers, labels, offset = self.registers, self.labels, self.offset
+
+        def decode(word, pc):
+            operands = []
+            for shift, width, kind in fields:
+                value = (word >> shift) & ((1 << width) - 1)
+                if not isinstance(kind, Value):
+                    register = registers.get(value)
+                    if register is None:
+                        return None
+                    operands.append(register)
+                    continue
+
+                if kind.signed and value >> (width - 1):
+                    value -= 1 << width
+                if kind.negate:
+                    value = -value
+
+                address = None
+                if kind.labels == RELATIVE:
+                    address = pc + offset + value * kind.scale
+                elif kind.labels == ABSOLUTE and kind.scale != 1:
+                    address = value * kind.scale
+                names = labels.get(address)
+                operands.append(names[0] if names else str(value))
+
+            return text.format(*operands)
+
+        return (bits, template, None, decode, relative)
+
+    def decode(self, word, pc=0):
+        """Return the assembly of a word at address pc."""
+        text = self.decoded.get(word)
+        if text is not None:
+            return text
+
+        for bits, template, text, decode, relative in self.table.get(word & self.key, ()):
+            if word & bits == template:
+                if decode is not None:
+                    text = decode(word, pc)
+                    if text is None:
+                        continue
+                    if relative:
+                        return text
+                break
+        else:
+            text = self.data.format(word)
+
+        self.decoded[word] = text
+        return text
+
+    def listing(self, entries):
+        """Yield the lines of the listing of image entries (first, last, word).
+
+        Every line holds the address (pc), the word in hexadecimal and its
+        assembly, preceded by a line for every label at that address. A range
+        of identical words is a single line with its first and last address.
+        """
+        digits = (self.width + 3) // 4
+        offset, labels, decode = self.offset, self.labels, self.decode
+        single = '{:08X}:  {:0' + str(digits) + 'X}  {}'
+        many = '{:08X}..{:08X}:  {:0' + str(digits) + 'X}  {}'
+
+        for first, last, word in entries:
+            pc = first * offset
+            if labels:
+                for address in range(pc, last * offset + 1, offset) if first != last else (pc,):
+                    for name in labels.get(address, ()):
+                        yield '{:08X} <{}>:'.format(address, name)
+
+            if first == last:
+                yield single.format(pc, word, decode(word, pc))
+            else:
+                yield many.format(pc, last * offset, word, decode(word, pc))
+
+
+def read_image(path, kind=None):
+    """Read the entries of an image file, by kind ('mif' or 'hex') or file extension."""
+    kind = kind or READERS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise ValueError("cannot tell the format of '{}', use --format".format(path))
+
+    with open(path, 'r') as image:
+        if kind == 'mif':
+            return read_mif(image)
+        return (None, read_hex(image))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        'disassembler.py', description='Disassembles assembled .mif and ModelSim .hex images.')
+    parser.add_argument('image', help='the .mif, .bin, .hex or .memh image to disassemble')
+    parser.add_argument('-i', '--isa', required=False, type=str, default='cs3220',
+                        help='define the Python ISA module to load [default: cs3220]')
+    parser.add_argument('--params', required=False, type=str,
+                        help='custom parameters to pass to an architecture, formatted as "key1=value1, key2=value2"')
+    parser.add_argument('-f', '--format', required=False, choices=('mif', 'hex'),
+                        help='format of the image [default: by its extension]')
+    parser.add_argument('--sym', '--symbols', required=False, type=str,
+                        help='symbol table to name branch and jump targets with [default: the .sym '
+                        'file next to the image, if there is one]')
+    parser.add_argument('-o', '--output', required=False, type=str,
+                        help='file to write the listing to [default: standard output]')
+    args = parser.parse_args()
+
+    try:
+        isa = load_isa(args.isa)
+    except Exception as e:
+        print("Error: Failed to load ISA definition module '{}'. {}\n".format(args.isa, str(e)))
+        exit(1)
+
+    sym = args.sym
+    if sym is None and os.path.exists(os.path.splitext(args.image)[0] + '.sym'):
+        sym = os.path.splitext(args.image)[0] + '.sym'
+
+    try:
+        width, entries = read_image(args.image, args.format)
+        symbols = None
+        if sym:
+            with open(sym, 'r') as sym_file:
+                symbols = read_symbols(sym_file)
+        disassembler = Disassembler(isa, parse_params(args.params), symbols)
+    except Exception as e:
+        print("Error: {}.".format(e))
+        exit(1)
+
+    if width is not None and width != isa.BIT_WIDTH:
+        print("Error: the image has {} bit words, {} has {}.".format(width, isa.__name__, isa.BIT_WIDTH))
+        exit(1)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        lines = []
+        for line in disassembler.listing(entries):
+            lines.append(line)
+            if len(lines) >= 65536:
+                output.write('\n'.join(lines) + '\n')
+                lines = []
+        if lines:
+            output.write('\n'.join(lines) + '\n')
+    finally:
+        if args.output:
+            output.close()
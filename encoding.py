@@ -0,0 +1,122 @@
+"""encoding.py: Integer bit-field helpers shared by the ISA definitions.
+
+Instructions are encoded as plain integers (one per machine word) by packing
+their fields with shifts and masks. Text is only produced when an image is
+written out, by a function from formatter.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import collections
+import re
+
+try:
+    from types import MappingProxyType
+except ImportError:  # Python 2 has no read-only dict view
+    MappingProxyType = dict
+
+
+def mask(width):
+    """Return an integer with the lowest width bits set."""
+    return (1 << width) - 1
+
+
+def formatter(width, use_hex=True):
+    """Return a function formatting encoded words of the given width."""
+    spec = '0{}X'.format((width + 3) // 4) if use_hex else '0{}b'.format(width)
+
+    def format_word(word):
+        return format(word, spec)
+
+    return format_word
+
+
+# A dispatch table entry: the encoder of a mnemonic, the number of words it
+# expands to and its opcode template
+Entry = collections.namedtuple('Entry', 'encode size template')
+
+
+# Default number of instructions an EncodingCache holds
+DEFAULT_CACHE_SIZE = 4096
+
+# Every name operands can refer to (symbols are a subset)
+__RE_NAME__ = re.compile(r'\w+')
+
+
+class EncodingCache(object):
+    """A bounded LRU cache of encoded instructions.
+
+    Entries hold the words of one symbol table, the cache is emptied when
+    instructions are encoded with another. They are keyed by mnemonic, size
+    and operand text (without surrounding whitespace), so branches with
+    some of their delay slots filled do not share entries with the others.
+    For the pc_relative mnemonics, which encode labels as distances from
+    their own address, the key also holds the distance to every label the
+    operands name (target - pc), so every branch to the same relative target
+    shares an entry. Instructions that fail to encode are not cached.
+
+    This is only correct if every other instruction encodes the same
+    wherever it is placed, as in the ISAs declaring PC_RELATIVE.
+    """
+
+    def __init__(self, pc_relative, maxsize=DEFAULT_CACHE_SIZE):
+        self.pc_relative = frozenset(pc_relative)
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        # The labels named by the operands of pc_relative instructions
+        self.names = {}
+        self.symbols = None
+        self.hits = 0
+        self.misses = 0
+
+        # Marks an entry as the most recently used
+        self.touch = getattr(self.entries, 'move_to_end', None) or \
+            (lambda key: self.entries.__setitem__(key, self.entries.pop(key)))  # Python 2
+
+    def encode(self, entry, mnemonic, operands, pc, symbols, params):
+        """Encode an instruction through its dispatch table entry, or return its cached words.
+
+        The words returned are shared with the cache and must not be modified.
+        """
+        if symbols is not self.symbols:
+            self.entries.clear()
+            self.names.clear()
+            self.symbols = symbols
+
+        text = operands.strip() if operands else operands
+        if mnemonic in self.pc_relative:
+            names = self.names.get(text)
+            if names is None:
+                if len(self.names) >= self.maxsize:
+                    self.names.clear()
+                names = self.names[text] = tuple(
+                    name for name in __RE_NAME__.findall(text or '') if name in symbols)
+            key = (mnemonic, entry.size, text, tuple([symbols[name] - pc for name in names]))
+        else:
+            key = (mnemonic, entry.size, text)
+
+        words = self.entries.get(key)
+        if words is not None:
+            self.hits += 1
+            self.touch(key)
+            return words
+
+        self.misses += 1
+        words = entry.encode(operands, pc=pc, symbols=symbols, params=params)
+
+        entries = self.entries
+        entries[key] = words
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+        return words
+
+    def clear(self):
+        self.entries.clear()
+        self.names.clear()
+        self.symbols = None
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return 'EncodingCache({} of {} entries, {} hits, {} misses)'.format(
+            len(self.entries), self.maxsize, self.hits, self.misses)
@@ -0,0 +1,74 @@
+"""image.py: Compact in-memory storage of assembled programs.
+
+An Image keeps the addresses and words of a program in two parallel
+machine-word arrays instead of a list of tuples, taking 8 bytes per word for
+32-bit architectures. It still iterates as (address, word) pairs, so it can
+be used wherever a list of pairs was.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import array
+
+# Width of the addresses an Image holds, which assembled programs must fit in
+ADDRESS_WIDTH = 32
+
+
+def __readonly__(buffer):
+    view = memoryview(buffer)
+    return view.toreadonly() if hasattr(view, 'toreadonly') else view
+
+
+def typecode(bits):
+    """Return the smallest unsigned array typecode holding values of the given width."""
+    for code in ('I', 'L', 'Q'):
+        if array.array(code).itemsize * 8 >= bits:
+            return code
+
+    raise ValueError('no array type holds {} bit values'.format(bits))
+
+
+class Image(object):
+    """The (address, word) pairs of an assembled program, in the order they were added."""
+
+    def __init__(self, word_width=32, address_width=ADDRESS_WIDTH):
+        self.addresses = array.array(typecode(address_width))
+        self.words = array.array(typecode(word_width))
+
+    def append(self, address, word):
+        self.addresses.append(address)
+        self.words.append(word)
+
+    def extend(self, address, words, offset):
+        """Add consecutive words starting at address, offset apart."""
+        self.addresses.extend(range(address, address + len(words) * offset, offset))
+        self.words.extend(words)
+
+    def concat(self, other):
+        """Add all pairs of another Image after the ones of this one."""
+        self.addresses.extend(other.addresses)
+        self.words.extend(other.words)
+
+    def views(self):
+        """Return read-only views of the address and word buffers."""
+        return (__readonly__(self.addresses), __readonly__(self.words))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        addresses, words = self.views()
+        return zip(addresses, words)
+
+    def __getitem__(self, index):
+        return (self.addresses[index], self.words[index])
+
+    def __eq__(self, other):
+        if isinstance(other, Image):
+            return self.addresses == other.addresses and self.words == other.words
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Image({} words)'.format(len(self))
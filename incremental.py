@@ -0,0 +1,292 @@
+"""incremental.py: Reassembly that only redoes the work an edit requires.
+
+An IncrementalAssembler keeps the per-line state of its previous run: the
+parsed line, its address, the words it encoded to and the names its operands
+refer to. The next run diffs the new source against the old one and
+
+  * parses only the edited lines,
+  * recomputes addresses and symbol definitions from the first edit up to
+    where the following unchanged lines are back at their old addresses,
+  * re-encodes only edited lines, lines referring to a symbol whose value
+    changed and lines referring to a symbol whose own address moved (the
+    PC-relative branches),
+
+reusing the previous words for everything else. If an edit introduces an
+error in pass 1 the whole program is assembled again, so errors are always
+reported exactly as a full run would report them.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import difflib
+import pickle
+import re
+
+from buildcache import assembler_modules, source_digest
+from image import Image
+
+# Every name an operand can refer to (symbols are a subset)
+__RE_NAME__ = re.compile(r'\w+')
+
+# Bumped whenever the layout of saved state changes
+STATE_VERSION = 1
+
+
+class IncrementalState(object):
+    """The per-line state of a run, indexed by source line (0-based).
+
+    texts -- the raw source lines.
+    lines -- the parsed Line of every line, or None for blank lines.
+    refs -- the names referred to by the operands of every line.
+    pcs -- the address every line starts at, followed by the end address.
+    words -- the words encoded for every line (empty if it has no instruction,
+             None if it failed to encode).
+    symbols -- the resulting symbol table.
+    """
+
+    def __init__(self, texts, lines, refs, pcs, words, symbols):
+        self.texts = texts
+        self.lines = lines
+        self.refs = refs
+        self.pcs = pcs
+        self.words = words
+        self.symbols = symbols
+
+
+def __definitions__(line):
+    return [name for name in (line.label, line.key if line.keyword else None) if name]
+
+
+def __match_lines__(old, new):
+    """Map every index of new to the index of an identical line in old, or None.
+
+    Returns the number of leading lines both have in common, the map and the
+    index in new where the trailing lines both have in common start.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    origin = list(range(prefix)) + [None] * (len(new) - prefix - suffix) + \
+        list(range(len(old) - suffix, len(old)))
+
+    # Unchanged runs between the first and the last edit
+    matcher = difflib.SequenceMatcher(None, old[prefix:len(old) - suffix],
+                                      new[prefix:len(new) - suffix], autojunk=False)
+    for i, j, size in matcher.get_matching_blocks():
+        for k in range(size):
+            origin[prefix + j + k] = prefix + i + k
+
+    return (prefix, origin, len(new) - suffix)
+
+
+class IncrementalAssembler(object):
+    """Wraps an Assembler, keeping the state of the last run for the next one."""
+
+    def __init__(self, assembler, state=None):
+        self.assembler = assembler
+        self.state = state
+        # Work done by the last run
+        self.parsed = 0
+        self.encoded = 0
+
+    def assemble(self, source):
+        """Assemble an iterable of source lines, reusing the previous run's work.
+
+        Returns the same (success, results) tuple as Assembler.assemble.
+        """
+        source = list(source)
+
+        if self.assembler.scheduler is not None:
+            # Scheduled lines move, there is no per-line state to keep
+            self.state = None
+            return self.assembler.assemble(source)
+
+        if self.state is not None:
+            assembler = self.assembler
+            log, messages = assembler.log, []
+            assembler.log = messages.append
+            try:
+                laid_out = self.__pass1__(source, self.state)
+            finally:
+                assembler.log = log
+
+            if laid_out is not None:
+                return self.__pass2__(*laid_out)
+
+            assembler.verbose("Edit introduced errors, assembling from scratch.")
+
+        laid_out = self.__pass1__(source, None)
+        if laid_out is None:
+            self.state = None
+            return (False, Image(self.assembler.isa.BIT_WIDTH))
+
+        return self.__pass2__(*laid_out)
+
+    def __pass1__(self, source, old):
+        """Parse and lay out source, starting from old where possible.
+
+        Returns the new state, the index of the first edited line, the origin
+        of every line in old and the names whose value changed, or None if
+        the source has errors.
+        """
+        assembler = self.assembler
+        is_blank = assembler.isa.is_blank
+
+        if old is None:
+            first, origin, resume = 0, [None] * len(source), len(source)
+            lines, refs, words, pcs = [], [], [], [0]
+            symbols = {}
+            changed = None
+        else:
+            first, origin, resume = __match_lines__(old.texts, source)
+            lines, refs, words, pcs = old.lines[:first], old.refs[:first], \
+                old.words[:first], old.pcs[:first + 1]
+
+            # Definitions of edited lines are made again below
+            symbols = dict(old.symbols)
+            redefined = set()
+            for line in old.lines[first:len(old.lines) - (len(source) - resume)]:
+                if line is not None:
+                    for name in __definitions__(line):
+                        redefined.add(name)
+                        symbols.pop(name, None)
+
+        no_errors = True
+        pc = pcs[-1]
+        self.parsed = 0
+
+        for index in range(first, len(source)):
+            reused = origin[index]
+
+            if index >= resume:
+                if pc == old.pcs[reused]:
+                    # All following lines are unchanged and back at their old addresses
+                    lines.extend(old.lines[reused:])
+                    refs.extend(old.refs[reused:])
+                    words.extend(old.words[reused:])
+                    pcs.extend(old.pcs[reused + 1:])
+                    break
+
+                # An unchanged line that moved is defined again at its new address
+                if old.lines[reused] is not None:
+                    for name in __definitions__(old.lines[reused]):
+                        redefined.add(name)
+                        symbols.pop(name, None)
+
+            if reused is not None:
+                line = old.lines[reused]
+                refs.append(old.refs[reused])
+                words.append(old.words[reused])
+            elif is_blank(source[index]):
+                line = None
+                refs.append(frozenset())
+                words.append(())
+            else:
+                valid, line = assembler.parse_line(index + 1, source[index])
+                no_errors = no_errors and valid
+                operands = line.value if line.keyword == 'word' else line.operands
+                refs.append(frozenset(__RE_NAME__.findall(operands or '')))
+                words.append(None)
+                self.parsed += 1
+
+            lines.append(line)
+            if line is not None:
+                placed, pc = assembler.layout(line, pc, symbols)
+                no_errors = no_errors and placed
+                if old is not None:
+                    redefined.update(__definitions__(line))
+            pcs.append(pc)
+
+        if not no_errors:
+            return None
+
+        if old is not None:
+            changed = frozenset(name for name in redefined
+                                if symbols.get(name) != old.symbols.get(name))
+
+        state = IncrementalState(list(source), lines, refs, pcs, words, symbols)
+        return (state, first, origin, changed)
+
+    def __pass2__(self, state, first, origin, changed):
+        """Encode the lines of state that need it and build the image."""
+        assembler = self.assembler
+        assembler.symbol_table = state.symbols
+        offset = assembler.isa.INSTRUCTION_OFFSET
+        old_pcs = self.state.pcs if self.state is not None else None
+
+        success = True
+        results = Image(assembler.isa.BIT_WIDTH)
+        self.encoded = 0
+
+        for index, line in enumerate(state.lines):
+            if line is None or line.instr is None:
+                continue
+
+            pc = state.pcs[index]
+            assembled = state.words[index]
+            reused = origin[index] if index >= first else index
+
+            names = state.refs[index]
+            if (assembled is None or changed is None or not changed.isdisjoint(names) or
+                    (old_pcs[reused] != pc and any(name in state.symbols for name in names))):
+                if line.line_number != index + 1:
+                    line = line._replace(line_number=index + 1)
+
+                assembled = assembler.encode_line(line, pc)
+                state.words[index] = assembled
+                self.encoded += 1
+
+            if assembled is None:
+                success = False
+            else:
+                results.extend(pc, assembled, offset)
+
+        self.state = state
+        assembler.verbose("Parsed {} and encoded {} of {} lines.".format(
+            self.parsed, self.encoded, len(state.lines)))
+        return (success, results)
+
+    def fingerprint(self):
+        """Identify the ISA definition and parameters the state is valid for."""
+        assembler = self.assembler
+        digest = source_digest(assembler_modules(assembler))
+        digest.update(repr(sorted(assembler.params.items())).encode('utf-8'))
+        return (STATE_VERSION, digest.hexdigest())
+
+    def save(self, path):
+        """Save the state of the last run to path."""
+        state = self.state
+        # Dispatch entries are looked up again on load
+        lines = [line if line is None else line._replace(instr=None) for line in state.lines]
+
+        with open(path, 'wb') as state_file:
+            pickle.dump((self.fingerprint(), state.texts, lines, state.refs, state.pcs,
+                         state.words, state.symbols), state_file, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        """Restore the state saved to path, if any, for the same ISA and parameters.
+
+        Returns whether there was usable state.
+        """
+        try:
+            with open(path, 'rb') as state_file:
+                saved = pickle.load(state_file)
+        except Exception:  # Missing, unreadable or written by another version
+            return False
+
+        if saved[0] != self.fingerprint():
+            return False
+
+        dispatch = self.assembler.dispatch
+        texts, lines, refs, pcs, words, symbols = saved[1:]
+        lines = [line if line is None or not (line.keyword == 'word' or line.opcode) else
+                 line._replace(instr=dispatch[line.keyword if line.keyword == 'word' else line.opcode])
+                 for line in lines]
+
+        self.state = IncrementalState(texts, lines, refs, pcs, words, symbols)
+        return True
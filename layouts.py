@@ -0,0 +1,389 @@
+"""layouts.py: Declarative instruction layouts, compiled into encoders.
+
+An ISA describes its instructions as data instead of classes. A Format
+names the bit fields of a machine word, given as (high bit, low bit). Every
+instruction is a Format with the constant fields (opcodes and mode bits)
+filled in, the syntax of its operands, written with the names of the fields
+they go into (e.g. 'rx, offset(ry)'), and the kind of every operand that is
+not a register: a Value, with its signedness, range checking and label
+resolution, or a Label. Pseudo-instructions are described by the
+instructions they expand to.
+
+compile_dispatch generates the source of one encoder function per
+instruction, with the template, shifts, masks and bounds folded in as
+constants, and compiles them once when the ISA is loaded (and again for
+every other set of run parameters).
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import collections
+
+from encoding import Entry, MappingProxyType, mask
+from lexer import GROUPS, match, operand_forms, split_operands
+
+# How Value operands resolve labels
+ABSOLUTE = 'absolute'  # To the address of the label
+RELATIVE = 'relative'  # To its distance from the next instruction
+
+# Names the generated encoders use for their own arguments
+__RESERVED__ = frozenset(['operands', 'pc', 'symbols', 'params', 'fields', 'found'])
+
+__FORMAT_ERROR__ = "Operands '{}' are in an incorrect format."
+
+
+class Format(object):
+    """The named bit fields of a machine word, each given as (high bit, low bit)."""
+
+    def __init__(self, **fields):
+        for name, (high, low) in fields.items():
+            if not 0 <= low <= high:
+                raise ValueError("field '{}' has invalid bits [{}:{}]".format(name, high, low))
+        self.fields = fields
+
+    def width(self, name):
+        high, low = self.fields[name]
+        return high - low + 1
+
+    def shift(self, name):
+        return self.fields[name][1]
+
+
+class Register(object):
+    """A register operand, encoded as the number of the register.
+
+    exclude -- names of registers the instruction cannot be used with.
+    """
+
+    def __init__(self, exclude=()):
+        self.exclude = tuple(exclude)
+
+
+class Value(object):
+    """A numeric operand: a decimal, 0x hexadecimal or 0b binary literal, or a label.
+
+    signed -- whether decimal values and labels are 2's complement, or
+              unsigned (only their upper bound is checked).
+    checked -- whether values out of range are errors, rather than truncated
+               to the field. Checked hexadecimal and binary literals are raw
+               bits, which only have to fit the field.
+    labels -- None if the operand cannot name a label, ABSOLUTE for the
+              address of the label or RELATIVE for its distance from the next
+              instruction.
+    scale -- what the addresses (or distances) of labels are divided by, e.g.
+             the bytes per instruction of a byte-addressed ISA.
+    negate -- whether the field holds the negated value.
+    """
+
+    def __init__(self, signed=True, checked=True, labels=None, scale=1, negate=False):
+        self.signed = signed
+        self.checked = checked
+        self.labels = labels
+        self.scale = scale
+        self.negate = negate
+
+
+class Label(object):
+    """An operand that must name a label, encoded as its address divided by scale."""
+
+    def __init__(self, scale=1):
+        self.scale = scale
+
+
+# A machine instruction: mnemonics sharing the encoding, the format, the
+# syntax of the operands (None if the instruction takes none), the kinds of
+# the operands that are not registers, the constant fields, the run parameter
+# holding the number of delay slots following the instruction (if any) and
+# the instruction filling them
+Instruction = collections.namedtuple(
+    'Instruction', 'mnemonics format syntax operands constants slots filler')
+
+# A pseudo-instruction: mnemonics, syntax, kinds of the operands and the
+# (mnemonic, operands) of every instruction it expands to, with the operands
+# of the pseudo-instruction substituted for '{name}'
+Pseudo = collections.namedtuple('Pseudo', 'mnemonics syntax operands expansion')
+
+
+def instruction(mnemonics, format, syntax=None, operands=None, slots=None, filler='noop',
+                **constants):
+    """Describe a machine instruction (mnemonics is a space-separated string of its names)."""
+    return Instruction(tuple(mnemonics.split()), format, syntax, dict(operands or {}),
+                       constants, slots, filler)
+
+
+def pseudo(mnemonics, syntax, expansion, operands=None):
+    """Describe a pseudo-instruction (mnemonics is a space-separated string of its names)."""
+    return Pseudo(tuple(mnemonics.split()), syntax, dict(operands or {}), tuple(expansion))
+
+
+# Operand forms of every syntax, shared by the instructions using it
+__FORMS__ = {}
+
+
+def forms(syntax):
+    """Return the operand forms of a syntax, for lexer.match."""
+    compiled = __FORMS__.get(syntax)
+    if compiled is None:
+        compiled = __FORMS__[syntax] = operand_forms(syntax)
+    return compiled
+
+
+def __names__(syntax):
+    """Return the names of the operands of a syntax, in order."""
+    names = []
+    for token in split_operands(syntax or ''):
+        if token not in ',()' and token not in names:
+            names.append(token)
+    return names
+
+
+def pc_relative(specs):
+    """Return the mnemonics encoding labels as distances from their own address.
+
+    A pseudo-instruction is one if it passes its operands to such an instruction.
+    """
+    by_mnemonic = dict((mnemonic, spec) for spec in specs for mnemonic in spec.mnemonics)
+
+    def relative(spec):
+        if isinstance(spec, Instruction):
+            return any(getattr(kind, 'labels', None) == RELATIVE for kind in spec.operands.values())
+        return any('{' in operands and relative(by_mnemonic[mnemonic])
+                   for mnemonic, operands in spec.expansion)
+
+    return frozenset(mnemonic for spec in specs if relative(spec) for mnemonic in spec.mnemonics)
+
+
+def __resolver__(kind, width, isa_name, offset):
+    """Return a function (text, pc, symbols) resolving a Value or Label operand.
+
+    The result is truncated to width bits, unless width is None.
+    """
+    bits = None if width is None else mask(width)
+
+    if isinstance(kind, Label):
+        scale = kind.scale
+
+        def resolve_label(text, pc, symbols):
+            if text not in symbols:
+                raise RuntimeError("Label '{}' cannot be resolved.".format(text))
+
+            value = symbols[text] // scale
+            return value if bits is None else value & bits
+
+        return resolve_label
+
+    labels, scale, negate = kind.labels, kind.scale, kind.negate
+    checked = kind.checked and width is not None
+    if kind.signed:
+        low, high = (-(1 << (width - 1)), 1 << (width - 1)) if checked else (None, None)
+    else:
+        low, high = None, (1 << width) if checked else None
+    unresolved = "'{}' cannot be resolved as a label or a value." if labels else \
+        "'{}' cannot be resolved as a value."
+
+    def resolve_value(text, pc, symbols):
+        if labels and text in symbols:
+            value = symbols[text]
+            if labels == RELATIVE:
+                value -= pc + offset
+            if scale != 1:
+                value //= scale
+        elif text.startswith('0x') or text.startswith('0b'):
+            base, name = (16, 'hexadecimal') if text.startswith('0x') else (2, 'binary')
+            try:
+                value = int(text, base)
+            except ValueError:
+                raise RuntimeError("'{}' is not in a valid {} format.".format(text, name))
+
+            if checked:
+                if value >> width:
+                    raise RuntimeError("'{}' is too large for {}.".format(text, isa_name))
+                return value
+        else:
+            try:
+                value = int(text)
+            except ValueError:
+                raise RuntimeError(unresolved.format(text))
+
+        if negate:
+            value = -value
+
+        if checked and (value >= high or (low is not None and value < low)):
+            raise RuntimeError(
+                "'{}' is too large (values) or too far away (labels) for {}.".format(value, isa_name))
+
+        # 2's complement, truncated to the field width
+        return value if bits is None else value & bits
+
+    return resolve_value
+
+
+class __Compiler__(object):
+    """Compiles the specs of an ISA for one set of run parameters."""
+
+    def __init__(self, namespace, specs, params):
+        self.name = namespace['__name__']
+        self.registers = namespace['REGISTERS']
+        self.offset = namespace['INSTRUCTION_OFFSET']
+        self.params = params
+        self.specs = dict((mnemonic, spec) for spec in specs for mnemonic in spec.mnemonics)
+        self.entries = {}
+
+    def entry(self, mnemonic):
+        entry = self.entries.get(mnemonic)
+        if entry is None:
+            spec = self.specs[mnemonic]
+            compile_spec = self.instruction if isinstance(spec, Instruction) else self.pseudo
+            entry = compile_spec(spec)
+            for name in spec.mnemonics:
+                self.entries[name] = entry
+        return entry
+
+    def __prologue__(self, spec, lines, namespace, lookup=True):
+        """Generate the lines matching operands to the syntax of spec.
+
+        The names of the operands are returned with those of its registers,
+        which are looked up unless lookup is False.
+        """
+        names = __names__(spec.syntax)
+        reserved = __RESERVED__.intersection(names)
+        if reserved:
+            raise ValueError("operands of '{}' cannot be named {}".format(
+                spec.mnemonics[0], ', '.join(sorted(reserved))))
+
+        compiled = forms(spec.syntax)
+        namespace.update(__match__=match, __forms__=compiled,
+                         __registers__=self.registers, __format_error__=__FORMAT_ERROR__,
+                         __register_error__="Register identifier '{}' is not valid in " +
+                         self.name + ".")
+        if len(compiled) == 1 and compiled[0][1] is GROUPS:
+            # A single form whose groups are the fields, matched in place
+            namespace.update(__form__=compiled[0][0])
+            lines.extend([
+                '    found = __form__(operands)',
+                '    if found is None:',
+                '        raise RuntimeError(__format_error__.format(operands.strip()))',
+                '    {}, = found.groups()'.format(', '.join(names)),
+            ])
+        else:
+            lines.extend([
+                '    fields = __match__(operands, __forms__)',
+                '    if fields is None:',
+                '        raise RuntimeError(__format_error__.format(operands.strip()))',
+                '    {}, = fields'.format(', '.join(names)),
+            ])
+
+        registers = [name for name in names if not isinstance(spec.operands.get(name), (Value, Label))]
+        for name in registers:
+            kind = spec.operands.get(name)
+            if kind is not None and kind.exclude:
+                namespace['__exclude_{}__'.format(name)] = frozenset(kind.exclude)
+                lines.extend([
+                    '    if {0} in __exclude_{0}__:'.format(name),
+                    '        raise RuntimeError("\'{}\' instruction cannot be used with \'{{}}\' '
+                    'register.".format({}))'.format(spec.mnemonics[0], name),
+                ])
+        if registers and lookup:
+            lines.append('    try:')
+            lines.extend('        {0} = __registers__[{0}]'.format(name) for name in registers)
+            lines.extend([
+                '    except KeyError as error:',
+                '        raise RuntimeError(__register_error__.format(error.args[0]))',
+            ])
+
+        return names, registers
+
+    def instruction(self, spec):
+        fmt = spec.format
+        template = 0
+        for name, value in spec.constants.items():
+            if value >> fmt.width(name):
+                raise ValueError("{} does not fit the field '{}' of '{}'".format(
+                    value, name, spec.mnemonics[0]))
+            template |= value << fmt.shift(name)
+
+        size = 1
+        filler = []
+        if spec.slots:
+            slots = self.params[spec.slots]
+            filler = self.entry(spec.filler).encode('', pc=None, symbols={}, params=self.params) * slots
+            size += slots * self.entry(spec.filler).size
+
+        namespace = {}
+        lines = ['def encode(operands, pc=None, symbols=None, params=None):']
+        if spec.syntax is None:
+            word = '{:#x}'.format(template)
+        else:
+            names, registers = self.__prologue__(spec, lines, namespace)
+            parts = ['{:#x}'.format(template)]
+            for name in names:
+                if name not in fmt.fields:
+                    raise ValueError("'{}' has no field '{}'".format(spec.mnemonics[0], name))
+                if name not in registers:
+                    resolver = '__resolve_{}__'.format(name)
+                    namespace[resolver] = __resolver__(
+                        spec.operands[name], fmt.width(name), self.name, self.offset)
+                    lines.append('    {0} = {1}({0}, pc, symbols)'.format(name, resolver))
+
+                shift = fmt.shift(name)
+                parts.append('{} << {}'.format(name, shift) if shift else name)
+            word = ' | '.join(parts)
+
+        lines.append('    return [{}]'.format(', '.join([word] + ['{:#x}'.format(w) for w in filler])))
+        exec(compile('\n'.join(lines) + '\n', '<{} {}>'.format(self.name, spec.mnemonics[0]), 'exec'),
+             namespace)
+
+        return Entry(namespace['encode'], size, template)
+
+    def pseudo(self, spec):
+        # Every instruction of the expansion with the number of words preceding it
+        expansion = []
+        size = 0
+        for mnemonic, operands in spec.expansion:
+            entry = self.entry(mnemonic)
+            expansion.append((entry.encode, operands, size))
+            size += entry.size
+
+        if spec.syntax is None:
+            words = []
+            for encode, operands, before in expansion:
+                words.extend(encode(operands, pc=None, symbols={}, params=self.params))
+
+            return Entry(lambda operands, pc=None, symbols=None, params=None: list(words), size, 0)
+
+        namespace = {}
+        lines = ['def resolve(operands, pc=None, symbols=None):']
+        # Registers are passed on as written, for the expansion to look up
+        names, registers = self.__prologue__(spec, lines, namespace, lookup=False)
+        for name in names:
+            if name not in registers:
+                resolver = '__resolve_{}__'.format(name)
+                namespace[resolver] = __resolver__(spec.operands[name], None, self.name, self.offset)
+                lines.append('    {0} = {1}({0}, pc, symbols)'.format(name, resolver))
+        lines.append('    return dict({})'.format(', '.join('{0}={0}'.format(name) for name in names)))
+        exec(compile('\n'.join(lines) + '\n', '<{} {}>'.format(self.name, spec.mnemonics[0]), 'exec'),
+             namespace)
+        resolve = namespace['resolve']
+        offset = self.offset
+
+        def encode(operands, pc=None, symbols=None, params=None):
+            values = resolve(operands, pc, symbols)
+            words = []
+            for encode_one, template, before in expansion:
+                words.extend(encode_one(template.format(**values), pc=None if pc is None else pc + before * offset,
+                                        symbols=symbols, params=params))
+            return words
+
+        return Entry(encode, size, 0)
+
+
+def compile_dispatch(namespace, specs, params):
+    """Compile the instruction specs of an ISA into its read-only dispatch table.
+
+    Keyword arguments:
+    namespace -- the ISA module's globals, for its __name__, REGISTERS and
+                 INSTRUCTION_OFFSET.
+    specs -- the Instruction and Pseudo specs of every mnemonic.
+    params -- the run parameters, fixing the number of delay slots.
+    """
+    compiler = __Compiler__(namespace, specs, params)
+    return MappingProxyType(dict((mnemonic, compiler.entry(mnemonic)) for mnemonic in compiler.specs))
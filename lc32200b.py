@@ -1,4 +1,6 @@
-import re
+from layouts import RELATIVE, Format, Value, compile_dispatch, instruction, pc_relative, pseudo
+from lexer import Lexer
+from scheduling import DelaySlotFiller
 
 """lc3-2000b.py: A definition of the LC3-2200b architecture."""
 __author__ = "Christopher Tam"
@@ -13,16 +15,8 @@ BIT_WIDTH = 32
 OPCODE_WIDTH = 4
 # Define register specifier widths (in bits)
 REGISTER_WIDTH = 4
-    
-ALIASES = {
-    '.word' :   'fill',
-    '.fill' :   'fill',
-    'str'   :   'STR',
-    'shf'   :   None,
-    'shfll' :   'shf',
-    'shfrl' :   'shf',
-    'shfra' :   'shf'
-}
+# Define the number of addresses taken up by each instruction (word addressed)
+INSTRUCTION_OFFSET = 1
     
 REGISTERS = {
         '$zero' :   0,
@@ -43,46 +37,69 @@ REGISTERS = {
         '$ra'   :   15}
 
 
-SYMBOL_TABLE = {}
-
 VALID_PARAMS = {
-        'delay_slots'   :   int}
+        'delay_slots'       :   int,
+        'fill_delay_slots'  :   int}
 
+# fill_delay_slots turns on moving instructions into delay slots (see scheduler)
 PARAMS = {
-        'delay_slots'   :   1}
+        'delay_slots'       :   1,
+        'fill_delay_slots'  :   0}
 
 # Public Functions
 def receive_params(value_table):
+    """Validate custom parameters and return the parameters for a run.
+
+    The module-level PARAMS only hold the defaults and are never modified.
+    """
+    params = dict(PARAMS)
+
     if not value_table:
-        return
+        return params
 
-    for key in value_table:
-        key = key.lower()
+    for key, value in value_table.items():
+        key = key.strip().lower()
         if key not in VALID_PARAMS:
-            raise RuntimeError('{} is not a valid custom parameter.')
+            raise RuntimeError('{} is not a valid custom parameter.'.format(key))
         
         if VALID_PARAMS[key]:
             try:
-                PARAMS[key] = VALID_PARAMS[key](value_table[key])
+                params[key] = VALID_PARAMS[key](value)
             except:
                 raise RuntimeError('{} parameter is not of the valid {}.'.format(key, VALID_PARAMS[key]))
 
+    return params
+
 
 def is_blank(line):
     """Return whether a line is blank and not an instruction."""
-    return __RE_BLANK__.match(line) is not None
+    return LEXER.is_blank(line)
     
 def get_parts(line):
-    """Break down an instruction into 3 parts: Label, Opcode, Operand"""
-    m = __RE_PARTS__.match(line)
-    try:
-        return m.group('Label'), m.group('Opcode'), m.group('Operands')
-    except:
-        return None
+    """Break down an instruction into Keyword, Key, Value, Label, Opcode and Operands.
+
+    Keywords (.orig, .name) are not part of the syntax, so the first three
+    parts are always None.
+    """
+    return LEXER.parts(line)
+
+def dispatch_table(params):
+    """Return the read-only mnemonic dispatch table for a set of parameters."""
+    if params['delay_slots'] == PARAMS['delay_slots']:
+        return DISPATCH
+    return compile_dispatch(globals(), INSTRUCTIONS, params)
 
-def instruction_class(name):
-    """Translate a given instruction name to its corresponding class name."""
-    return ALIASES.get(name, name)
+def scheduler(params):
+    """Return the pass filling delay slots for a set of parameters, None if it is off.
+
+    The pass takes the lines parsed by pass 1 and returns them reordered,
+    with the number of delay slots filled and the number overall.
+    """
+    if not params['fill_delay_slots']:
+        return None
+    return DelaySlotFiller(INSTRUCTIONS, dispatch_table(params), params, REGISTERS, MOVABLE, WRITES,
+                           loads=['ldr'], stores=['str'], zero=REGISTERS['$zero'],
+                           offset=INSTRUCTION_OFFSET).fill
 
 # Private Variables
 __OFFSET_SIZE__ = BIT_WIDTH - OPCODE_WIDTH - (REGISTER_WIDTH * 2)
@@ -96,542 +113,79 @@ __SHF_IMM_SIZE__ = 5
 __SHF_UNUSED_SIZE__ = __OFFSET_SIZE__ - __SHF_IMM_SIZE__ - 2
 assert(__SHF_UNUSED_SIZE__ > 0) # Sanity check
 
-
-__RE_BLANK__ = re.compile(r'^\s*(!.*)?$')
-__RE_PARTS__ = re.compile(r'^\s*((?P<Label>\w+):)?\s*((?P<Opcode>\.?[\w]+)(?P<Operands>[^!]*))?(!.*)?')
-__RE_HEX__ = re.compile(r'0x[A-z0-9]*')
-__RE_R__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<RY>\$\w+?)\s*,\s*(?P<RZ>\$\w+?)\s*$')
-__RE_JALR__ = re.compile(r'^\s*(?P<AT>\$\w+?)\s*,\s*(?P<RA>\$\w+?)\s*$')
-__RE_I__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<RY>\$\w+?)\s*,\s*(?P<Offset>\S+?)\s*$')
-__RE_OFF__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<Offset>\S+?)\s*\((?P<RY>\$\w+?)\)\s*$')
-__RE_LEA__ = re.compile(r'^\s*(?P<RX>\$\w+?)\s*,\s*(?P<Offset>\S+?)\s*$')
-__RE_BR__ = re.compile(r'^\s*(?P<Offset>\S+?)\s*$')
-
-# Private Functions
-def __zero_extend__(binary, target, pad_right=False):
-    if binary.startswith('0b'):
-        binary = binary[2:]
-    
-    zeros = '0' * (target - len(binary))
-    if pad_right:
-        return binary + zeros
-    else:
-        return zeros + binary
-    
-def __sign_extend__(binary, target):
-    if binary.startswith('0b'):
-        binary = binary[2:]
-
-    return binary[0] * (target - len(binary)) + binary
-    
-def __bin2hex__(binary):
-    return '%0*X' % ((len(binary) + 3) // 4, int(binary, 2))
-    
-def __hex2bin__(hexadecimal):
-    return bin(int(hexadecimal, 16))[2:]
-    
-def __dec2bin__(num, bits):
-    """Compute the 2's complement binary of an int value."""
-    return format(num if num >= 0 else (1 << bits) + num, '0{}b'.format(bits))
-
-def __parse_value__(offset, size, pc=None, unsigned=False):
-    bin_offset = None
-    
-    if type(offset) is str:
-        if pc is not None and offset in SYMBOL_TABLE:
-            offset = SYMBOL_TABLE[offset] - (pc + 1)
-        elif offset.startswith('0x'):
-            try:
-                bin_offset = __hex2bin__(offset)
-            except:
-                raise RuntimeError("'{}' is not in a valid hexadecimal format.".format(offset))
-                
-            if len(bin_offset) > size:
-                raise RuntimeError("'{}' is too large for {}.".format(offset, __name__))
-                
-            bin_offset = __zero_extend__(bin_offset, size)
-        elif offset.startswith('0b'):
-            try:
-                bin_offset = bin(int(offset))
-            except:
-                raise RuntimeError("'{}' is not in a valid binary format.".format(offset))
-                
-            if len(bin_offset) > size:
-                raise RuntimeError("'{}' is too large for {}.".format(offset, __name__))
-                
-            bin_offset = __zero_extend__(bin_offset, size)
-            
-    if bin_offset is None:
-        try:
-            offset = int(offset)
-        except:
-            if pc is not None:
-                raise RuntimeError("'{}' cannot be resolved as a label or a value.".format(offset))
-            else:
-                raise RuntimeError("'{}' cannot be resolved as a value.".format(offset))
-        
-        if unsigned:
-            bound = (2**size)
-
-            # >= bound because range is [0, 2^n - 1]
-            if offset >= bound:
-                raise RuntimeError("'{}' is too large (values) or too far away (labels) for {}.".format(offset, __name__))
-        else:
-            bound = 2**(size - 1)
-
-            if offset < -bound or offset >= bound:
-                raise RuntimeError("'{}' is too large (values) or too far away (labels) for {}.".format(offset, __name__))
-            
-        bin_offset = __dec2bin__(offset, size)
-    
-    return bin_offset
-
-def __parse_r__(operands):
-    # Define result
-    result_list = []
-    
-    match = __RE_R__.match(operands)
-    
-    if match is None:
-        raise RuntimeError("Operands '{}' are in an incorrect format.".format(operands.strip()))
-    
-    for op in (match.group('RX'), match.group('RY'), match.group('RZ')):
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(bin(REGISTERS[op])[2:], REGISTER_WIDTH))
-        else:
-            raise RuntimeError("Register identifier '{}' is not valid in {}.".format(op, __name__))
-
-    # Insert unused bits
-    result_list.insert(2, '0' * __UNUSED_SIZE__)
-    
-    return ''.join(result_list)
-
-def __parse_i__(operands, is_offset=False, pc=None):
-    # Define result
-    result_list = []
-    
-    match = __RE_OFF__.match(operands) if is_offset else __RE_I__.match(operands)
-    
-    if match is None:
-        raise RuntimeError("Operands '{}' are in an incorrect format.".format(operands.strip()))
-    
-    for op in (match.group('RX'), match.group('RY')):
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(bin(REGISTERS[op]), REGISTER_WIDTH))
-        else:
-            raise RuntimeError("Register identifier '{}' is not valid in {}.".format(op, __name__))
-            
-    result_list.append(__parse_value__(match.group('Offset'), __OFFSET_SIZE__, pc))
-    
-    return ''.join(result_list)
-
-def __parse_jalr__(operands):
-    # Define result
-    result_list = []
-    
-    match = __RE_JALR__.match(operands)
-    
-    if match is None:
-        raise RuntimeError("Operands '{}' are in an incorrect format.".format(operands.strip()))
-    
-    for op in (match.group('RA'), match.group('AT')):
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(bin(REGISTERS[op]), REGISTER_WIDTH))
-        else:
-            raise RuntimeError("Register identifier '{}' is not valid in {}.".format(op, __name__))
-            
-    return ''.join(result_list)
-
-def __parse_lea__(operands, pc):
-    match = __RE_LEA__.match(operands)
-    if match is None:
-        raise RuntimeError("Operands '{}' are in an incorrect format.".format(operands.strip()))
-    
-    result_list = []
-
-    RX = match.group('RX')
-    label = match.group('Offset')
-    
-    if RX in REGISTERS:
-        result_list.append(__zero_extend__(bin(REGISTERS[RX]), REGISTER_WIDTH))
-    else:
-        raise RuntimeError("Register identifier '{}' is not valid in {}.".format(op, __name__))
-
-    result_list.append('0' * REGISTER_WIDTH) # Unused bits
-    result_list.append(__parse_value__(match.group('Offset'), __OFFSET_SIZE__, pc))
-
-    return ''.join(result_list)
-
-def __parse_br__(operands, pc):
-    match = __RE_BR__.match(operands)
-    if match is None:
-        raise RuntimeError("Operands '{}' are in an incorrect format.".format(operands.strip()))
-
-    return __parse_value__(match.group('Offset'), __OFFSET_SIZE__, pc)
-
-def __parse_shf__(operands, A, D):
-    match = __RE_I__.match(operands)
-    if match is None:
-        raise RuntimeError("Operands '{}' are in an incorrect format.".format(operands.strip()))
-
-    result_list = []
-
-    for op in (match.group('RX'), match.group('RY')):
-        if op in REGISTERS:
-            result_list.append(__zero_extend__(bin(REGISTERS[op]), REGISTER_WIDTH))
-        else:
-            raise RuntimeError("Register identifier '{}' is not valid in {}.".format(op, __name__))
-
-    result_list.append(A)
-    result_list.append(D)
-    result_list.append('0' * __SHF_UNUSED_SIZE__)
-
-    result_list.append(__parse_value__(match.group('Offset'), __SHF_IMM_SIZE__, unsigned=True))
-
-    return ''.join(result_list)
-
-def __generate_delay_slots__(operands):
-    return noop.binary(operands)*PARAMS['delay_slots']
-
-class Instruction:
-    """
-    This is the base class that all implementations of instructions must override.
-    """
-    @staticmethod
-    def opcode():
-        """Return the operation code for the given instruction as an integer."""
-        raise NotImplementedError()
-    
-    @staticmethod
-    def size():
-        """Return how many binary machine-level instructions the instruction will expand to."""
-        raise NotImplementedError()
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        """Assemble the instruction into binary form.
-        
-        Keyword arguments:
-        operands -- a string representation of the operands of the instruction.
-        **kwargs -- additional necessary arguments for the instruction.
-        
-        Returns an iterable representation of the binary instruction(s).
-        """
-        raise NotImplementedError()
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        """Assemble the instruction into hexadecimal form.
-        
-        Keyword arguments:
-        operands -- a string representation of the operands of the instruction.
-        **kwargs -- additional necessary arguments for the instruction.
-        
-        Returns an iterable representation of the hexadecimal instruction(s).
-        """
-        raise NotImplementedError()
-
-class add(Instruction):
-    @staticmethod
-    def opcode():
-        return 0
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(add.opcode()), OPCODE_WIDTH)
-        operands = __parse_r__(operands)
-        return [opcode + operands]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in add.binary(operands, **kwargs)]
-
-
-class addi(Instruction):
-    @staticmethod
-    def opcode():
-        return 1
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(addi.opcode()), OPCODE_WIDTH)
-        operands = __parse_i__(operands)
-        return [opcode + operands]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in addi.binary(operands, **kwargs)]
-
-class nand(Instruction):
-    @staticmethod
-    def opcode():
-        return 2
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(nand.opcode()), OPCODE_WIDTH)
-        operands = __parse_r__(operands)
-        return [opcode + operands]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in nand.binary(operands, **kwargs)]
-
-
-class beq(Instruction):
-    @staticmethod
-    def opcode():
-        return 3
-        
-    @staticmethod
-    def size():
-        return PARAMS['delay_slots'] + 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-    
-        opcode = __zero_extend__(bin(beq.opcode()), OPCODE_WIDTH)
-        operands = __parse_i__(operands, pc=kwargs['pc'])
-
-        return [__zero_extend__(opcode + operands, BIT_WIDTH, pad_right=True)] + __generate_delay_slots__(operands)
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in beq.binary(operands, **kwargs)]
-
-
-class jalr(Instruction):
-    @staticmethod
-    def opcode():
-        return 4
-        
-    @staticmethod
-    def size():
-        return PARAMS['delay_slots'] + 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(jalr.opcode()), OPCODE_WIDTH)
-        operands = __parse_jalr__(operands)
-        return [__zero_extend__(opcode + operands, BIT_WIDTH, pad_right=True)] + __generate_delay_slots__(operands)
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in jalr.binary(operands, **kwargs)]
-
-
-class ldr(Instruction):
-    @staticmethod
-    def opcode():
-        return 5
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(ldr.opcode()), OPCODE_WIDTH)
-        operands = __parse_i__(operands, is_offset=True)
-        return [opcode + operands]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in ldr.binary(operands, **kwargs)]
-        
-
-class lea(Instruction):
-    @staticmethod
-    def opcode():
-        return 6
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-
-        opcode = __zero_extend__(bin(lea.opcode()), OPCODE_WIDTH)
-        operands = __parse_lea__(operands, kwargs['pc'])
-        return [__zero_extend__(opcode + operands, BIT_WIDTH, pad_right=True)]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in lea.binary(operands, **kwargs)]
-
-
-class STR(Instruction):
-    @staticmethod
-    def opcode():
-        return 7
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(STR.opcode()), OPCODE_WIDTH)
-        operands = __parse_i__(operands, is_offset=True)
-        return [opcode + operands]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in STR.binary(operands, **kwargs)]
-
-class shf(Instruction):
-    @staticmethod
-    def opcode():
-        return 8
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        assert('instruction' in kwargs)
-
-        instr = kwargs['instruction']
-
-        if instr == 'shfll':
-            A, D = '0', '0'
-        elif instr == 'shfrl':
-            A, D = '0', '1'
-        elif instr == 'shfra':
-            A, D = '1', '1'
-        else:
-            raise RuntimeError("'shf' instruction could not be assembled.")
-        
-        opcode = __zero_extend__(bin(shf.opcode()), OPCODE_WIDTH)
-        operands = __parse_shf__(operands, A, D)
-
-        return [opcode + operands]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in shf.binary(operands, **kwargs)]
-
-
-class bne(Instruction):
-    @staticmethod
-    def opcode():
-        return 9
-        
-    @staticmethod
-    def size():
-        return PARAMS['delay_slots'] + 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        assert('pc' in kwargs)  # Sanity check
-    
-        opcode = __zero_extend__(bin(bne.opcode()), OPCODE_WIDTH)
-        operands = __parse_i__(operands, pc=kwargs['pc'])
-
-        return [__zero_extend__(opcode + operands, BIT_WIDTH, pad_right=True)] + __generate_delay_slots__(operands)
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in bne.binary(operands, **kwargs)]
-
-
-class halt(Instruction):
-    @staticmethod
-    def opcode():
-        return 15
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        opcode = __zero_extend__(bin(halt.opcode()), OPCODE_WIDTH)
-        return [__zero_extend__(opcode, BIT_WIDTH, pad_right=True)]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in halt.binary(operands, **kwargs)]
-
-
-class noop(Instruction):
-    """noop
-    
-    Equivalent to:
-    add $zero, $zero, $zero
-    """
-
-    @staticmethod
-    def opcode():
-        return None
-        
-    @staticmethod
-    def size():
-        return add.size()
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        return add.binary('$zero, $zero, $zero', **kwargs)
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in noop.binary(operands, **kwargs)]
-
-class ret(Instruction):
-    """ret
-    
-    Equivalent to:
-    jalr $ra, $zero
-    """
-
-    @staticmethod
-    def opcode():
-        return None
-        
-    @staticmethod
-    def size():
-        return jalr.size()
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        return jalr.binary('$ra, $zero', **kwargs)
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in ret.binary(operands, **kwargs)]
-
-class fill(Instruction):
-    @staticmethod
-    def opcode():
-        return None
-        
-    @staticmethod
-    def size():
-        return 1
-        
-    @staticmethod
-    def binary(operands, **kwargs):
-        if type(operands) is str:
-            operands = operands.strip()
-        return [__parse_value__(operands, BIT_WIDTH)]
-        
-    @staticmethod
-    def hex(operands, **kwargs):
-        return [__bin2hex__(instr) for instr in fill.binary(operands, **kwargs)]
-        
+# Bit positions of the instruction fields
+__OPCODE_SHIFT__ = BIT_WIDTH - OPCODE_WIDTH
+__RX_SHIFT__ = __OPCODE_SHIFT__ - REGISTER_WIDTH
+__RY_SHIFT__ = __RX_SHIFT__ - REGISTER_WIDTH
+__SHF_A_SHIFT__ = __RY_SHIFT__ - 1
+__SHF_D_SHIFT__ = __SHF_A_SHIFT__ - 1
+
+LEXER = Lexer('!')
+
+# Instruction formats
+__R__ = Format(opcode=(BIT_WIDTH - 1, __OPCODE_SHIFT__),
+               rx=(__OPCODE_SHIFT__ - 1, __RX_SHIFT__),
+               ry=(__RX_SHIFT__ - 1, __RY_SHIFT__),
+               rz=(REGISTER_WIDTH - 1, 0))
+__I__ = Format(opcode=(BIT_WIDTH - 1, __OPCODE_SHIFT__),
+               rx=(__OPCODE_SHIFT__ - 1, __RX_SHIFT__),
+               ry=(__RX_SHIFT__ - 1, __RY_SHIFT__),
+               offset=(__OFFSET_SIZE__ - 1, 0))
+__SHF__ = Format(opcode=(BIT_WIDTH - 1, __OPCODE_SHIFT__),
+                 rx=(__OPCODE_SHIFT__ - 1, __RX_SHIFT__),
+                 ry=(__RX_SHIFT__ - 1, __RY_SHIFT__),
+                 a=(__SHF_A_SHIFT__, __SHF_A_SHIFT__),
+                 d=(__SHF_D_SHIFT__, __SHF_D_SHIFT__),
+                 offset=(__SHF_IMM_SIZE__ - 1, 0))
+__WORD__ = Format(value=(BIT_WIDTH - 1, 0))
+
+# Operand values
+__OFFSET__ = Value()
+__PC_OFFSET__ = Value(labels=RELATIVE)
+__SHF_AMOUNT__ = Value(signed=False)
+
+INSTRUCTIONS = [
+    instruction('add', __R__, 'rx, ry, rz', opcode=0),
+    instruction('addi', __I__, 'rx, ry, offset', {'offset': __OFFSET__}, opcode=1),
+    instruction('nand', __R__, 'rx, ry, rz', opcode=2),
+    instruction('beq', __I__, 'rx, ry, offset', {'offset': __PC_OFFSET__}, slots='delay_slots',
+                opcode=3),
+    instruction('bne', __I__, 'rx, ry, offset', {'offset': __PC_OFFSET__}, slots='delay_slots',
+                opcode=9),
+    # jalr $AT, $RA
+    instruction('jalr', __I__, 'ry, rx', slots='delay_slots', opcode=4),
+    instruction('ldr', __I__, 'rx, offset(ry)', {'offset': __OFFSET__}, opcode=5),
+    # The RY field of lea is unused
+    instruction('lea', __I__, 'rx, offset', {'offset': __PC_OFFSET__}, opcode=6),
+    instruction('str', __I__, 'rx, offset(ry)', {'offset': __OFFSET__}, opcode=7),
+    # The shift mode bits (A, D) are part of the template
+    instruction('shfll', __SHF__, 'rx, ry, offset', {'offset': __SHF_AMOUNT__}, opcode=8, a=0, d=0),
+    instruction('shfrl', __SHF__, 'rx, ry, offset', {'offset': __SHF_AMOUNT__}, opcode=8, a=0, d=1),
+    instruction('shfra', __SHF__, 'rx, ry, offset', {'offset': __SHF_AMOUNT__}, opcode=8, a=1, d=1),
+    instruction('halt', __I__, opcode=15),
+
+    pseudo('noop', None, [('add', '$zero, $zero, $zero')]),
+    pseudo('ret', None, [('jalr', '$ra, $zero')]),
+
+    instruction('fill .fill .word', __WORD__, 'value', {'value': Value()}),
+]
+
+# Define the mnemonics encoding labels as distances from their own address
+PC_RELATIVE = pc_relative(INSTRUCTIONS)
+
+# Instructions that may be moved into delay slots, and the register field
+# every instruction writes (its other register fields are read)
+MOVABLE = frozenset(['add', 'addi', 'nand', 'ldr', 'str', 'lea', 'shfll', 'shfrl', 'shfra'])
+WRITES = {
+        'add'   :   'rx',
+        'addi'  :   'rx',
+        'nand'  :   'rx',
+        'jalr'  :   'rx',
+        'ldr'   :   'rx',
+        'lea'   :   'rx',
+        'shfll' :   'rx',
+        'shfrl' :   'rx',
+        'shfra' :   'rx'}
+
+# Dispatch table of every mnemonic, compiled once when the ISA is loaded
+DISPATCH = compile_dispatch(globals(), INSTRUCTIONS, receive_params(None))
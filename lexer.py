@@ -0,0 +1,182 @@
+"""lexer.py: Splitting assembly source lines and matching their operands.
+
+Every ISA configures a Lexer with its comment character and whether it has
+.keyword directives. Lexer.parts splits a line into its directive, label,
+mnemonic and operands in one pass of plain string operations, which is
+faster than the per-ISA line expressions it replaced (see benchmarks.lexer).
+
+Operand forms are written the way the operands are, with names for the
+fields, e.g. 'rx, offset(ry)', and compiled once with operand_forms into
+anchored regular expressions, which match checks the operands against.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import operator
+import re
+
+# Tokens separating the fields of operands
+__PUNCTUATION__ = frozenset([',', '(', ')'])
+
+
+def __is_word__(text):
+    """Return whether text is a non-empty run of letters, digits and underscores."""
+    return text.replace('_', 'a').isalnum()
+
+
+def __leading_word__(text):
+    """Return the longest prefix of text that is a word ('' if there is none)."""
+    for end, char in enumerate(text):
+        if not (char == '_' or char.isalnum()):
+            return text[:end]
+    return text
+
+
+def split_operands(operands):
+    """Split operands into their tokens, the punctuation ',', '(' and ')' and the text between them."""
+    return operands.replace(',', ' , ').replace('(', ' ( ').replace(')', ' ) ').split()
+
+
+# A field of operands: everything up to whitespace or punctuation
+__FIELD__ = r'([^\s,()]+)'
+__REPEATED_FIELD__ = r'[^\s,()]+'
+
+# The getter of forms whose groups are every field, in order
+GROUPS = operator.methodcaller('groups')
+
+
+def __getter__(groups):
+    """Return a function giving the fields of a match, by group number (None for missing fields)."""
+    if groups == list(range(1, len(groups) + 1)):
+        return GROUPS
+    return lambda found: tuple(found.group(group) if group else None for group in groups)
+
+
+def operand_forms(*specs):
+    """Compile the operand forms an instruction accepts, for match.
+
+    Every form alternates fields and punctuation, starting with a field, and
+    is compiled into an anchored regular expression allowing whitespace
+    around the punctuation. The fields are named in the order of their first
+    appearance in specs, and match returns them in that order.
+
+    Returns a tuple of (match function, getter) pairs, one per form. The
+    match function returns a match object of the operands (or None) and the
+    getter the fields of a match, which is GROUPS if they are its groups.
+    """
+    names = []
+    for spec in specs:
+        for token in split_operands(spec):
+            if token not in __PUNCTUATION__ and token not in names:
+                names.append(token)
+
+    # (match function, getter of every field) of every form, tried in order
+    forms = []
+    for spec in specs:
+        tokens = split_operands(spec)
+        if any((token in __PUNCTUATION__) != (index % 2 == 1) for index, token in enumerate(tokens)):
+            raise ValueError("operand form '{}' does not alternate fields and punctuation".format(spec))
+
+        pattern, groups = [], {}
+        for token in tokens:
+            if token in __PUNCTUATION__:
+                pattern.append(r'\s*' + re.escape(token) + r'\s*')
+            elif token in groups:
+                pattern.append(__REPEATED_FIELD__)
+            else:
+                groups[token] = len(groups) + 1
+                pattern.append(__FIELD__)
+
+        expression = re.compile(r'\s*' + ''.join(pattern) + r'\s*$')
+        forms.append((expression.match, __getter__([groups.get(name, 0) for name in names])))
+
+    return tuple(forms)
+
+
+def match(operands, forms):
+    """Match operands against forms compiled by operand_forms.
+
+    Returns a tuple with the text of every field (None for fields the
+    matching form does not have), or None if operands have none of the forms.
+    """
+    for match_form, fields in forms:
+        found = match_form(operands)
+        if found is not None:
+            return fields(found)
+    return None
+
+
+class Lexer(object):
+    """Splits the source lines of an ISA into their parts.
+
+    comment -- the character starting a comment.
+    directives -- whether lines may start with a '.keyword [key =] value' directive.
+    """
+
+    def __init__(self, comment, directives=False):
+        self.comment = comment
+        self.directives = directives
+
+    def is_blank(self, line):
+        """Return whether a line holds nothing but whitespace and a comment."""
+        code = line.lstrip()
+        return not code or code[0] == self.comment
+
+    def parts(self, line):
+        """Break a line into its Keyword, Key, Value, Label, Opcode and Operands.
+
+        Missing parts are None, except for the operands of an opcode, which
+        are the text following it up to the comment (possibly empty).
+        """
+        code = line.split(self.comment, 1)[0].lstrip()
+        keyword = key = value = label = None
+
+        if self.directives and code.startswith('.'):
+            directive = self.__directive__(code)
+            if directive is not None:
+                keyword, key, value, code = directive
+
+        if ':' in code:
+            head, _, rest = code.partition(':')
+            if __is_word__(head):
+                label, code = head, rest.lstrip()
+
+        pieces = code.split(None, 1)
+        if not pieces:
+            return (keyword, key, value, label, None, None)
+
+        opcode = pieces[0]
+        if not __is_word__(opcode[1:] if opcode[0] == '.' else opcode):
+            # Operands directly following the opcode
+            dot = '.' if opcode[0] == '.' else ''
+            opcode = dot + __leading_word__(code[len(dot):])
+            if opcode == dot:
+                return (keyword, key, value, label, None, None)
+            return (keyword, key, value, label, opcode, code[len(opcode):].lstrip())
+
+        return (keyword, key, value, label, opcode, pieces[1] if len(pieces) > 1 else '')
+
+    @staticmethod
+    def __directive__(code):
+        """Split '.keyword [key =] value rest', or return None if code is not a directive.
+
+        The value of a directive missing one is None.
+        """
+        keyword = __leading_word__(code[1:])
+        if not keyword:
+            return None
+
+        rest = code[1 + len(keyword):].lstrip()
+        key, operands = None, rest
+        if '=' in rest:
+            name, _, after = rest.partition('=')
+            name = name.rstrip()
+            # Without a value after it, the '=' belongs to the value
+            if __is_word__(name) and after.strip():
+                key, operands = name, after.lstrip()
+
+        if not operands:
+            return (keyword, None, None, '')
+
+        value = operands.split(None, 1)[0]
+        return (keyword, key, value, operands[len(value):].lstrip())
+
@@ -0,0 +1,137 @@
+"""outputs.py: Output files that are only replaced when their content changes.
+
+An UpdatingFile is written to a temporary file next to its target while the
+written bytes are hashed. Closing it compares the result against the target
+and renames the temporary file over the target only if they differ, so an
+unchanged output keeps its old modification time and does not trigger
+rebuilds of everything depending on it. Readers never see a partly written
+file either way.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+# Atomically replaces an existing file on every platform (Python 2 only has rename)
+__replace__ = getattr(os, 'replace', os.rename)
+
+__CHUNK_SIZE__ = 1 << 20
+
+# Temporary files are private, new outputs get the permissions open() would give them
+__UMASK__ = os.umask(0)
+os.umask(__UMASK__)
+
+
+def __file_digest__(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as read_file:
+        for chunk in iter(lambda: read_file.read(__CHUNK_SIZE__), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class UpdatingFile(object):
+    """A write-only file replacing path on close, if its content differs.
+
+    Text is written encoded as UTF-8 with the platform's line endings, as a
+    file opened with mode 'w' would.
+    """
+
+    def __init__(self, path, binary=False):
+        self.path = path
+        self.binary = binary
+        self.digest = hashlib.sha256()
+        self.size = 0
+        # Whether closing replaced the target, None until closed
+        self.changed = None
+
+        fd, self.temp_path = tempfile.mkstemp(prefix='.{}.'.format(os.path.basename(path)),
+                                              suffix='.tmp', dir=os.path.dirname(path) or '.')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        if not self.binary:
+            data = data.encode('utf-8')
+            if os.linesep != '\n':
+                data = data.replace(b'\n', os.linesep.encode('ascii'))
+
+        self.digest.update(data)
+        self.size += len(data)
+        self.file.write(data)
+
+    def same(self):
+        """Return whether the target already holds exactly what was written."""
+        try:
+            if os.path.getsize(self.path) != self.size:
+                return False
+            return __file_digest__(self.path) == self.digest.digest()
+        except (IOError, OSError):  # Missing or unreadable target
+            return False
+
+    def close(self):
+        """Replace the target with what was written unless it is unchanged.
+
+        Returns whether the target was replaced.
+        """
+        if self.changed is not None:
+            return self.changed
+
+        self.file.close()
+        self.changed = not self.same()
+        if self.changed:
+            try:
+                mode = os.stat(self.path).st_mode & 0o7777
+            except OSError:
+                mode = 0o666 & ~__UMASK__
+            os.chmod(self.temp_path, mode)
+            __replace__(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+
+        return self.changed
+
+    def discard(self):
+        """Drop what was written, leaving the target alone."""
+        if self.changed is None:
+            self.file.close()
+            os.remove(self.temp_path)
+            self.changed = False
+
+
+def copy_if_changed(source, path):
+    """Copy the file at source to path unless path already has the same content."""
+    target = UpdatingFile(path, binary=True)
+    try:
+        with open(source, 'rb') as read_file:
+            shutil.copyfileobj(read_file, target)
+    except Exception:
+        target.discard()
+        raise
+
+    return target.close()
+
+
+def __escape__(path):
+    return path.replace('\\', '\\\\').replace(' ', '\\ ').replace('#', '\\#').replace('$', '$$')
+
+
+def write_depfile(path, targets, prerequisites, only_changed=False):
+    """Write a Make rule saying targets depend on prerequisites to path.
+
+    Every prerequisite also gets an empty rule of its own (like gcc -MP), so
+    make does not fail once one of them is removed.
+    """
+    depfile = UpdatingFile(path) if only_changed else open(path, 'w')
+    try:
+        depfile.write('{}: {}\n'.format(' '.join(__escape__(target) for target in targets),
+                                        ' \\\n  '.join(__escape__(name) for name in prerequisites)))
+        for name in prerequisites:
+            depfile.write('\n{}:\n'.format(__escape__(name)))
+    except Exception:
+        if only_changed:
+            depfile.discard()
+        raise
+
+    depfile.close()
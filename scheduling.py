@@ -0,0 +1,239 @@
+"""scheduling.py: Filling the delay slots of branches with instructions from before them.
+
+An ISA with delay slots (see layouts.Instruction) encodes its branches
+followed by filler instructions (noops), which run whether or not the branch
+is taken. DelaySlotFiller moves instructions that do not depend on the branch
+from just before it into its slots instead, dropping a filler word for every
+instruction moved, so programs behave the same but are smaller and run fewer
+noops. It works on the lines parsed by pass 1, before they are laid out, so
+labels are placed where their lines end up.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+from encoding import Entry
+from layouts import RELATIVE, Instruction, Pseudo, Register, Value, forms
+from lexer import match, split_operands
+
+
+def __number__(text):
+    """Return the value of a numeric operand, or None if it is not a number (e.g. a label)."""
+    try:
+        if text.lstrip('-').startswith('0x'):
+            return int(text, 16)
+        elif text.lstrip('-').startswith('0b'):
+            return int(text, 2)
+        return int(text)
+    except ValueError:
+        return None
+
+
+def __filled__(entry, count):
+    """Return an Entry encoding like entry, without its last count (filler) words."""
+    encode = entry.encode
+
+    def filled(operands, pc=None, symbols=None, params=None):
+        return encode(operands, pc=pc, symbols=symbols, params=params)[:-count]
+
+    return Entry(filled, entry.size - count, entry.template)
+
+
+class DelaySlotFiller(object):
+    """Moves instructions from before branches into their delay slots.
+
+    specs -- the INSTRUCTIONS of the ISA.
+    dispatch -- its dispatch table, for the run parameters.
+    params -- the run parameters, giving the number of delay slots.
+    registers -- the register names of the ISA and their numbers.
+    movable -- the mnemonics of the instructions that may be moved: ones
+               that neither change the pc nor take more than a word.
+    writes -- the register field every instruction writes, by mnemonic.
+    loads, stores -- the mnemonics of instructions reading and writing memory.
+    zero -- the number of the register always reading as zero (None if
+            there is none), which no instruction depends on.
+    offset -- the number of addresses taken up by every instruction.
+
+    Instructions are taken from the ones right before a branch, nearest
+    first, and keep their order in the slots. An instruction is only moved
+    if it does not write a register the branch (or any instruction it is
+    moved past) reads or writes, does not read a register they write, and
+    is not moved past a memory access when either of them stores. Labeled
+    lines are never moved, and nothing is moved past them or into the slots
+    of a labeled branch. Neither are instructions between a PC-relative
+    instruction with a numeric offset (e.g. 'beq $zero, $zero, 2') and its
+    target, whose distance would change. Only branches encoding their
+    slots with one-word fillers are filled, including pseudo-instructions
+    expanding to one (e.g. ret).
+    """
+
+    def __init__(self, specs, dispatch, params, registers, movable, writes, loads=(), stores=(), zero=None,
+                 offset=1):
+        self.dispatch = dispatch
+        self.registers = registers
+        self.movable = frozenset(movable)
+        self.writes = writes
+        self.loads = frozenset(loads)
+        self.stores = frozenset(stores)
+        self.zero = zero
+        self.offset = offset
+
+        self.specs = {}
+        # The filler mnemonic and number of slots of every branch with delay slots
+        self.slots = {}
+        for spec in specs:
+            for mnemonic in spec.mnemonics:
+                self.specs[mnemonic] = spec
+            if isinstance(spec, Instruction) and spec.slots and params[spec.slots] and \
+                    dispatch[spec.filler].size == 1:
+                self.slots[spec.mnemonics[0]] = (spec.filler, params[spec.slots])
+
+        # Pseudo-instructions without operands expanding to a branch with delay slots
+        for spec in specs:
+            if isinstance(spec, Pseudo) and spec.syntax is None and len(spec.expansion) == 1 and \
+                    spec.expansion[0][0] in self.slots:
+                for mnemonic in spec.mnemonics:
+                    self.slots[mnemonic] = self.slots[spec.expansion[0][0]]
+
+        # Entries of branches with some of their slots filled, by (mnemonic, count)
+        self.entries = {}
+
+    def effects(self, mnemonic, operands):
+        """Return the registers read and written by an instruction and its relative numeric offset.
+
+        Returns a tuple (read, written, offset), with offset None unless an
+        operand is a number resolved relative to the pc, or None if the
+        operands cannot be told apart.
+        """
+        spec = self.specs.get(mnemonic)
+        if isinstance(spec, Pseudo):
+            if spec.syntax is not None or len(spec.expansion) != 1:
+                return None
+            mnemonic, operands = spec.expansion[0]
+            spec = self.specs.get(mnemonic)
+
+        if spec is None:
+            return None
+        if spec.syntax is None:
+            return (frozenset(), frozenset(), None)
+
+        names = []
+        for token in split_operands(spec.syntax):
+            if token not in ',()' and token not in names:
+                names.append(token)
+
+        fields = match(operands, forms(spec.syntax))
+        if fields is None:
+            return None
+
+        read, written, offset = set(), set(), None
+        for name, text in zip(names, fields):
+            kind = spec.operands.get(name)
+            if kind is None or isinstance(kind, Register):
+                number = self.registers.get(text)
+                if number is None:
+                    return None
+                if number != self.zero:
+                    (written if self.writes.get(mnemonic) == name else read).add(number)
+            elif isinstance(kind, Value) and kind.labels == RELATIVE and __number__(text) is not None:
+                offset = __number__(text) * kind.scale
+
+        return (frozenset(read), frozenset(written), offset)
+
+    @staticmethod
+    def __independent__(first, second):
+        """Return whether two (read, written, memory) effects can run in either order."""
+        read, written, memory = first
+        other_read, other_written, other_memory = second
+        if written & (other_read | other_written) or read & other_written:
+            return False
+        return not (memory and other_memory and 'store' in (memory, other_memory))
+
+    def __memory__(self, mnemonic):
+        return 'load' if mnemonic in self.loads else 'store' if mnemonic in self.stores else None
+
+    def fill(self, lines):
+        """Fill the delay slots of parsed lines.
+
+        Returns the lines in their new order, with the branches whose slots
+        were filled encoding fewer filler words, the number of slots filled
+        and the number of slots overall.
+        """
+        # Addresses of the lines as they are, and the (lowest, highest)
+        # addresses between PC-relative instructions with numeric offsets
+        # and their targets
+        addresses = []
+        reaches = []
+        pc = 0
+        for line in lines:
+            if line.keyword == 'orig':
+                pc = __number__(line.value or '') or 0
+            addresses.append(pc)
+            if line.instr is not None and line.keyword != 'word':
+                effects = self.effects(line.opcode, line.operands)
+                if effects is not None and effects[2] is not None:
+                    target = pc + self.offset + effects[2]
+                    reaches.append((min(pc, target), max(pc, target)))
+                pc += line.instr.size * self.offset
+
+        scheduled = []
+        # Lines of scheduled before this index (up to the last branch) stay where they are
+        barrier = 0
+        filled = total = 0
+
+        for index, line in enumerate(lines):
+            slots = self.slots.get(line.opcode) if line.instr is not None and line.keyword != 'word' else None
+            if slots is None:
+                scheduled.append((index, line))
+                continue
+
+            filler, count = slots
+            total += count
+            effects = self.effects(line.opcode, line.operands)
+            end = addresses[index] + line.instr.size * self.offset
+            chosen = []
+
+            if not line.label and effects is not None:
+                branch = (effects[0], effects[1], None)
+                # Effects of the instructions staying between the chosen ones and the branch
+                kept = []
+                position = len(scheduled)
+                while position > barrier and len(chosen) < count:
+                    position -= 1
+                    candidate_index, candidate = scheduled[position]
+                    if candidate.label or candidate.keyword or candidate.instr is None:
+                        break
+                    if any(low < end and addresses[candidate_index] <= high for low, high in reaches):
+                        break
+                    if candidate.opcode == filler:
+                        continue
+                    if candidate.opcode not in self.movable:
+                        break
+
+                    candidate_effects = self.effects(candidate.opcode, candidate.operands)
+                    if candidate_effects is None or candidate_effects[2] is not None:
+                        break
+                    candidate_effects = (candidate_effects[0], candidate_effects[1],
+                                         self.__memory__(candidate.opcode))
+
+                    if all(self.__independent__(candidate_effects, other) for other in [branch] + kept):
+                        chosen.append(position)
+                    else:
+                        kept.append(candidate_effects)
+
+            if not chosen:
+                scheduled.append((index, line))
+            else:
+                first = min(chosen)
+                tail = scheduled[first:]
+                del scheduled[first:]
+                moved = [entry for position, entry in enumerate(tail, first) if position in chosen]
+                scheduled.extend(entry for position, entry in enumerate(tail, first) if position not in chosen)
+                key = (line.opcode, len(chosen))
+                if key not in self.entries:
+                    self.entries[key] = __filled__(line.instr, len(chosen))
+                scheduled.append((index, line._replace(instr=self.entries[key])))
+                scheduled.extend(moved)
+                filled += len(chosen)
+
+            barrier = len(scheduled)
+
+        return ([line for index, line in scheduled], filled, total)
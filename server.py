@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import base64
+import io
+import json
+import os
+import socket
+import threading
+
+try:
+    import socketserver
+except ImportError:  # Python 2
+    import SocketServer as socketserver
+
+from assembler import Assembler, load_isa
+from writers import ALTERA_SIZE, FORMATS, IMAGE_WRITERS, ImageError, write_formats
+
+"""server.py: Long-running assembler daemon keeping ISA definitions loaded.
+
+Clients connect over a Unix domain socket or localhost TCP and send one JSON
+request per line:
+
+    {"isa": "cs3220", "params": {"key": "value"}, "source": "...",
+     "emit": ["mif", "sym"], "separator": "\\n", "memory": 16384, "bin": false,
+     "endian": "little", "compress_mif": false, "mif_comments": true}
+
+Only isa and source are required. Each request is answered with one JSON
+line:
+
+    {"success": true, "messages": [...], "symbols": {"label": 4, ...},
+     "image": [[pc, word], ...], "outputs": {"mif": "...", "sym": "..."}}
+
+Binary outputs (raw) are base64 encoded.
+
+Every request is assembled by a fresh Assembler, so concurrent clients never
+share a symbol table or parameters.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+
+# ISA definitions loaded when the server starts
+DEFAULT_ISAS = ('cs3220', 'lc2200', 'lc32200a', 'lc32200b')
+
+
+def __text__(output):
+    return base64.b64encode(output).decode('ascii') if isinstance(output, bytes) else output
+
+
+class AssemblerService(object):
+    """Assembles requests against a fixed set of preloaded ISA modules."""
+
+    def __init__(self, isa_names=DEFAULT_ISAS):
+        self.isas = dict((name, load_isa(name)) for name in isa_names)
+
+    def assemble(self, request):
+        """Assemble a single decoded request, returning the response dict."""
+        messages = []
+        response = {'success': False, 'messages': messages}
+
+        isa = self.isas.get(request.get('isa'))
+        if isa is None:
+            messages.append("Error: ISA '{}' is not loaded (choose from {})".format(
+                request.get('isa'), ', '.join(sorted(self.isas))))
+            return response
+
+        source = request.get('source')
+        if source is None:
+            messages.append("Error: request has no source text")
+            return response
+
+        formats = request.get('emit', [])
+        for kind in formats:
+            if kind not in FORMATS:
+                messages.append("Error: '{}' is not a valid output format (choose from {})".format(
+                    kind, ', '.join(FORMATS)))
+                return response
+
+        try:
+            assembler = Assembler(isa, request.get('params'), file_name=request.get('name', ''),
+                                  log=messages.append)
+        except Exception as e:
+            messages.append("Error: Failed to parse custom parameters for {}. {}".format(
+                isa.__name__, str(e)))
+            return response
+
+        success, results = assembler.assemble(source.splitlines(True))
+        if not success:
+            return response
+
+        files = dict((kind, io.BytesIO() if kind in IMAGE_WRITERS and IMAGE_WRITERS[kind].binary
+                      else io.StringIO())
+                     for kind in formats)
+        try:
+            fits = write_formats(files, isa, assembler.symbol_table, results,
+                                 sep=request.get('separator', '\n'),
+                                 depth=request.get('memory') or ALTERA_SIZE,
+                                 use_hex=not request.get('bin', False),
+                                 endian=request.get('endian', 'little'),
+                                 compress_mif=request.get('compress_mif', False),
+                                 mif_comments=request.get('mif_comments', True))
+        except ImageError as e:
+            assembler.error(-1, str(e))
+            return response
+        if not fits:
+            assembler.error(-1, "Memory limit exceeded! Cannot be uploaded to ALTERA Cyclone V")
+
+        response.update(success=True,
+                        symbols=assembler.symbol_table,
+                        image=[list(pair) for pair in results],
+                        outputs=dict((kind, __text__(f.getvalue())) for kind, f in files.items()))
+        return response
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answers newline delimited JSON requests until the client disconnects."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError('request is not a JSON object')
+            except ValueError as e:
+                response = {'success': False, 'messages': ["Error: Malformed request. {}".format(e)]}
+            else:
+                try:
+                    response = self.server.service.assemble(request)
+                except Exception as e:
+                    response = {'success': False, 'messages': ["Error: {}".format(e)]}
+
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def parse_address(value):
+    """Parse unix:PATH or [HOST:]PORT into a socket family and address."""
+    if value.startswith('unix:'):
+        return (socket.AF_UNIX, value[len('unix:'):])
+
+    host, _, port = value.rpartition(':')
+    try:
+        return (socket.AF_INET, (host or '127.0.0.1', int(port)))
+    except ValueError:
+        raise argparse.ArgumentTypeError("'{}' is not unix:PATH or HOST:PORT".format(value))
+
+
+def make_server(address, service):
+    """Create a threaded server for (family, address) answering with service."""
+    family, addr = address
+
+    if family == socket.AF_UNIX:
+        if os.path.exists(addr):
+            os.unlink(addr)
+        server = UnixServer(addr, RequestHandler)
+    else:
+        server = TCPServer(addr, RequestHandler)
+
+    server.service = service
+    return server
+
+
+class Client(object):
+    """A connection to a running server, sending one request at a time."""
+
+    def __init__(self, address):
+        family, addr = parse_address(address) if isinstance(address, str) else address
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(addr)
+        self.file = self.sock.makefile('rwb')
+        self.lock = threading.Lock()
+
+    def assemble(self, isa, source, **request):
+        """Assemble source on the server. See the module docstring for the request fields."""
+        request.update(isa=isa, source=source)
+
+        with self.lock:
+            self.file.write((json.dumps(request) + '\n').encode('utf-8'))
+            self.file.flush()
+            return json.loads(self.file.readline().decode('utf-8'))
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser('server.py',
+                                     description='Serves assemble requests from a long-running process.')
+    parser.add_argument('address', type=parse_address,
+                        help='where to listen, either unix:PATH or [HOST:]PORT (HOST defaults to 127.0.0.1)')
+    parser.add_argument('-i', '--isa', required=False, type=str, default=','.join(DEFAULT_ISAS),
+                        help='comma separated ISA definition modules to keep loaded [default: {}]'.format(
+                            ','.join(DEFAULT_ISAS)))
+    args = parser.parse_args()
+
+    try:
+        service = AssemblerService([name.strip() for name in args.isa.split(',') if name.strip()])
+    except Exception as e:
+        print("Error: Failed to load ISA definition module. {}\n".format(str(e)))
+        exit(1)
+
+    server = make_server(args.address, service)
+    print("Serving {} on {}...".format(', '.join(sorted(service.isas)), args.address[1]))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.address[0] == socket.AF_UNIX:
+            os.unlink(args.address[1])
@@ -0,0 +1,750 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import array
+import itertools
+import os
+import time
+
+from assembler import Assembler, load_isa, parse_params
+from disassembler import READERS, read_image
+from encoding import mask
+from image import typecode
+from layouts import RELATIVE, Instruction, Value
+
+"""simulator.py: Instruction-set simulators running assembled programs."""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# The predecoded entry of a word that has not been decoded (yet), decoding it when run
+UNDECODED = (0, 0, 0, 0)
+
+
+class SimulationError(Exception):
+    """An instruction could not be decoded or executed."""
+
+
+class __Halt__(Exception):
+    """Raised by an instruction that would run forever (e.g. a jump to itself)."""
+
+
+class Device(object):
+    """A memory-mapped I/O device, attached at an address of a Simulator.
+
+    Subclasses override read and write, with the address accessed.
+    """
+
+    def read(self, address):
+        return 0
+
+    def write(self, address, value):
+        pass
+
+
+class Output(Device):
+    """A device holding the last value written to it, like HEX displays or LEDs.
+
+    values -- every value written, in order.
+    show -- called with the name and value on every write, if given.
+    """
+
+    def __init__(self, name, show=None):
+        self.name = name
+        self.show = show
+        self.value = 0
+        self.values = []
+
+    def read(self, address):
+        return self.value
+
+    def write(self, address, value):
+        self.value = value
+        self.values.append(value)
+        if self.show is not None:
+            self.show(self.name, value)
+
+
+class Input(Device):
+    """A device reading as a value set from outside, like keys or switches."""
+
+    def __init__(self, name, value=0):
+        self.name = name
+        self.value = value
+
+    def read(self, address):
+        return self.value
+
+
+class Simulator(object):
+    """Runs the programs of an ISA, decoding every word of memory once.
+
+    The words of the ISA are decoded with lookup tables built from its
+    INSTRUCTIONS, like the Disassembler's, into a compact (opcode, a, b, c)
+    tuple: opcode indexes the dispatch table of operation handlers and a, b
+    and c are the operand fields named by OPERANDS, with values sign extended
+    and branch targets made absolute. The tuples are kept in a predecode
+    cache parallel to memory, filled the first time a word is run and
+    cleared by stores to it.
+
+    Subclasses give the OPERANDS of the instructions they run and their
+    handlers(), functions (a, b, c, pc) executing an instruction and
+    returning the pc of the next one. Aliases of instructions (encoding a
+    subset of their words) need neither. If the ISA has a ZERO register,
+    the instructions writing register a (WRITES) are decoded to write the
+    register after the last one instead, which is never read.
+
+    Every instruction takes a cycle. Instructions run by others (like the
+    delay slots of a branch) count as cycles, but not as steps of run.
+
+    memory_size is in addressable units (bytes, for byte-addressed ISAs).
+    devices maps addresses to the Devices attached there.
+    """
+
+    # Where programs start, if they load anything there
+    RESET_PC = 0
+
+    # The first memory-mapped I/O address, None if the ISA has none
+    MMIO_BASE = None
+
+    # Field names of the (a, b, c) operands of every instruction run
+    OPERANDS = {}
+
+    # The register always reading as zero, None if there is none
+    ZERO = None
+
+    # Mnemonics of the instructions writing register a
+    WRITES = frozenset()
+
+    # Addresses of the devices attached by default, by name
+    DEVICES = {}
+
+    def __init__(self, isa, params=None, memory_size=65536, devices=None):
+        if isinstance(isa, str):
+            isa = load_isa(isa)
+
+        self.isa = isa
+        self.options = params
+        self.params = isa.receive_params(params)
+        self.offset = isa.INSTRUCTION_OFFSET
+        self.width = isa.BIT_WIDTH
+        # Shift of pc giving the index of its word
+        self.shift = self.offset.bit_length() - 1
+
+        words = memory_size // self.offset
+        self.memory = array.array(typecode(self.width), [0]) * words
+        self.code = [UNDECODED] * words
+        count = max(isa.REGISTERS.values()) + 1
+        self.registers = [0] * (count if self.ZERO is None else count + 1)
+        self.devices = dict(devices or {})
+        self.pc = self.RESET_PC
+        self.steps = 0
+        self.halted = False
+        # Cycles of instructions run by other instructions, updated in place by their handlers
+        self.extra_cycles = [0]
+
+        # The dispatch table, indexed by opcode, with the decoder first
+        self.operations = [self.__predecode__]
+        handlers = self.handlers()
+        # (fixed bits, template, opcode, fields, sink) of every instruction run
+        decoders = []
+        for spec in isa.INSTRUCTIONS:
+            if isinstance(spec, Instruction) and spec.mnemonics[0] in handlers:
+                decoders.append(self.__decoder__(spec, len(self.operations)))
+                self.operations.append(handlers[spec.mnemonics[0]])
+
+        # The bits fixed by every instruction, indexing the lookup table
+        self.key = mask(self.width)
+        for decoder in decoders:
+            self.key &= decoder[0]
+
+        self.table = {}
+        for decoder in sorted(decoders, key=lambda decoder: -bin(decoder[0]).count('1')):
+            self.table.setdefault(decoder[1] & self.key, []).append(decoder)
+
+    def __decoder__(self, spec, opcode):
+        """Return the (fixed bits, template, opcode, fields, sink) of an instruction spec.
+
+        Every bit outside the fields of the format that are not constant is
+        fixed. fields holds the (shift, width, kind) of its operands, and sink
+        tells whether writes of the ZERO register go elsewhere.
+        """
+        fmt = spec.format
+        template = 0
+        bits = mask(self.width)
+        for name in fmt.fields:
+            if name in spec.constants:
+                template |= spec.constants[name] << fmt.shift(name)
+            else:
+                bits &= ~(mask(fmt.width(name)) << fmt.shift(name))
+
+        mnemonic = spec.mnemonics[0]
+        fields = [(fmt.shift(name), fmt.width(name), spec.operands.get(name))
+                  for name in self.OPERANDS[mnemonic]]
+        return (bits, template, opcode, fields, self.ZERO is not None and mnemonic in self.WRITES)
+
+    def decode(self, word, pc):
+        """Return the predecoded (opcode, a, b, c) of a word at address pc."""
+        for bits, template, opcode, fields, sink in self.table.get(word & self.key, ()):
+            if word & bits != template:
+                continue
+
+            operands = [opcode]
+            for shift, width, kind in fields:
+                value = (word >> shift) & ((1 << width) - 1)
+                if isinstance(kind, Value):
+                    if kind.signed and value >> (width - 1):
+                        value -= 1 << width
+                    if kind.negate:
+                        value = -value
+                    value *= kind.scale
+                    if kind.labels == RELATIVE:
+                        value += pc + self.offset
+                    value &= mask(self.width)
+                operands.append(value)
+
+            if sink and operands[1] == self.ZERO:
+                operands[1] = len(self.registers) - 1
+            return tuple(operands + [0] * (4 - len(operands)))
+
+        raise SimulationError('the word {:#x} at {:#x} is not an instruction'.format(word, pc))
+
+    def __predecode__(self, a, b, c, pc):
+        """Handler of undecoded words: decode the word at pc into the cache and run it."""
+        index = pc >> self.shift
+        entry = self.code[index] = self.decode(self.memory[index], pc)
+        opcode, a, b, c = entry
+        return self.operations[opcode](a, b, c, pc)
+
+    def handlers(self):
+        """Return the handler of every instruction run, by mnemonic."""
+        return {}
+
+    def attach(self, address, device):
+        """Attach a Device at a memory-mapped I/O address."""
+        self.devices[address] = device
+
+    def read_device(self, address):
+        device = self.devices.get(address)
+        if device is None:
+            raise SimulationError('no device is attached at {:#x}'.format(address))
+        return device.read(address) & mask(self.width)
+
+    def write_device(self, address, value):
+        device = self.devices.get(address)
+        if device is None:
+            raise SimulationError('no device is attached at {:#x}'.format(address))
+        device.write(address, value)
+
+    def load(self, entries):
+        """Load the (first, last, word) entries of an image, addressed by word as in .mif files.
+
+        If nothing is loaded at RESET_PC (e.g. a CS-3220 program without an
+        .ORIG), pc starts at the lowest address loaded instead.
+        """
+        memory, code = self.memory, self.code
+        reset = self.RESET_PC >> self.shift
+        lowest, at_reset = None, False
+        for first, last, word in entries:
+            lowest = first if lowest is None else min(lowest, first)
+            at_reset = at_reset or first <= reset <= last
+            if last >= len(memory):
+                raise SimulationError('the image does not fit {} words of memory'.format(len(memory)))
+            if first == last:
+                memory[first] = word
+            else:
+                memory[first:last + 1] = array.array(memory.typecode, [word]) * (last + 1 - first)
+            code[first:last + 1] = [UNDECODED] * (last + 1 - first)
+
+        if lowest is not None and not at_reset and self.pc == self.RESET_PC:
+            self.pc = lowest << self.shift
+
+    def load_file(self, path, kind=None):
+        """Load a .mif or .hex image (by kind or file extension), or assemble and load a source file.
+
+        Returns the symbol table of an assembled source ({} for images).
+        """
+        if kind is None and os.path.splitext(path)[1].lower() not in READERS:
+            assembler = Assembler(self.isa, self.options, file_name=path)
+            with open(path, 'r') as source:
+                success, results = assembler.assemble(source)
+            if not success:
+                raise SimulationError("'{}' could not be assembled".format(path))
+            self.load((address // self.offset, address // self.offset, word)
+                      for address, word in results)
+            return assembler.symbol_table
+
+        self.load(read_image(path, kind)[1])
+        return {}
+
+    def run(self, limit=None):
+        """Run instructions from pc until the program halts, or limit instructions have run.
+
+        Returns the number of instructions run. The program halts on an
+        instruction that would run forever, like a branch to itself, which
+        is left at pc.
+        """
+        code, operations, shift = self.code, self.operations, self.shift
+        pc = self.pc
+        count = 0
+        steps = itertools.count(1) if limit is None else itertools.islice(itertools.count(1), limit)
+
+        try:
+            for count in steps:
+                opcode, a, b, c = code[pc >> shift]
+                pc = operations[opcode](a, b, c, pc)
+        except __Halt__:
+            self.halted = True
+        except (IndexError, SimulationError) as e:
+            # The instruction at pc did not complete
+            self.pc = pc
+            self.steps += count - 1
+            if isinstance(e, IndexError):
+                if pc >> shift >= len(code):
+                    raise SimulationError('pc {:#x} is outside of memory'.format(pc))
+                raise SimulationError('the instruction at {:#x} accessed memory outside of its {} words'.format(
+                    pc, len(code)))
+            raise
+
+        self.pc = pc
+        self.steps += count
+        return count
+
+    @property
+    def cycles(self):
+        """Cycles taken by every instruction run so far."""
+        return self.steps + self.extra_cycles[0]
+
+
+class CS3220(Simulator):
+    """Runs CS-3220 programs.
+
+    Memory is byte-addressed with aligned words, and the HEX, LEDR, KEY and
+    SW devices are attached at their addresses. Comparisons are signed, and
+    rshf shifts arithmetically. A program halts on a branch or jump to
+    itself, like the 'Forever: jmp Forever(zero)' ending the test programs.
+    """
+
+    RESET_PC = 0x100
+
+    MMIO_BASE = 0xFFFFF000
+
+    # Addresses of the devices on the board
+    DEVICES = {
+        'HEX': 0xFFFFF000,
+        'LEDR': 0xFFFFF020,
+        'KEY': 0xFFFFF080,
+        'SW': 0xFFFFF090,
+    }
+
+    OPERANDS = dict(
+        [(mnemonic, ('rd', 'rs', 'rt')) for mnemonic in
+         ('eq', 'lt', 'le', 'ne', 'add', 'and', 'or', 'xor', 'sub', 'nand', 'nor', 'nxor', 'rshf', 'lshf')] +
+        [(mnemonic, ('rs', 'rt', 'imm')) for mnemonic in ('beq', 'blt', 'ble', 'bne')] +
+        [(mnemonic, ('rt', 'rs', 'imm')) for mnemonic in ('addi', 'andi', 'ori', 'xori', 'lw', 'sw', 'jal')])
+
+    def __init__(self, isa='cs3220', params=None, memory_size=65536, devices=None, show=None):
+        Simulator.__init__(self, isa, params, memory_size)
+        self.attach(self.DEVICES['HEX'], Output('HEX', show))
+        self.attach(self.DEVICES['LEDR'], Output('LEDR', show))
+        self.attach(self.DEVICES['KEY'], Input('KEY'))
+        self.attach(self.DEVICES['SW'], Input('SW'))
+        self.devices.update(devices or {})
+
+    def handlers(self):
+        registers, memory, code = self.registers, self.memory, self.code
+        read, write = self.read_device, self.write_device
+        mmio = self.MMIO_BASE
+        bits = mask(self.width)
+        sign = 1 << (self.width - 1)
+
+        # R-type: rd = rs op rt
+        def eq(a, b, c, pc):
+            registers[a] = int(registers[b] == registers[c])
+            return pc + 4
+
+        def lt(a, b, c, pc):
+            registers[a] = int(registers[b] ^ sign < registers[c] ^ sign)
+            return pc + 4
+
+        def le(a, b, c, pc):
+            registers[a] = int(registers[b] ^ sign <= registers[c] ^ sign)
+            return pc + 4
+
+        def ne(a, b, c, pc):
+            registers[a] = int(registers[b] != registers[c])
+            return pc + 4
+
+        def add(a, b, c, pc):
+            registers[a] = (registers[b] + registers[c]) & bits
+            return pc + 4
+
+        def and_(a, b, c, pc):
+            registers[a] = registers[b] & registers[c]
+            return pc + 4
+
+        def or_(a, b, c, pc):
+            registers[a] = registers[b] | registers[c]
+            return pc + 4
+
+        def xor(a, b, c, pc):
+            registers[a] = registers[b] ^ registers[c]
+            return pc + 4
+
+        def sub(a, b, c, pc):
+            registers[a] = (registers[b] - registers[c]) & bits
+            return pc + 4
+
+        def nand(a, b, c, pc):
+            registers[a] = ~(registers[b] & registers[c]) & bits
+            return pc + 4
+
+        def nor(a, b, c, pc):
+            registers[a] = ~(registers[b] | registers[c]) & bits
+            return pc + 4
+
+        def nxor(a, b, c, pc):
+            registers[a] = ~(registers[b] ^ registers[c]) & bits
+            return pc + 4
+
+        def rshf(a, b, c, pc):
+            value = registers[b]
+            registers[a] = ((value - ((value & sign) << 1)) >> (registers[c] & 31)) & bits
+            return pc + 4
+
+        def lshf(a, b, c, pc):
+            registers[a] = (registers[b] << (registers[c] & 31)) & bits
+            return pc + 4
+
+        # Branches: to c (absolute) if rs compares to rt
+        def beq(a, b, c, pc):
+            if registers[a] == registers[b]:
+                if c == pc:
+                    raise __Halt__()
+                return c
+            return pc + 4
+
+        def blt(a, b, c, pc):
+            if registers[a] ^ sign < registers[b] ^ sign:
+                if c == pc:
+                    raise __Halt__()
+                return c
+            return pc + 4
+
+        def ble(a, b, c, pc):
+            if registers[a] ^ sign <= registers[b] ^ sign:
+                if c == pc:
+                    raise __Halt__()
+                return c
+            return pc + 4
+
+        def bne(a, b, c, pc):
+            if registers[a] != registers[b]:
+                if c == pc:
+                    raise __Halt__()
+                return c
+            return pc + 4
+
+        # Immediates: rt = rs op imm
+        def addi(a, b, c, pc):
+            registers[a] = (registers[b] + c) & bits
+            return pc + 4
+
+        def andi(a, b, c, pc):
+            registers[a] = registers[b] & c
+            return pc + 4
+
+        def ori(a, b, c, pc):
+            registers[a] = registers[b] | c
+            return pc + 4
+
+        def xori(a, b, c, pc):
+            registers[a] = registers[b] ^ c
+            return pc + 4
+
+        def lw(a, b, c, pc):
+            address = (registers[b] + c) & bits
+            registers[a] = memory[address >> 2] if address < mmio else read(address)
+            return pc + 4
+
+        def sw(a, b, c, pc):
+            address = (registers[b] + c) & bits
+            if address < mmio:
+                memory[address >> 2] = registers[a]
+                code[address >> 2] = UNDECODED
+            else:
+                write(address, registers[a])
+            return pc + 4
+
+        def jal(a, b, c, pc):
+            target = (registers[b] + c) & bits
+            registers[a] = pc + 4
+            if target == pc:
+                raise __Halt__()
+            return target
+
+        return {
+            'eq': eq, 'lt': lt, 'le': le, 'ne': ne, 'add': add, 'and': and_, 'or': or_, 'xor': xor,
+            'sub': sub, 'nand': nand, 'nor': nor, 'nxor': nxor, 'rshf': rshf, 'lshf': lshf,
+            'beq': beq, 'blt': blt, 'ble': ble, 'bne': bne,
+            'addi': addi, 'andi': andi, 'ori': ori, 'xori': xori, 'lw': lw, 'sw': sw, 'jal': jal,
+        }
+
+
+class LC2200(Simulator):
+    """Runs LC-2200, LC3-2200a and LC3-2200b programs.
+
+    Memory is word-addressed, and $zero always reads as zero. The first
+    operand of jalr is the target and the second the link register, in the
+    rx and ry fields of LC-2200 and the other way around in LC3-2200. jalr
+    reads its target before linking, except in LC-2200, whose la gets the pc
+    with 'jalr $rx, $rx' and falls through to the next instruction. The br
+    instructions of LC3-2200a test the condition codes (n, z, p) of the last
+    value written by add, addi, nand, neg, lw, ldr or a shift. shfll and
+    shfrl shift logically, shfra arithmetically.
+
+    Instructions with delay slots (the beq, bne and jalr of LC3-2200b, with
+    as many as its delay_slots parameter) run the instructions in their
+    slots before a taken branch or jump goes to its target, and jalr links
+    to the instruction after them. A program halts on halt (spop in LC-2200)
+    or a branch or jump to itself.
+    """
+
+    ZERO = 0
+
+    OPERANDS = dict(
+        [(mnemonic, ('rx', 'ry', 'rz')) for mnemonic in ('add', 'nand')] +
+        [(mnemonic, ('rx', 'ry', 'offset')) for mnemonic in
+         ('addi', 'lw', 'sw', 'ldr', 'str', 'beq', 'bne', 'shfll', 'shfrl', 'shfra')] +
+        [(mnemonic, ('offset',)) for mnemonic in ('br', 'brn', 'brz', 'brp', 'brnz', 'brzp', 'brnp')] +
+        [('neg', ('rx', 'ry')), ('lea', ('rx', 'offset')), ('jalr', ('ry', 'rx')), ('spop', ()), ('halt', ())])
+
+    WRITES = frozenset(['add', 'nand', 'neg', 'addi', 'lw', 'ldr', 'lea', 'jalr', 'shfll', 'shfrl', 'shfra'])
+
+    # ISAs whose jalr writes the link register before reading the target
+    LINK_FIRST = frozenset(['LC-2200'])
+
+    def __init__(self, isa='lc2200', params=None, memory_size=65536, devices=None):
+        if isinstance(isa, str):
+            isa = load_isa(isa)
+
+        for spec in isa.INSTRUCTIONS:
+            if spec.mnemonics[0] == 'jalr':
+                target, link = [name.strip() for name in spec.syntax.split(',')]
+                self.OPERANDS = dict(self.OPERANDS, jalr=(link, target))
+
+        Simulator.__init__(self, isa, params, memory_size, devices)
+
+    @property
+    def condition_codes(self):
+        """The condition code set by the last value written: 'n', 'z' or 'p'."""
+        value = self.result[0]
+        return 'n' if value >> (self.width - 1) else 'z' if value == 0 else 'p'
+
+    def handlers(self):
+        registers, memory, code, operations = self.registers, self.memory, self.code, self.operations
+        extra = self.extra_cycles
+        bits = mask(self.width)
+        sign = 1 << (self.width - 1)
+        # The last value written, setting the condition codes
+        result = self.result = [0]
+        # Delay slots of the instructions having them
+        slots = dict((spec.mnemonics[0], self.params[spec.slots]) for spec in self.isa.INSTRUCTIONS
+                     if isinstance(spec, Instruction) and spec.slots)
+
+        def delay(pc, count):
+            """Run the count delay slots following pc."""
+            for slot in range(pc + 1, pc + 1 + count):
+                opcode, a, b, c = code[slot]
+                operations[opcode](a, b, c, slot)
+            extra[0] += count
+
+        def add(a, b, c, pc):
+            registers[a] = result[0] = (registers[b] + registers[c]) & bits
+            return pc + 1
+
+        def nand(a, b, c, pc):
+            registers[a] = result[0] = ~(registers[b] & registers[c]) & bits
+            return pc + 1
+
+        def neg(a, b, c, pc):
+            registers[a] = result[0] = -registers[b] & bits
+            return pc + 1
+
+        def addi(a, b, c, pc):
+            registers[a] = result[0] = (registers[b] + c) & bits
+            return pc + 1
+
+        def lw(a, b, c, pc):
+            registers[a] = result[0] = memory[(registers[b] + c) & bits]
+            return pc + 1
+
+        def sw(a, b, c, pc):
+            address = (registers[b] + c) & bits
+            memory[address] = registers[a]
+            code[address] = UNDECODED
+            return pc + 1
+
+        def lea(a, b, c, pc):
+            registers[a] = b
+            return pc + 1
+
+        def shfll(a, b, c, pc):
+            registers[a] = result[0] = (registers[b] << c) & bits
+            return pc + 1
+
+        def shfrl(a, b, c, pc):
+            registers[a] = result[0] = registers[b] >> c
+            return pc + 1
+
+        def shfra(a, b, c, pc):
+            value = registers[b]
+            registers[a] = result[0] = ((value - ((value & sign) << 1)) >> c) & bits
+            return pc + 1
+
+        beq_slots, bne_slots, jalr_slots = slots.get('beq', 0), slots.get('bne', 0), slots.get('jalr', 0)
+
+        # Branches: to c (absolute) if rx compares to ry, after the delay slots
+        def beq(a, b, c, pc):
+            if registers[a] == registers[b]:
+                if c == pc:
+                    raise __Halt__()
+                if beq_slots:
+                    delay(pc, beq_slots)
+                return c
+            return pc + 1
+
+        def bne(a, b, c, pc):
+            if registers[a] != registers[b]:
+                if c == pc:
+                    raise __Halt__()
+                if bne_slots:
+                    delay(pc, bne_slots)
+                return c
+            return pc + 1
+
+        def br(flags):
+            """Return the handler of a br testing the condition codes in flags."""
+            n, z, p = 'n' in flags, 'z' in flags, 'p' in flags
+
+            def handler(a, b, c, pc):
+                value = result[0]
+                if n if value & sign else z if value == 0 else p:
+                    if a == pc:
+                        raise __Halt__()
+                    return a
+                return pc + 1
+            return handler
+
+        link_first = self.isa.__name__ in self.LINK_FIRST
+
+        def jalr(a, b, c, pc):
+            if link_first:
+                registers[a] = pc + 1 + jalr_slots
+            target = registers[b]
+            if not link_first:
+                registers[a] = pc + 1 + jalr_slots
+            if target == pc:
+                raise __Halt__()
+            if jalr_slots:
+                delay(pc, jalr_slots)
+            return target
+
+        def halt(a, b, c, pc):
+            raise __Halt__()
+
+        handlers = {
+            'add': add, 'nand': nand, 'neg': neg, 'addi': addi, 'lw': lw, 'sw': sw, 'ldr': lw, 'str': sw,
+            'lea': lea, 'shfll': shfll, 'shfrl': shfrl, 'shfra': shfra, 'beq': beq, 'bne': bne,
+            'br': br('nzp'), 'jalr': jalr, 'spop': halt, 'halt': halt,
+        }
+        for flags in ('n', 'z', 'p', 'nz', 'zp', 'np'):
+            handlers['br' + flags] = br(flags)
+        return handlers
+
+
+# Simulators by the architecture name of the ISA
+SIMULATORS = {
+    'CS-3220': CS3220,
+    'LC-2200': LC2200,
+    'LC3-2200a': LC2200,
+    'LC3-2200b': LC2200,
+}
+
+
+def simulator(isa, params=None, memory_size=65536, **options):
+    """Return the Simulator of an ISA (module or name)."""
+    if isinstance(isa, str):
+        isa = load_isa(isa)
+
+    if isa.__name__ not in SIMULATORS:
+        raise SimulationError('{} has no simulator'.format(isa.__name__))
+    return SIMULATORS[isa.__name__](isa, params, memory_size, **options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        'simulator.py', description='Runs assembly programs, or assembled .mif and ModelSim .hex images.')
+    parser.add_argument('program', help='the assembly source, or .mif, .bin, .hex or .memh image to run')
+    parser.add_argument('-i', '--isa', required=False, type=str, default='cs3220',
+                        help='define the Python ISA module to load [default: cs3220]')
+    parser.add_argument('--params', required=False, type=str,
+                        help='custom parameters to pass to an architecture, formatted as "key1=value1, key2=value2"')
+    parser.add_argument('-f', '--format', required=False, choices=('mif', 'hex'),
+                        help='format of an image [default: by its extension, other files are assembled]')
+    parser.add_argument('-n', '--max-steps', required=False, type=int,
+                        help='stop after this many instructions [default: run until the program halts]')
+    parser.add_argument('-m', '--memory', required=False, type=lambda value: int(value, 0), default=65536,
+                        help='size of memory, in addressable units [default: 65536]')
+    parser.add_argument('--start', required=False, type=lambda value: int(value, 0),
+                        help='address of the first instruction [default: the reset address of the ISA, or the '
+                        'lowest address loaded if nothing is loaded there]')
+    parser.add_argument('--sw', required=False, type=lambda value: int(value, 0), default=0,
+                        help='value of the SW switches, for cs3220 [default: 0]')
+    parser.add_argument('--key', required=False, type=lambda value: int(value, 0), default=0,
+                        help='value of the KEY buttons, for cs3220 [default: 0]')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not print the values written to output devices')
+    parser.add_argument('-r', '--registers', action='store_true',
+                        help='print the registers when the program stops')
+    args = parser.parse_args()
+
+    def show(name, value):
+        print('{} = {:#x}'.format(name, value))
+
+    try:
+        isa = load_isa(args.isa)
+    except Exception as e:
+        print("Error: Failed to load ISA definition module '{}'. {}\n".format(args.isa, str(e)))
+        exit(1)
+
+    try:
+        devices = SIMULATORS.get(isa.__name__, Simulator).DEVICES
+        options = {'show': show} if devices and not args.quiet else {}
+        machine = simulator(isa, parse_params(args.params), args.memory, **options)
+        for name, value in (('SW', args.sw), ('KEY', args.key)):
+            if name in devices:
+                machine.devices[devices[name]].value = value
+
+        machine.load_file(args.program, args.format)
+        if args.start is not None:
+            machine.pc = args.start
+
+        start = timer()
+        count = machine.run(args.max_steps)
+        elapsed = timer() - start
+    except Exception as e:
+        print("Error: {}.".format(e))
+        exit(1)
+
+    if args.registers:
+        names = {}
+        for name, number in isa.REGISTERS.items():
+            names.setdefault(number, name)
+        for number, name in sorted(names.items()):
+            print('{:>6} = {:#010x}'.format(name, machine.registers[number]))
+
+    print('{} at {:#x} after {} instructions ({} cycles), {:.2f} million per second.'.format(
+        'Halted' if machine.halted else 'Stopped', machine.pc, count, machine.cycles,
+        count / max(elapsed, 1e-9) / 1e6))
@@ -0,0 +1,7 @@
+"""conftest.py: Make the assembler modules importable from the tests."""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
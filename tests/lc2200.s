@@ -0,0 +1,17 @@
+! sample LC-2200 program
+main:   addi $sp, $zero, 100
+        la $a0, data
+        lw $t0, 0($a0)
+        lw $t1, 1($a0)
+loop:   add $t2, $t0, $t1
+        neg $t1, $t1
+        sw $t2, 2($a0)
+        beq $t0, $zero, done
+        addi $t0, $t0, -1
+        beq $zero, $zero, loop
+done:   jalr $ra, $at
+        noop
+        halt
+data:   .fill 5
+        .word 0x10
+        .fill -3
@@ -0,0 +1,47 @@
+! Delay slot filling, assembled with --params "delay_slots=2, fill_delay_slots=0"
+! (lc32200b_slots.mif) and "delay_slots=2, fill_delay_slots=1"
+! (lc32200b_slots_filled.mif). Both compute the same registers and memory.
+        lea $s0, array
+        addi $a0, $zero, 8
+        add $v0, $zero, $zero
+        addi $t2, $zero, 0
+loop:   ldr $t0, 0($s0)             ! labeled, never moved
+        add $v0, $v0, $t0
+        addi $s0, $s0, 1            ! independent, moved past the addi into a slot of bne
+        addi $a0, $a0, -1           ! bne reads $a0, kept
+        addi $t2, $t2, 3            ! independent, moved into a slot of bne
+        bne $a0, $zero, loop
+        addi $a1, $v0, 0            ! independent, moved past the lea into a slot of jalr
+        lea $at, double             ! jalr reads $at, kept
+        addi $t1, $zero, 5          ! independent, moved into a slot of jalr
+        jalr $at, $ra
+        ldr $s2, 1($s0)             ! independent, but cannot pass the store below
+        str $ra, 0($s0)             ! jalr writes $ra, kept
+        jalr $at, $ra
+        add $s1, $v0, $t1           ! independent, moved past the addi into a slot of beq
+        addi $a2, $zero, 7          ! beq reads $a2, kept
+        beq $a2, $a2, skip
+        addi $s2, $zero, 99
+skip:   addi $k0, $zero, 1          ! labeled, never moved
+        str $k0, 2($s0)
+        beq $zero, $zero, 1         ! numeric offset, nothing around it moves
+        addi $k0, $k0, 1
+        addi $fp, $zero, 2
+again:  addi $a0, $a0, 1
+        addi $t0, $zero, 4          ! independent, but the branch is labeled
+back:   bne $a0, $t0, again
+        halt
+double: add $v0, $a1, $a1           ! labeled, never moved
+        addi $sp, $zero, 11         ! independent, moved into a slot of ret
+        ret
+array:  .fill 1
+        .fill 2
+        .fill 3
+        .fill 4
+        .fill 5
+        .fill 6
+        .fill 7
+        .fill 8
+        .fill 0
+        .fill 9
+        .fill 0
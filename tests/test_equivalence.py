@@ -0,0 +1,164 @@
+"""test_equivalence.py: Check that the faster paths assemble what the plain ones do.
+
+Every check runs on the fixtures and on a generated program per ISA.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import re
+
+import pytest
+
+from assembler import Assembler
+from benchmarks.generate import generate
+from simulator import simulator
+from test_fixtures import FIXTURES, read_source
+
+# Lines of the generated programs
+GENERATED_LINES = 3000
+
+# (ISA, name, source lines, parameters)
+PROGRAMS = ([(isa, source, read_source(source), params)
+             for isa, source, _, params in FIXTURES if params is None] +
+            [(isa, '{} ({} lines)'.format(isa, GENERATED_LINES),
+              ['{}\n'.format(text) for text in generate(isa, GENERATED_LINES, seed=1)], None)
+             for isa in ('cs3220', 'lc2200', 'lc32200a', 'lc32200b')])
+
+programs = pytest.mark.parametrize('isa, name, source, params', PROGRAMS,
+                                   ids=[name for _, name, _, _ in PROGRAMS])
+
+
+def assembler(isa, params, **options):
+    return Assembler(isa, params, log=lambda message: None, **options)
+
+
+def assemble(isa, params, source, **options):
+    """Assemble a program with pass1 and pass2, returning its symbol table and image."""
+    sequential = assembler(isa, params, **options)
+    success, image = sequential.assemble(source)
+    assert success
+    return sequential.symbol_table, image
+
+
+@programs
+def test_pass2_parallel(isa, name, source, params):
+    symbols, image = assemble(isa, params, source)
+
+    parallel = assembler(isa, params)
+    success, lines = parallel.pass1(source)
+    assert success
+    # Small chunks, so that even the fixtures are split
+    assert parallel.pass2_parallel(lines, 2, chunk_lines=16) == (True, image)
+
+
+@programs
+def test_pass1_parallel(isa, name, source, params):
+    symbols, image = assemble(isa, params, source)
+
+    parallel = assembler(isa, params)
+    success, lines = parallel.pass1_parallel(source, 2, chunk_lines=16)
+    assert success
+    assert parallel.symbol_table == symbols
+    assert parallel.pass2(lines) == (True, image)
+
+
+@pytest.mark.parametrize('isa', ['cs3220', 'lc2200'])
+def test_pass1_parallel_errors(isa):
+    source = ['{}\n'.format(text) for text in generate(isa, 200, seed=2)]
+    # A label defined again in a later chunk, and an unknown instruction
+    source[150] = 'b0: ' + source[150].split(':')[-1]
+    source[40] = 'frobnicate\n'
+
+    sequential, parallel = [], []
+    assert not Assembler(isa, log=sequential.append).pass1(source)[0]
+    assert not Assembler(isa, log=parallel.append).pass1_parallel(source, 2, chunk_lines=16)[0]
+    assert parallel == sequential
+    assert len(sequential) == 2
+
+
+@pytest.mark.parametrize('isa, name, source, params',
+                         [program for program in PROGRAMS if program[0] == 'cs3220'],
+                         ids=[name for isa, name, _, _ in PROGRAMS if isa == 'cs3220'])
+def test_batch(isa, name, source, params, monkeypatch):
+    pytest.importorskip('numpy')
+
+    # Every program one instruction at a time, then in a batch however short it is
+    monkeypatch.setattr('assembler.BATCH_MIN_LINES', float('inf'))
+    symbols, image = assemble(isa, params, source)
+    monkeypatch.setattr('assembler.BATCH_MIN_LINES', 0)
+
+    batched = assembler(isa, params)
+    success, lines = batched.pass1(source)
+    assert success
+    assert any(word is not None for word in batched.encode_batch(lines))
+    assert batched.pass2(lines) == (True, image)
+
+
+@programs
+@pytest.mark.parametrize('size', [8, 4096])
+def test_encoding_cache(isa, name, source, params, size):
+    symbols, image = assemble(isa, params, source)
+
+    cached = assembler(isa, params, encoding_cache_size=size)
+    assert cached.assemble(source) == (True, image)
+    # The small LC fixtures repeat no line
+    assert cached.encoding_cache.hits + cached.encoding_cache.misses
+
+
+def slots(fill):
+    return {'delay_slots': '2', 'fill_delay_slots': str(fill)}
+
+
+def run(source, params):
+    """Assemble and run an LC3-2200b program, returning the assembler and the halted simulator."""
+    program = assembler('lc32200b', params)
+    success, image = program.assemble(source)
+    assert success
+
+    machine = simulator('lc32200b', params)
+    machine.load((address, address, word) for address, word in image)
+    machine.run(10000)
+    assert machine.halted
+    return program, machine
+
+
+def test_delay_slots_simulated():
+    source = read_source('lc32200b_slots.s')
+    unfilled, plain = run(source, slots(0))
+    filled, moved = run(source, slots(1))
+
+    # Registers holding addresses differ, as filled slots take no words
+    names = dict((number, name) for name, number in moved.isa.REGISTERS.items())
+    addresses = set(['$at', '$s0', '$ra'])
+    for number, name in names.items():
+        if name not in addresses:
+            assert moved.registers[number] == plain.registers[number], name
+
+    # The array, whose eighth word is overwritten by the return address of the first call
+    for program, machine in ((unfilled, plain), (filled, moved)):
+        array = program.symbol_table['array']
+        words = list(machine.memory[array:array + 11])
+        assert words[:8] + words[9:] == [1, 2, 3, 4, 5, 6, 7, 8, 9, 1]
+
+    assert moved.cycles < plain.cycles
+
+
+def test_delay_slots_generated():
+    source = ['{}\n'.format(text) for text in generate('lc32200b', GENERATED_LINES, seed=1)]
+    messages = []
+    unfilled = assembler('lc32200b', slots(0))
+    success, plain = unfilled.assemble(source)
+    assert success
+
+    filled = Assembler('lc32200b', slots(1), log=messages.append)
+    success, lines = filled.pass1(source)
+    assert success
+    count = int(re.match(r'Filled (\d+) of \d+ delay slots', messages[0]).group(1))
+    assert count
+
+    # Every line is kept, labeled lines stay where they are, and each filled slot saves a word
+    order = [line.line_number for line in unfilled.pass1(source)[1]]
+    assert sorted(line.line_number for line in lines) == order
+    assert all(order[index] == line.line_number for index, line in enumerate(lines) if line.label)
+    success, moved = filled.pass2(lines)
+    assert success
+    assert len(moved) == len(plain) - count
@@ -0,0 +1,56 @@
+"""test_fixtures.py: Assemble every fixture and compare it with its golden .mif.
+
+The LC goldens were checked against the per-instruction encoder classes
+the ISA modules had before layouts.py; the CS-3220 ones are those the
+repository started with.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import io
+import os
+
+import pytest
+
+from assembler import Assembler
+from writers import write_formats
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+# (ISA, source, golden image, parameters)
+FIXTURES = [
+    ('cs3220', '3220/simple.asm', '3220/simple.mif', None),
+    ('cs3220', '3220/Test.asm', '3220/Test.mif', None),
+    ('cs3220', '3220/dhruv_test.asm', '3220/dhruv_test.mif', None),
+    ('cs3220', '3220/fmedian.asm', '3220/fmedian.mif', None),
+    ('lc2200', 'lc2200.s', 'lc2200.mif', None),
+    ('lc32200a', 'lc32200a.s', 'lc32200a.mif', None),
+    ('lc32200b', 'lc32200b.s', 'lc32200b.mif', None),
+    ('lc32200b', 'lc32200b_slots.s', 'lc32200b_slots.mif',
+     {'delay_slots': '2', 'fill_delay_slots': '0'}),
+    ('lc32200b', 'lc32200b_slots.s', 'lc32200b_slots_filled.mif',
+     {'delay_slots': '2', 'fill_delay_slots': '1'}),
+]
+
+
+def read_source(name):
+    with open(os.path.join(TESTS, name), 'r') as read_file:
+        return read_file.read().splitlines(True)
+
+
+def mif(assembler, image):
+    """Return the .mif text of an assembled image, written with the default options."""
+    out = io.StringIO()
+    write_formats({'mif': out}, assembler.isa, assembler.symbol_table, image)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('isa, source, golden, params', FIXTURES,
+                         ids=[golden for _, _, golden, _ in FIXTURES])
+def test_golden(isa, source, golden, params):
+    messages = []
+    assembler = Assembler(isa, params, file_name=source, log=messages.append)
+    success, image = assembler.assemble(read_source(source))
+    assert success, messages
+
+    with open(os.path.join(TESTS, golden), 'r') as read_file:
+        assert mif(assembler, image) == read_file.read()
@@ -0,0 +1,365 @@
+"""writers.py: Output formats for assembled images.
+
+An image is an iterable of (address, word) pairs as returned by
+Assembler.pass2, with every word an encoded integer. Each writer turns the
+words into text only while writing, so one image can be written in any
+number of formats.
+"""
+__authors__ = "Christopher Tam and Dhruv Mehra"
+
+import array
+import binascii
+import operator
+import struct
+
+from encoding import formatter
+
+# Memory size of the ALTERA Cyclone V board (words)
+ALTERA_SIZE = 16384
+
+
+class ImageError(Exception):
+    """Raised by writers that cannot write an image at all, e.g. one not fitting into the memory."""
+    pass
+
+
+def build_hex(number, width):
+    return "{0:0{1}X}".format(number, width)
+
+
+class Writer(object):
+    """
+    This is the base class of all image writers.
+
+    A writer is fed one word at a time between begin() and end(), so several
+    writers can share a single walk over an image.
+    """
+    extension = None
+    # Data radix the format always uses (True for hex), or None to follow use_hex
+    fixed_hex = None
+    # Whether the file has to be opened in binary mode
+    binary = False
+
+    def __init__(self, file, isa, sep='\n', use_hex=True, depth=ALTERA_SIZE, endian='little',
+                 compress_mif=False, mif_comments=True):
+        self.file = file
+        self.isa = isa
+        self.sep = sep
+        self.depth = depth
+        self.endian = endian
+        # Merge runs of identical words into range entries (MIF)
+        self.compress_mif = compress_mif
+        # Write the address of every entry as a comment (MIF)
+        self.mif_comments = mif_comments
+        self.use_hex = use_hex if self.fixed_hex is None else self.fixed_hex
+        self.format_word = formatter(isa.BIT_WIDTH, self.use_hex)
+        # Set when the image does not fit into the memory
+        self.overflow = False
+
+    def begin(self):
+        """Write anything preceding the first word."""
+        pass
+
+    def word(self, pc, word):
+        """Write a single word assembled at address pc."""
+        raise NotImplementedError()
+
+    def end(self):
+        """Write anything following the last word."""
+        pass
+
+
+class MifWriter(Writer):
+    """Quartus memory initialization file (.mif)."""
+    extension = '.mif'
+    fixed_hex = True
+
+    def begin(self):
+        write, sep = self.file.write, self.sep
+        data_radix = 'HEX' if self.use_hex else 'BIN'
+        write("WIDTH={};{}".format(self.isa.BIT_WIDTH, sep))
+        write("DEPTH={};{}".format(self.depth, sep))
+        write("ADDRESS_RADIX={};{}".format('HEX', sep))
+        write("DATA_RADIX={};{}".format(data_radix, sep))
+        write("CONTENT BEGIN{}".format(sep))
+        self.pre_mem = -1
+        # Entry not written yet: [first address, last address, pc, word]
+        self.run = None
+
+    def word(self, pc, word):
+        mem_addr = pc // self.isa.INSTRUCTION_OFFSET
+        run = self.run
+
+        if self.compress_mif and run and run[3] == word and run[1] + 1 == mem_addr:
+            run[1] = mem_addr
+            return
+
+        self.flush()
+
+        if self.pre_mem + 1 != mem_addr:
+            self.file.write("[{}..{}] : {};{}".format(
+                build_hex(self.pre_mem + 1, 8), build_hex(mem_addr - 1, 8), 'DEAD', self.sep))
+
+        self.run = [mem_addr, mem_addr, pc, word]
+
+    def flush(self):
+        """Write the pending entry, a single word or a range of identical ones."""
+        if self.run is None:
+            return
+
+        write, sep = self.file.write, self.sep
+        first, last, pc, word = self.run
+
+        if self.mif_comments:
+            write("-- @ 0x{}{}".format(build_hex(pc, 8), sep))
+
+        if first == last:
+            write("{} : {};{}".format(build_hex(first, 8), self.format_word(word), sep))
+        else:
+            write("[{}..{}] : {};{}".format(
+                build_hex(first, 8), build_hex(last, 8), self.format_word(word), sep))
+
+        self.pre_mem = last
+        self.run = None
+
+    def end(self):
+        self.flush()
+
+        if self.pre_mem >= self.depth:
+            self.overflow = True
+
+        if self.pre_mem < self.depth:
+            self.file.write("[{}..{}] : {};{}".format(
+                build_hex(self.pre_mem + 1, 8), build_hex(ALTERA_SIZE - 1, 8), 'DEAD', self.sep))
+
+        self.file.write("END;")
+
+
+class BinMifWriter(MifWriter):
+    """Quartus memory initialization file with binary data radix (.bin)."""
+    extension = '.bin'
+    fixed_hex = False
+
+
+class ModelSimWriter(Writer):
+    """ModelSim memory image with @address markers (.hex)."""
+    extension = '.hex'
+
+    def begin(self):
+        self.pre_mem = -1
+
+    def word(self, pc, word):
+        mem_addr = pc // self.isa.INSTRUCTION_OFFSET
+
+        if self.pre_mem + 1 != mem_addr:
+            self.file.write("@{}{}".format(build_hex(mem_addr, 8), self.sep))
+
+        self.file.write("{}{}".format(self.format_word(word), self.sep))
+        self.pre_mem = mem_addr
+
+    def end(self):
+        if self.pre_mem >= self.depth:
+            self.overflow = True
+
+
+class BulkWriter(Writer):
+    """
+    This is the base class of writers serializing the whole image at once.
+
+    Words are collected by memory address into compact arrays and end()
+    writes the serialized image, built in a single preallocated bytearray,
+    with one write call (decoded for text formats).
+    """
+
+    def begin(self):
+        self.addresses = array.array('L')
+        self.words = array.array('L')
+        self.word_bytes = (self.isa.BIT_WIDTH + 7) // 8
+        self.packer = struct.Struct(('<' if self.endian == 'little' else '>') +
+                                    {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}[self.word_bytes])
+
+    def word(self, pc, word):
+        self.addresses.append(pc // self.isa.INSTRUCTION_OFFSET)
+        self.words.append(word)
+
+    def end(self):
+        if self.addresses and max(self.addresses) >= self.depth:
+            self.overflow = True
+
+        buffer = self.serialize()
+        self.file.write(buffer if self.binary else buffer.decode('ascii'))
+
+    def serialize(self):
+        """Return the whole image in the writer's format, as a bytearray."""
+        raise NotImplementedError()
+
+    def hexlify(self, words):
+        """Return the hexadecimal digits of words, most significant first, word_bytes * 2 per word."""
+        code = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}[self.word_bytes]
+        return binascii.hexlify(struct.pack('>{}{}'.format(len(words), code), *words)).upper()
+
+    def runs(self):
+        """Yield (first address, words) for every run of consecutive addresses."""
+        addresses, words = self.addresses, self.words
+        start = 0
+
+        for i in range(1, len(addresses) + 1):
+            if i == len(addresses) or addresses[i] != addresses[i - 1] + 1:
+                yield (addresses[start], words[start:i])
+                start = i
+
+
+class RawWriter(BulkWriter):
+    """Raw memory image from address 0, with gaps zero filled (.raw).
+
+    The image is as large as the memory holding it, so nothing is written
+    for images not fitting into depth words.
+    """
+    extension = '.raw'
+    binary = True
+
+    def end(self):
+        if self.addresses and max(self.addresses) >= self.depth:
+            raise ImageError('the raw image does not fit into {} words of memory, it reaches '
+                             'address {:#x}'.format(self.depth, max(self.addresses)))
+        BulkWriter.end(self)
+
+    def serialize(self):
+        size = (max(self.addresses) + 1) * self.word_bytes if self.addresses else 0
+        buffer = bytearray(size)
+        pack_into, width = self.packer.pack_into, self.word_bytes
+
+        for address, word in zip(self.addresses, self.words):
+            pack_into(buffer, address * width, word)
+
+        return buffer
+
+
+class IntelHexWriter(BulkWriter):
+    """Intel HEX with byte addresses and 16 data bytes per record (.ihex)."""
+    extension = '.ihex'
+    record_bytes = 16
+
+    def serialize(self):
+        # (kind, address, data) of every record, then the text of each
+        # (':', the hex digits of its fields, data and checksum, '\n') in one buffer
+        records = []
+        segment = None
+
+        for address, words in self.runs():
+            data = bytearray(len(words) * self.word_bytes)
+            for i, word in enumerate(words):
+                self.packer.pack_into(data, i * self.word_bytes, word)
+
+            start = address * self.word_bytes
+            offset = 0
+            while offset < len(data):
+                byte_address = start + offset
+                if byte_address >> 16 != segment:
+                    segment = byte_address >> 16
+                    records.append((4, 0, bytearray(struct.pack('>H', segment))))
+
+                # Records cannot cross a 64 KiB segment
+                size = min(self.record_bytes, len(data) - offset,
+                           0x10000 - (byte_address & 0xFFFF))
+                records.append((0, byte_address & 0xFFFF, data[offset:offset + size]))
+                offset += size
+
+        records.append((1, 0, bytearray()))
+
+        buffer = bytearray(sum(12 + 2 * len(data) for kind, address, data in records))
+        position = 0
+        for kind, address, data in records:
+            body = bytearray(struct.pack('>BHB', len(data), address, kind)) + data
+            body.append((-sum(body)) & 0xFF)
+            end = position + 2 + 2 * len(body)
+            buffer[position] = 0x3A  # ':'
+            buffer[position + 1:end - 1] = binascii.hexlify(body).upper()
+            buffer[end - 1] = 0x0A  # '\n'
+            position = end
+
+        return buffer
+
+
+class MemhWriter(BulkWriter):
+    """Verilog $readmemh image with an @address before every run of words (.memh)."""
+    extension = '.memh'
+    fixed_hex = True
+
+    def serialize(self):
+        # Every word is its digits and a newline, written into the buffer
+        # digit by digit with extended slices
+        digits = (self.isa.BIT_WIDTH + 3) // 4
+        skip = self.word_bytes * 2 - digits
+        runs = [('@{:X}\n'.format(address).encode('ascii'), words) for address, words in self.runs()]
+
+        buffer = bytearray(sum(len(marker) + len(words) * (digits + 1) for marker, words in runs))
+        position = 0
+        for marker, words in runs:
+            buffer[position:position + len(marker)] = marker
+            position += len(marker)
+
+            end = position + len(words) * (digits + 1)
+            text = self.hexlify(words)
+            for digit in range(digits):
+                buffer[position + digit:end:digits + 1] = text[skip + digit::digits + skip]
+            buffer[position + digits:end:digits + 1] = b'\n' * len(words)
+            position = end
+
+        return buffer
+
+
+# Image formats selectable with --emit
+IMAGE_WRITERS = {
+    'mif':  MifWriter,
+    'bin':  BinMifWriter,
+    'hex':  ModelSimWriter,
+    'raw':  RawWriter,
+    'ihex': IntelHexWriter,
+    'memh': MemhWriter,
+}
+
+# Every output format selectable with --emit, in the order they are written
+FORMATS = ('sym', 'mif', 'bin', 'hex', 'raw', 'ihex', 'memh')
+
+
+def write_image(writers, image):
+    """Walk the image once, feeding every word to all writers."""
+    for writer in writers:
+        writer.begin()
+
+    for pc, word in image:
+        for writer in writers:
+            writer.word(pc, word)
+
+    for writer in writers:
+        writer.end()
+
+
+def write_symbols(file, symbol_table):
+    """Write a symbol table sorted by address (.sym)."""
+    sym_sorted = sorted(symbol_table.items(), key=operator.itemgetter(1))
+
+    for (symbol, addr) in sym_sorted:
+        file.write("{}: {}\n".format(symbol, hex(addr)))
+
+
+def write_formats(files, isa, symbol_table, image, **options):
+    """Write an assembled program to one open file per output format.
+
+    files maps format names (see FORMATS) to writable file objects, opened
+    in binary mode for writers whose binary attribute is set. options are
+    passed on to every Writer. The image is walked once however many image
+    formats are requested.
+
+    Returns whether the image fits into the memory.
+    """
+    if 'sym' in files:
+        write_symbols(files['sym'], symbol_table)
+
+    writers = [IMAGE_WRITERS[kind](files[kind], isa, **options)
+               for kind in FORMATS if kind in IMAGE_WRITERS and kind in files]
+    if writers:
+        write_image(writers, image)
+
+    return not any(writer.overflow for writer in writers)